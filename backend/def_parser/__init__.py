@@ -0,0 +1 @@
+from .def_parser import DefDscp, parse_def_file, ORIENTS
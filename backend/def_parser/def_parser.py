@@ -0,0 +1,102 @@
+"""
+Def Parser
+Only what a placed design needs to be drawn is read: the units, the die
+area and the placed COMPONENTS. The file is memory-mapped and scanned with
+regular expressions on bytes, the placements are kept in numpy arrays.
+"""
+import mmap
+import os
+import re
+import numpy as np
+
+# DEF orientations, DefDscp.inst_orient holds indices into this tuple
+ORIENTS = ("N", "W", "S", "E", "FN", "FW", "FS", "FE")
+
+_DESIGN = re.compile(rb"^\s*DESIGN\s+(\S+)\s*;", re.M)
+_UNITS = re.compile(rb"^\s*UNITS\s+DISTANCE\s+MICRONS\s+(\d+)\s*;", re.M)
+_DIEAREA = re.compile(rb"^\s*DIEAREA\s+([^;]*);", re.M)
+_POINT = re.compile(rb"\(\s*(-?\d+)\s+(-?\d+)\s*\)")
+_COMPONENTS = re.compile(rb"^\s*COMPONENTS\s+\d+\s*;", re.M)
+_END_COMPONENTS = re.compile(rb"^\s*END\s+COMPONENTS", re.M)
+# - name macro ... + PLACED ( x y ) orient ... ;   unplaced ones do not match
+_COMPONENT = re.compile(rb"-\s+(\S+)\s+(\S+)[^;]*?\+\s*(?:PLACED|FIXED|COVER)\s*"
+                        rb"\(\s*(-?\d+)\s+(-?\d+)\s*\)\s*(\w+)[^;]*;")
+
+
+class DefDscp():
+    """
+    Placed design of a DEF file, coordinates are in microns.
+    """
+    def __init__(self):
+        self.design = ""
+        self.dbu = 1000
+        # (x0, y0, x1, y1), None when the DEF has no DIEAREA
+        self.die_area = None
+        # macro names, inst_macro holds indices into this list
+        self.macro_names = []
+        self.inst_names = []
+        self.inst_macro = np.zeros(0, dtype=np.int32)
+        self.inst_x = np.zeros(0, dtype=np.float64)
+        self.inst_y = np.zeros(0, dtype=np.float64)
+        self.inst_orient = np.zeros(0, dtype=np.int8)
+
+    def __len__(self):
+        return len(self.inst_names)
+
+    def parse(self, def_file):
+        """
+        Read the placement of a DEF file.
+        :param def_file: path of the DEF file
+        :return: void
+        """
+        with open(def_file, "rb") as f:
+            if not os.fstat(f.fileno()).st_size:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                self.parse_buffer(mm)
+
+    def parse_buffer(self, buffer):
+        match = _DESIGN.search(buffer)
+        if match:
+            self.design = match.group(1).decode()
+        match = _UNITS.search(buffer)
+        if match:
+            self.dbu = int(match.group(1))
+        match = _DIEAREA.search(buffer)
+        if match:
+            points = np.array(_POINT.findall(match.group(1)), dtype=np.float64) / self.dbu
+            if len(points):
+                self.die_area = tuple(points.min(axis=0).tolist() + points.max(axis=0).tolist())
+
+        start = _COMPONENTS.search(buffer)
+        if start is None:
+            return
+        end = _END_COMPONENTS.search(buffer, start.end())
+        section = buffer[start.end():end.start() if end else len(buffer)]
+
+        macro_index = {}
+        orient_index = {orient.encode(): idx for idx, orient in enumerate(ORIENTS)}
+        names, macros, coords, orients = [], [], [], []
+        for name, macro, x, y, orient in _COMPONENT.findall(section):
+            names.append(name)
+            macros.append(macro_index.setdefault(macro, len(macro_index)))
+            coords.append(x)
+            coords.append(y)
+            orients.append(orient_index.get(orient, 0))
+        self.macro_names = [macro.decode() for macro in macro_index]
+        self.inst_names = [name.decode() for name in names]
+        self.inst_macro = np.array(macros, dtype=np.int32)
+        coords = np.array(coords, dtype=np.float64).reshape(-1, 2) / self.dbu
+        self.inst_x, self.inst_y = coords[:, 0].copy(), coords[:, 1].copy()
+        self.inst_orient = np.array(orients, dtype=np.int8)
+
+
+def parse_def_file(def_file):
+    """
+    Parse the placement of a DEF file.
+    :param def_file: path of the DEF file
+    :return: a DefDscp
+    """
+    def_dscp = DefDscp()
+    def_dscp.parse(def_file)
+    return def_dscp
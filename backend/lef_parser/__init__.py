@@ -1,2 +1,4 @@
-from .lef_parser import LefDscp, parse_lef_file
+from .lef_parser import LefDscp, LazyMacros, parse_lef_file
+from .lef_cache import LefCache
+from .lef_library import LefLibrarySet, MergedMacros
 from .lef_util import draw_macro, Macro, Pin, Port, Polygon, Rect
@@ -0,0 +1,276 @@
+"""
+On-disk cache of parsed LEF libraries
+A snapshot keeps the layers, vias and cell height of a library together
+with one pickled blob per MACRO. Loading a snapshot only reads its index,
+each Macro is unpickled the first time it is looked up.
+Snapshot layout: MAGIC, format version and header length, the pickled
+header, then the macro blobs.
+"""
+import gc
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import threading
+from .lef_index import MacroEntry
+from .lef_parser import LefDscp, LazyMacros, parse_lef_file
+
+MAGIC = b"ICLEF"
+# bump when the snapshot layout or the pickled classes change
+FORMAT_VERSION = 2
+_PREFIX = struct.Struct("<5sHQ")
+
+CACHE_SUFFIX = ".lefc"
+DEFAULT_MAX_BYTES = 256 << 20
+
+
+def file_key(lef_file):
+    """
+    Identity of a LEF file: absolute path, size, mtime and content hash.
+    :param lef_file: path of the LEF file
+    :return: a (path, size, mtime_ns, digest) tuple
+    """
+    path = os.path.abspath(lef_file)
+    with open(path, "rb") as f:
+        stat = os.fstat(f.fileno())
+        digest = hashlib.blake2b(digest_size=16)
+        if stat.st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                digest.update(mm)
+    return path, stat.st_size, stat.st_mtime_ns, digest.hexdigest()
+
+
+class CachedMacros(LazyMacros):
+    """
+    Read-only name -> Macro mapping over the macro blobs of a snapshot.
+    """
+    def __init__(self, lef_file, entries, blobs):
+        super().__init__(lef_file, entries)
+        self._blobs = blobs
+
+    def _load_run(self, run):
+        if not run:
+            return
+        # unpickling many small containers triggers the cyclic collector
+        # over and over, there is nothing for it to collect here
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for entry in run:
+                self._parsed[entry.name] = pickle.loads(self._blobs[entry.offset:entry.end])
+        finally:
+            if enabled:
+                gc.enable()
+
+
+class LefCache():
+    """
+    Size-capped directory of LefDscp snapshots, one per LEF path. The least
+    recently used snapshots are removed when the directory grows too big.
+    """
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def _snapshot_path(self, path):
+        name = hashlib.sha1(path.encode()).hexdigest()
+        return os.path.join(self.cache_dir, name + CACHE_SUFFIX)
+
+    def load(self, lef_file):
+        """
+        Load the snapshot of a LEF file.
+        :param lef_file: path of the LEF file
+        :return: a LefDscp, or None when there is no valid snapshot
+        """
+        try:
+            key = file_key(lef_file)
+        except OSError:
+            return None
+        snapshot_path = self._snapshot_path(key[0])
+        try:
+            with open(snapshot_path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            lef_dscp = self._decode(data, key)
+        except Exception:
+            # corrupt or written by another version
+            lef_dscp = None
+        if lef_dscp is None:
+            self._remove(snapshot_path)
+            return None
+        # mark as recently used for the eviction
+        os.utime(snapshot_path)
+        return lef_dscp
+
+    def _decode(self, data, key):
+        """
+        :param key: file_key the snapshot must have, any key when None
+        """
+        magic, version, header_len = _PREFIX.unpack_from(data)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            return None
+        start = _PREFIX.size
+        header = pickle.loads(data[start:start + header_len])
+        if key is not None and header["key"] != key:
+            # stale, the LEF file changed
+            return None
+        blobs = memoryview(data)[start + header_len:]
+        entries = [MacroEntry(name, offset, length, size, digest)
+                   for name, offset, length, size, digest in header["macros"]]
+        lef_dscp = LefDscp()
+        lef_dscp.layers = header["layers"]
+        lef_dscp.vias = header["vias"]
+        lef_dscp.statements = list(lef_dscp.layers.values()) + list(lef_dscp.vias.values())
+        lef_dscp.macros = CachedMacros(header["key"][0], entries, blobs)
+        lef_dscp.cell_height = header["cell_height"]
+        return lef_dscp
+
+    def store(self, lef_file, lef_dscp, key=None, pickled=None):
+        """
+        Write the snapshot of a parsed LEF file, every macro is included.
+        :param lef_file: path of the LEF file
+        :param lef_dscp: the LefDscp parsed from it
+        :param key: file_key of the file when it was parsed
+        :param pickled: name -> pickled Macro written as it is, the other
+        macros are pickled here
+        """
+        key = key or file_key(lef_file)
+        pickled = pickled or {}
+        # block hashes of a lazily parsed library, for the reload
+        index = getattr(lef_dscp.macros, "entries", {})
+        blobs = []
+        macros = []
+        offset = 0
+        for name in lef_dscp.macros:
+            entry = index.get(name)
+            blob = pickled.get(name)
+            if blob is None:
+                macro = lef_dscp.macros[name]
+                blob = pickle.dumps(macro, pickle.HIGHEST_PROTOCOL)
+                size = macro.info.get("SIZE")
+            else:
+                size = entry.size
+            macros.append((name, offset, len(blob), size, entry and entry.digest))
+            blobs.append(blob)
+            offset += len(blob)
+        header = pickle.dumps({
+            "key": key,
+            "layers": lef_dscp.layers,
+            "vias": lef_dscp.vias,
+            "cell_height": lef_dscp.cell_height,
+            "macros": macros,
+        }, pickle.HIGHEST_PROTOCOL)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        snapshot_path = self._snapshot_path(key[0])
+        tmp_path = "%s.%d.tmp" % (snapshot_path, threading.get_ident())
+        with open(tmp_path, "wb") as f:
+            f.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, len(header)))
+            f.write(header)
+            for blob in blobs:
+                f.write(blob)
+        os.replace(tmp_path, snapshot_path)
+        self._evict()
+
+    def build(self, lef_file):
+        """
+        Parse a LEF file and store its snapshot, nothing is stored when the
+        file changes in the meantime.
+        :param lef_file: path of the LEF file
+        """
+        try:
+            key = file_key(lef_file)
+            lef_dscp = parse_lef_file(lef_file, lazy=True)
+            lef_dscp.macros.load_all()
+            if file_key(lef_file) == key:
+                self.store(lef_file, lef_dscp, key)
+        except OSError as e:
+            print(f"LEF cache: can not cache {lef_file}: {e}")
+
+    def update(self, lef_file, lef_dscp, pickled):
+        """
+        Rewrite the snapshot of a reloaded LEF file without parsing it: the
+        blobs of the unchanged macros are copied from the snapshot of the
+        previous version. Nothing is written when that snapshot is missing
+        or does not hold every unchanged macro.
+        :param lef_file: path of the LEF file
+        :param lef_dscp: the reloaded LefDscp, with a LazyMacros index
+        :param pickled: name -> pickled Macro of the changed macros
+        :return: True when the snapshot was written
+        """
+        try:
+            key = file_key(lef_file)
+            snapshot_path = self._snapshot_path(key[0])
+            with open(snapshot_path, "rb") as f:
+                data = f.read()
+            old = self._decode(data, None)
+        except Exception:
+            return False
+        if old is None:
+            return False
+        blobs = old.macros._blobs
+        old_entries = old.macros.entries
+        copied = dict(pickled)
+        for name, entry in lef_dscp.macros.entries.items():
+            if name in copied:
+                continue
+            old_entry = old_entries.get(name)
+            if old_entry is None or entry.digest is None or entry.digest != old_entry.digest:
+                # the snapshot is of an older version than the one reloaded
+                return False
+            copied[name] = blobs[old_entry.offset:old_entry.end]
+        try:
+            if file_key(lef_file) == key:
+                self.store(lef_file, lef_dscp, key, copied)
+                return True
+        except OSError as e:
+            print(f"LEF cache: can not cache {lef_file}: {e}")
+        return False
+
+    def update_in_background(self, lef_file, lef_dscp, names):
+        """
+        Run update in a daemon thread, the changed macros are pickled here
+        since the thread must not parse them.
+        :param names: names of the added, modified and removed macros
+        """
+        pickled = {name: pickle.dumps(lef_dscp.macros[name], pickle.HIGHEST_PROTOCOL)
+                   for name in names if name in lef_dscp.macros}
+        thread = threading.Thread(target=self.update, args=(lef_file, lef_dscp, pickled), daemon=True)
+        thread.start()
+        return thread
+
+    def build_in_background(self, lef_file):
+        """Run build in a daemon thread"""
+        thread = threading.Thread(target=self.build, args=(lef_file,), daemon=True)
+        thread.start()
+        return thread
+
+    def _remove(self, snapshot_path):
+        try:
+            os.remove(snapshot_path)
+        except OSError:
+            pass
+
+    def _evict(self):
+        """Remove the least recently used snapshots above max_bytes"""
+        snapshots = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(CACHE_SUFFIX):
+                stat = entry.stat()
+                snapshots.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in snapshots)
+        for _, size, path in sorted(snapshots):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        """Remove every snapshot"""
+        if os.path.isdir(self.cache_dir):
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.endswith(CACHE_SUFFIX):
+                    self._remove(entry.path)
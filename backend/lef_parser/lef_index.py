@@ -0,0 +1,153 @@
+"""
+Byte offset index of the MACRO blocks in a LEF file
+A MACRO block runs from "MACRO name" to the end of the "END name" line,
+the blocks are independent of each other and can be parsed separately.
+The index also keeps the SIZE of every macro, which is enough to list the
+library without parsing any block, and a hash of every block to find the
+macros that changed between two versions of a file.
+"""
+import hashlib
+import re
+
+# name of a MACRO header, matched at a found b"MACRO"
+_MACRO_HEADER = re.compile(rb'MACRO[ \t]+([^\s;]+)')
+
+# SIZE statement, matched at a found b"SIZE"
+_SIZE = re.compile(rb'SIZE[ \t]+([^\s;]+)[ \t]+BY[ \t]+([^\s;]+)')
+
+
+class MacroEntry:
+    """
+    Location of one MACRO block in the LEF file.
+    """
+    __slots__ = ("name", "offset", "length", "size", "digest")
+
+    def __init__(self, name, offset, length, size=None, digest=None):
+        self.name = name
+        self.offset = offset
+        self.length = length
+        # (width, height) or None when the block has no SIZE
+        self.size = size
+        # hash of the block text, see digest_macros
+        self.digest = digest
+
+    @property
+    def end(self):
+        return self.offset + self.length
+
+
+def _line_end(buffer, pos):
+    """Position right after the line end following pos"""
+    end = buffer.find(b"\n", pos)
+    return len(buffer) if end < 0 else end + 1
+
+
+def _macro_size(buffer, start, end):
+    """SIZE of the MACRO block at buffer[start:end] as (width, height)"""
+    pos = buffer.find(b"SIZE", start, end)
+    while pos >= 0:
+        match = _SIZE.match(buffer, pos, end)
+        if match is not None and _at_statement_start(buffer, pos):
+            try:
+                return float(match.group(1)), float(match.group(2))
+            except ValueError:
+                return None
+        pos = buffer.find(b"SIZE", pos + 4, end)
+    return None
+
+
+def _at_statement_start(buffer, pos):
+    """True when only blanks separate pos from a line start or a ';'"""
+    pos -= 1
+    while pos >= 0:
+        char = buffer[pos]
+        if char != 32 and char != 9:
+            return char == 10 or char == 13 or char == 59
+        pos -= 1
+    return True
+
+
+def _is_separator(buffer, pos):
+    """True at the end of the buffer or on a blank or ';'"""
+    return pos >= len(buffer) or buffer[pos] in b" \t\r\n;"
+
+
+def _find_end(buffer, name, pos):
+    """
+    Find the "END name" statement closing a block.
+    :return: position after the end of its line, or -1
+    """
+    while True:
+        pos = buffer.find(name, pos)
+        if pos < 0:
+            return -1
+        after = pos + len(name)
+        keyword = pos
+        while keyword > 0 and buffer[keyword - 1] in b" \t":
+            keyword -= 1
+        if keyword < pos and _is_separator(buffer, after) and \
+                buffer[keyword - 3:keyword] == b"END" and _at_statement_start(buffer, keyword - 3):
+            return _line_end(buffer, after)
+        pos = after
+
+
+def scan_macros(buffer):
+    """
+    Find the MACRO ... END name blocks of a LEF file without parsing them.
+    Plain substring searches are used, a regex over the whole file is an
+    order of magnitude slower.
+    :param buffer: bytes or mmap holding the whole LEF file
+    :return: a list of MacroEntry in file order
+    """
+    entries = []
+    pos = 0
+    while True:
+        start = buffer.find(b"MACRO", pos)
+        if start < 0:
+            return entries
+        header = _MACRO_HEADER.match(buffer, start)
+        if header is None or not _at_statement_start(buffer, start):
+            pos = start + 5
+            continue
+        name = header.group(1)
+        end = _find_end(buffer, name, header.end())
+        if end < 0:
+            # an unclosed MACRO (e.g. in PROPERTYDEFINITIONS) is dropped
+            pos = header.end()
+            continue
+        entries.append(MacroEntry(name.decode(), start, end - start, _macro_size(buffer, start, end)))
+        pos = end
+
+
+def block_digest(block):
+    """Hash of the text of a MACRO block"""
+    return hashlib.blake2b(block, digest_size=16).digest()
+
+
+def digest_macros(buffer, entries):
+    """
+    Hash the text of every MACRO block into entry.digest.
+    :param buffer: bytes or mmap the entries were scanned from
+    :param entries: MacroEntry list from scan_macros
+    """
+    for entry in entries:
+        entry.digest = block_digest(buffer[entry.offset:entry.end])
+
+
+def gap_ranges(entries, size):
+    """
+    Byte ranges of the file that are not part of any MACRO block, this is
+    where the LAYER, VIA and SITE sections are.
+    :param entries: MacroEntry list from scan_macros
+    :param size: size of the file
+    :return: a list of (start, end) ranges
+    """
+    ranges = []
+    pos = 0
+    for entry in entries:
+        if entry.offset > pos:
+            ranges.append((pos, entry.offset))
+        pos = entry.end
+    if pos < size:
+        ranges.append((pos, size))
+    return ranges
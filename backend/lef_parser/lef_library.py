@@ -0,0 +1,107 @@
+"""
+Set of LEF libraries seen through one merged namespace
+A flow combines a tech LEF with several cell LEFs. Each file is parsed on
+its own into a LefDscp, LefLibrarySet merges their macros, layers and vias.
+Precedence: libraries are ordered by load time and a later library wins
+over an earlier one for the names both define. Loading a file again keeps
+its place in that order.
+"""
+from collections.abc import Mapping
+
+
+class MergedMacros(Mapping):
+    """
+    Read-only name -> Macro mapping over several libraries, the owner of
+    every name is indexed so that a lookup touches only one library.
+    """
+    def __init__(self, libraries):
+        # a copy, the set is changed while worker threads read this one
+        self._libraries = dict(libraries)
+        self.owner = {}
+        for lef_file, lef_dscp in libraries.items():
+            for name in lef_dscp.macros:
+                self.owner[name] = lef_file
+
+    def __getitem__(self, name):
+        return self._libraries[self.owner[name]].macros[name]
+
+    def __iter__(self):
+        return iter(self.owner)
+
+    def __len__(self):
+        return len(self.owner)
+
+    def __contains__(self, name):
+        return name in self.owner
+
+    def digest(self, name):
+        """Block hash of a macro of a lazily loaded library, or None"""
+        digest = getattr(self._libraries[self.owner[name]].macros, "digest", None)
+        return digest(name) if digest is not None else None
+
+    def load_all(self):
+        """Parse the macros of every lazily loaded library in one go"""
+        for lef_dscp in self._libraries.values():
+            load_all = getattr(lef_dscp.macros, "load_all", None)
+            if load_all is not None:
+                load_all()
+
+    def values(self):
+        self.load_all()
+        return super().values()
+
+    def items(self):
+        self.load_all()
+        return super().items()
+
+
+class LefLibrarySet():
+    """
+    Ordered LefDscp objects keyed by LEF path, with the same macros, layers,
+    vias, cell_height and macro_info as a single LefDscp.
+    """
+    def __init__(self):
+        self.libraries = {}
+        self.macros = MergedMacros(self.libraries)
+        self.layers = {}
+        self.vias = {}
+        self.cell_height = -1
+
+    def add(self, lef_file, lef_dscp):
+        """
+        Add a library, or replace the one loaded from the same file.
+        :param lef_file: path of the LEF file
+        :param lef_dscp: LefDscp parsed from it
+        """
+        self.libraries[lef_file] = lef_dscp
+        self._merge()
+
+    def remove(self, lef_file):
+        """
+        Drop a library, the others are kept as they are.
+        :return: the removed LefDscp or None
+        """
+        lef_dscp = self.libraries.pop(lef_file, None)
+        self._merge()
+        return lef_dscp
+
+    def _merge(self):
+        self.macros = MergedMacros(self.libraries)
+        self.layers = {}
+        self.vias = {}
+        self.cell_height = -1
+        for lef_dscp in self.libraries.values():
+            self.layers.update(lef_dscp.layers)
+            self.vias.update(lef_dscp.vias)
+            if lef_dscp.cell_height != -1:
+                self.cell_height = lef_dscp.cell_height
+
+    def files(self):
+        return list(self.libraries)
+
+    def library_of(self, name):
+        """Path of the LEF file the macro is taken from, or None"""
+        return self.macros.owner.get(name)
+
+    def macro_info(self, name):
+        return self.macros.get(name, 'No Macro ' + name)
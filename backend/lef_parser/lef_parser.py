@@ -4,10 +4,20 @@ Author: Tri Cao
 Email: tricao@utdallas.edu
 Date: August 2016
 """
+import mmap
+import os
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
 from .lef_util import *
+from .lef_tokenizer import tokenize_lef, tokenize_lef_mmap, tokenize_lef_buffer
+from .lef_index import scan_macros, digest_macros, gap_ranges, block_digest
 
 SCALE = 2000
 
+# MACRO blocks handed to one worker are about this large at least, smaller
+# libraries are not worth the process start-up
+MIN_CHUNK_BYTES = 256 * 1024
+
 class LefDscp():
     """
     LefParser object will parse the LEF file and store information about the
@@ -27,53 +37,307 @@ class LefDscp():
         Get the general cell height in the library
         :return: void
         """
+        if isinstance(self.macros, LazyMacros):
+            for name in self.macros:
+                size = self.macros.size(name)
+                if size is not None:
+                    self.cell_height = size[1]
+                break
+            return
         for macro in self.macros:
             self.cell_height = self.macros[macro].info["SIZE"][1]
             break
 
-    def parse(self, lef_file):
-        """Parse input lef file"""
-        with open(lef_file, "r") as f:
-            for line in f:
-                info = str_to_list(line)
-                if len(info) != 0:
-                    # if info is a blank line, then move to next line
-                    # check if the program is processing a statement
-                    #print (info)
-                    if len(self.stack) != 0:
-                        curState = self.stack[len(self.stack) - 1]
-                        nextState = curState.parse_next(info)
-                    else:
-                        curState = Statement()
-                        nextState = curState.parse_next(info)
-                    # check the status return from parse_next function
-                    if nextState == 0:
-                        # continue as normal
-                        pass
-                    elif nextState == 1:
-                        # remove the done statement from stack, and add it to the statements
-                        # list
-                        if len(self.stack) != 0:
-                            # add the done statement to a dictionary
-                            done_obj = self.stack.pop()
-                            if isinstance(done_obj, Macro):
-                                self.macros[done_obj.name] = done_obj
-                            elif isinstance(done_obj, Layer):
-                                self.layers[done_obj.name] = done_obj
-                            elif isinstance(done_obj, Via):
-                                self.vias[done_obj.name] = done_obj
-                            self.statements.append(done_obj)
-                    elif nextState == -1:
-                        pass
-                    else:
-                        self.stack.append(nextState)
-            self.get_cell_height()
+    def _done_containers(self):
+        """Map the type of a finished statement to the dictionary keeping it"""
+        return {"MACRO": self.macros, "LAYER": self.layers, "VIA": self.vias}
+
+    def parse_statements(self, statements):
+        """
+        Run the statement state machine over tokenized statements.
+        :param statements: iterable of token lists, one per statement
+        :return: void
+        """
+        top_state = Statement()
+        containers = self._done_containers()
+        stack = self.stack
+        for info in statements:
+            # check if the program is processing a statement
+            curState = stack[-1] if stack else top_state
+            nextState = curState.parse_next(info)
+            # check the status return from parse_next function
+            if nextState == 0 or nextState == -1:
+                # continue as normal
+                continue
+            if nextState == 1:
+                # remove the done statement from stack, and add it to the statements
+                # list
+                if stack:
+                    # add the done statement to a dictionary
+                    done_obj = stack.pop()
+                    container = containers.get(done_obj.type)
+                    if container is not None:
+                        container[done_obj.name] = done_obj
+                    self.statements.append(done_obj)
+            else:
+                stack.append(nextState)
+
+    def parse(self, lef_file, use_mmap=False):
+        """
+        Parse input lef file
+        :param lef_file: path of the LEF file
+        :param use_mmap: memory-map the file and tokenize it on bytes, only
+        the names and values that are kept get decoded
+        """
+        tokenize = tokenize_lef_mmap if use_mmap else tokenize_lef
+        self.parse_statements(tokenize(lef_file))
+        self.get_cell_height()
     
+    def parse_parallel(self, lef_file, max_workers=None):
+        """
+        Parse input lef file with its MACRO blocks spread over worker
+        processes. The LAYER, VIA and SITE sections between the blocks are
+        parsed here, sequentially.
+        :param lef_file: path of the LEF file
+        :param max_workers: number of worker processes, default cpu count
+        """
+        max_workers = max_workers or os.cpu_count() or 1
+        with open(lef_file, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                entries = scan_macros(mm)
+                for start, end in gap_ranges(entries, size):
+                    self.parse_statements(tokenize_lef_buffer(mm[start:end]))
+
+        chunks = _split_chunks(entries, max_workers)
+        if len(chunks) <= 1 or max_workers <= 1:
+            macro_lists = [_parse_macro_range(lef_file, start, end) for start, end in chunks]
+        else:
+            with ProcessPoolExecutor(min(max_workers, len(chunks))) as pool:
+                starts, ends = zip(*chunks)
+                macro_lists = pool.map(_parse_macro_range, [lef_file] * len(chunks), starts, ends)
+        # merge back in file order
+        for macros in macro_lists:
+            for macro in macros:
+                self.macros[macro.name] = macro
+                self.statements.append(macro)
+        self.get_cell_height()
+
+    def parse_lazy(self, lef_file):
+        """
+        Index input lef file: the LAYER, VIA and SITE sections are parsed,
+        the MACRO blocks are only located and each one is parsed the first
+        time it is looked up in self.macros. Lazily parsed macros are not
+        added to self.statements.
+        :param lef_file: path of the LEF file
+        """
+        entries = []
+        with open(lef_file, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    entries = scan_macros(mm)
+                    digest_macros(mm, entries)
+                    for start, end in gap_ranges(entries, size):
+                        self.parse_statements(tokenize_lef_buffer(mm[start:end]))
+        self.macros = LazyMacros(lef_file, entries)
+        self.get_cell_height()
+
+    def reload(self, lef_file):
+        """
+        Read input lef file again after it was edited. The sections outside
+        the MACRO blocks are parsed again, the macros that were already
+        parsed are kept when the text of their block did not change.
+        :param lef_file: path of the LEF file
+        :return: names of the added, modified and removed macros, None when
+        the previous macros had no index and everything was reloaded
+        """
+        old_macros = self.macros
+        self.__init__()
+        self.parse_lazy(lef_file)
+        if not isinstance(old_macros, LazyMacros):
+            return None
+        return self.macros.carry_over(old_macros)
+
     def macro_info(self, name):
         return self.macros.get(name, 'No Macro ' + name)
+
+
+class LazyMacros(Mapping):
+    """
+    Read-only name -> Macro mapping over the MACRO index of a LEF file.
+    Names, sizes and membership come from the index, a Macro is parsed from
+    its byte range on first access and kept.
+    """
+    def __init__(self, lef_file, entries):
+        self.lef_file = lef_file
+        self.entries = {entry.name: entry for entry in entries}
+        self._parsed = {}
+
+    def __getitem__(self, name):
+        macro = self._parsed.get(name)
+        if macro is None:
+            self._load_run([self.entries[name]])
+            macro = self._parsed[name]
+        return macro
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def size(self, name):
+        """SIZE of a macro as (width, height) without parsing it"""
+        return self.entries[name].size
+
+    def digest(self, name):
+        """Hash of the MACRO block text, None when it is not known"""
+        return self.entries[name].digest
+
+    def is_parsed(self, name):
+        return name in self._parsed
+
+    def carry_over(self, old):
+        """
+        Take over the parsed macros of an older index of the same library
+        whose block text is unchanged.
+        :param old: LazyMacros of the previous version of the file
+        :return: set of the names of added, modified and removed macros
+        """
+        changed = set(old.entries).symmetric_difference(self.entries)
+        for name, entry in self.entries.items():
+            old_entry = old.entries.get(name)
+            if old_entry is None:
+                continue
+            if entry.digest is None or entry.digest != old_entry.digest:
+                changed.add(name)
+            elif old.is_parsed(name):
+                self._parsed[name] = old._parsed[name]
+        return changed
+
+    def load_all(self):
+        """
+        Parse every macro not parsed yet, the missing blocks are read in
+        contiguous runs instead of one by one.
+        """
+        run = []
+        for entry in self.entries.values():
+            if entry.name in self._parsed:
+                self._load_run(run)
+                run = []
+            else:
+                run.append(entry)
+        self._load_run(run)
+
+    def _load_run(self, run):
+        """
+        Parse the macros of consecutive index entries. The blocks are read
+        from the file on disk, a block whose text is not the indexed one
+        any more (the file was edited, not reloaded yet) is looked up again.
+        """
+        if not run:
+            return
+        start = run[0].offset
+        with open(self.lef_file, "rb") as f:
+            f.seek(start)
+            buffer = f.read(run[-1].end - start)
+        if all(_block_matches(buffer, entry.offset - start, entry) for entry in run):
+            self._parse_buffer(buffer)
+        else:
+            self._load_moved(run)
+
+    def _load_moved(self, run):
+        """Parse indexed macros from the edited file, where their text may have moved"""
+        with open(self.lef_file, "rb") as f:
+            buffer = f.read()
+        entries = {entry.name: entry for entry in scan_macros(buffer)}
+        for entry in run:
+            moved = entries.get(entry.name)
+            if moved is None or not _block_matches(buffer, moved.offset, entry):
+                raise RuntimeError(f"Macro {entry.name} changed in {self.lef_file}, reload the library")
+            self._parse_buffer(buffer[moved.offset:moved.end])
+
+    def _parse_buffer(self, buffer):
+        for macro in _parse_macro_buffer(buffer):
+            self._parsed[macro.name] = macro
+
+    def values(self):
+        self.load_all()
+        return super().values()
+
+    def items(self):
+        self.load_all()
+        return super().items()
     
 
-def parse_lef_file(lef_file):
+def _split_chunks(entries, max_workers):
+    """
+    Group consecutive MACRO blocks into byte ranges of about equal size,
+    a few per worker so that uneven cells still balance out.
+    :return: a list of (start, end) byte ranges
+    """
+    if not entries:
+        return []
+    total = entries[-1].end - entries[0].offset
+    target = max(MIN_CHUNK_BYTES, total // (max_workers * 4))
+    chunks = []
+    start = entries[0].offset
+    for entry in entries:
+        if entry.end - start >= target:
+            chunks.append((start, entry.end))
+            start = entry.end
+    if start < entries[-1].end:
+        chunks.append((start, entries[-1].end))
+    return chunks
+
+
+def _block_matches(buffer, offset, entry):
+    """True when buffer holds the indexed text of entry at offset"""
+    if entry.digest is None:
+        return offset + entry.length <= len(buffer)
+    return block_digest(buffer[offset:offset + entry.length]) == entry.digest
+
+
+def _parse_macro_range(lef_file, start, end):
+    """
+    Worker side of LefDscp.parse_parallel: parse the MACRO blocks found in
+    a byte range of the file.
+    :return: a list of Macro objects in file order
+    """
+    with open(lef_file, "rb") as f:
+        f.seek(start)
+        buffer = f.read(end - start)
+    return _parse_macro_buffer(buffer)
+
+
+def _parse_macro_buffer(buffer):
+    """Parse the MACRO blocks of bytes, a list of Macro objects in file order"""
+    lef_dscp = LefDscp()
+    lef_dscp.parse_statements(tokenize_lef_buffer(buffer))
+    return list(lef_dscp.macros.values())
+
+
+def parse_lef_file(lef_file, use_mmap=False, max_workers=1, lazy=False):
+    """
+    Parse a LEF file.
+    :param lef_file: path of the LEF file
+    :param use_mmap: tokenize a memory-mapped file on bytes
+    :param max_workers: worker processes for the MACRO blocks, 1 parses
+    everything in this process, None uses all cores
+    :param lazy: only index the MACRO blocks and parse each one on first use
+    :return: a LefDscp
+    """
     lef_dscp = LefDscp()
-    lef_dscp.parse(lef_file)
+    if lazy:
+        lef_dscp.parse_lazy(lef_file)
+    elif max_workers == 1:
+        lef_dscp.parse(lef_file, use_mmap)
+    else:
+        lef_dscp.parse_parallel(lef_file, max_workers)
     return lef_dscp
\ No newline at end of file
@@ -0,0 +1,213 @@
+"""
+Statement tokenizer for the LEF parser
+The file is read in large blocks and cut into statements: a statement ends
+at ';', or at the end of its line when it is a block header such as
+"MACRO name" or "END name", which carry no ';'.
+Text files give str tokens; memory-mapped files are tokenized on bytes and
+give bytes tokens, the statement classes decode only what they keep.
+"""
+import itertools
+import mmap
+import re
+
+BLOCK_SIZE = 1 << 20
+
+# block headers and block ends, written without ';'
+HEADER_KEYWORDS = frozenset([
+    "MACRO", "PIN", "PORT", "OBS", "END", "LAYER", "VIA", "VIARULE", "SITE",
+    "UNITS", "PROPERTYDEFINITIONS", "NONDEFAULTRULE", "ARRAY", "BEGINEXT",
+])
+
+# keywords that always open a new statement, even in the middle of a line
+BLOCK_STARTS = frozenset(["MACRO", "PIN", "PORT", "OBS", "END"])
+
+# number of arguments of the headers whose length is fixed, any token
+# after them on the same line starts the next statement
+HEADER_ARITY = {"MACRO": 1, "PIN": 1, "PORT": 0, "OBS": 0, "END": 1}
+
+# first keywords of the bodies of the top-level LAYER, VIA, VIARULE and
+# SITE blocks. Their headers take optional words ("VIA name DEFAULT") and
+# share the keyword with ';' statements inside PORT ("VIA x y name ;"), so
+# on a dense line the header ends at the keyword opening its body
+HEADER_BODIES = {
+    "LAYER": ["TYPE"],
+    "VIA": ["LAYER", "RESISTANCE", "VIARULE", "PROPERTY", "FOREIGN", "TOPOFSTACKONLY"],
+    "VIARULE": ["LAYER", "VIA", "RESISTANCE", "PROPERTY"],
+    "SITE": ["CLASS", "SYMMETRY", "ROWPATTERN", "SIZE"],
+}
+
+
+class _Syntax:
+    """LEF punctuation and keywords in one string type (str or bytes)"""
+
+    def __init__(self, encode, char):
+        self.semicolon = encode(";")
+        self.spaced_semicolon = encode(" ; ")
+        self.quote = encode('"')
+        self.hash = encode("#")
+        self.newline = encode("\n")
+        # what "x in line" looks for, bytes are much faster searched by value
+        self.semicolon_char = char(";")
+        self.quote_char = char('"')
+        self.hash_char = char("#")
+        self.headers = frozenset(encode(k) for k in HEADER_KEYWORDS)
+        self.block_starts = frozenset(encode(k) for k in BLOCK_STARTS)
+        self.arity = {encode(k): v for k, v in HEADER_ARITY.items()}
+        self.bodies = {encode(k): frozenset(encode(w) for w in v) for k, v in HEADER_BODIES.items()}
+        self.quoted_token = re.compile(encode(r'"[^"]*"|;|(?<!\S)#.*|[^\s";]+'))
+        self.comment = re.compile(encode(r'(?<!\S)#.*'))
+
+
+TEXT = _Syntax(lambda s: s, lambda c: c)
+BINARY = _Syntax(lambda s: s.encode(), ord)
+
+
+def _line_tokens(line, syntax):
+    """
+    Split one physical (or quote-joined) line into tokens. ';' is always a
+    token of its own, a quoted string is a single token and comments are
+    dropped.
+    :param line: input line
+    :param syntax: TEXT or BINARY, matching the type of line
+    :return: a list of tokens
+    """
+    if syntax.quote_char in line:
+        tokens = []
+        for token in syntax.quoted_token.findall(line):
+            if token.startswith(syntax.hash):
+                break
+            tokens.append(token)
+        return tokens
+    if syntax.hash_char in line:
+        line = syntax.comment.sub(line[:0], line)
+    if syntax.semicolon_char in line:
+        line = line.replace(syntax.semicolon, syntax.spaced_semicolon)
+    return line.split()
+
+
+def iter_statements(blocks, syntax=TEXT):
+    """
+    Turn blocks of lines into LEF statements.
+    :param blocks: iterable of lists of lines
+    :param syntax: TEXT for str lines, BINARY for bytes lines
+    :return: generator of token lists, one per statement; ';' is kept as
+    the last token of the statements that have it.
+    """
+    semicolon, quote = syntax.semicolon, syntax.quote
+    semicolon_char, quote_char, hash_char = syntax.semicolon_char, syntax.quote_char, syntax.hash_char
+    headers, block_starts, arity, bodies = syntax.headers, syntax.block_starts, syntax.arity, syntax.bodies
+    stmt = []
+    quoted = None
+    for line in itertools.chain.from_iterable(blocks):
+        if quoted is not None or quote_char in line or hash_char in line:
+            if quoted is not None:
+                # inside a quoted string that spans several lines
+                line = quoted + syntax.newline + line
+                quoted = None
+            if line.count(quote) % 2:
+                quoted = line
+                continue
+            tokens = _line_tokens(line, syntax)
+        else:
+            tokens = line.split()
+            if not tokens:
+                continue
+            # fast paths: a complete statement on its own line. A header
+            # with one ';' ("PIN A DIRECTION INPUT ;") is two statements
+            if not stmt:
+                if tokens[-1] == semicolon:
+                    if line.count(semicolon) == 1 and tokens[0] not in headers:
+                        yield tokens
+                        continue
+                elif tokens[0] in headers and semicolon_char not in line and (
+                        len(tokens) == 1 or len(tokens) == 2 and tokens[1] not in block_starts
+                        and arity.get(tokens[0], 1)):
+                    yield tokens
+                    continue
+            if semicolon_char in line:
+                tokens = line.replace(semicolon, syntax.spaced_semicolon).split()
+
+        for token in tokens:
+            if token == semicolon:
+                stmt.append(token)
+                yield stmt
+                stmt = []
+            elif stmt and stmt[0] in headers and (
+                    token in block_starts or len(stmt) > arity.get(stmt[0], len(stmt))
+                    or len(stmt) > 1 and token in bodies.get(stmt[0], ())):
+                yield stmt
+                stmt = [token]
+            else:
+                stmt.append(token)
+        if stmt and stmt[0] in headers:
+            yield stmt
+            stmt = []
+    if quoted is not None:
+        stmt.extend(_line_tokens(quoted + quote, syntax))
+    if stmt:
+        yield stmt
+
+
+def iter_line_blocks(f, block_size=BLOCK_SIZE):
+    """
+    Read a file-like object in large blocks and cut each block into lines.
+    :param f: file object opened in text or binary mode, or an mmap
+    :param block_size: number of characters (bytes) read at once
+    :return: generator of lists of lines without line ends
+    """
+    tail = f.read(0)
+    newline = "\n" if isinstance(tail, str) else b"\n"
+    while True:
+        block = f.read(block_size)
+        if not block:
+            break
+        lines = (tail + block).split(newline)
+        tail = lines.pop()
+        yield lines
+    if tail:
+        yield [tail]
+
+
+def _read_line_blocks(lef_file, block_size):
+    with open(lef_file, "r") as f:
+        yield from iter_line_blocks(f, block_size)
+
+
+def _read_mmap_line_blocks(lef_file, block_size):
+    with open(lef_file, "rb") as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # an empty file can not be mapped
+            return
+        with mm:
+            yield from iter_line_blocks(mm, block_size)
+
+
+def tokenize_lef(lef_file, block_size=BLOCK_SIZE):
+    """
+    Tokenize a LEF file into statements.
+    :param lef_file: path of the LEF file
+    :param block_size: number of characters read at once
+    :return: generator of token lists, one per statement
+    """
+    return iter_statements(_read_line_blocks(lef_file, block_size))
+
+
+def tokenize_lef_mmap(lef_file, block_size=BLOCK_SIZE):
+    """
+    Tokenize a memory-mapped LEF file on bytes, nothing is decoded here.
+    :param lef_file: path of the LEF file
+    :param block_size: number of bytes cut into lines at once
+    :return: generator of bytes token lists, one per statement
+    """
+    return iter_statements(_read_mmap_line_blocks(lef_file, block_size), BINARY)
+
+
+def tokenize_lef_buffer(buffer):
+    """
+    Tokenize a piece of a LEF file that is already in memory.
+    :param buffer: bytes holding complete statements
+    :return: generator of bytes token lists, one per statement
+    """
+    return iter_statements([buffer.split(b"\n")], BINARY)
@@ -4,41 +4,76 @@ Author: Tri Minh Cao
 Email: tricao@utdallas.edu
 Date: August 2016
 """
+from array import array
+from sys import intern
 from .util import *
 
 
+def _text(token):
+    """Decode a bytes token of the memory-mapped reader, str is kept as is"""
+    return token.decode() if token.__class__ is bytes else token
+
+
+def _name(token):
+    """Identifiers and keyword values repeat a lot, keep one copy of each"""
+    return intern(_text(token))
+
+
+def _keyword_table(handlers):
+    """Index statement handlers by the str and the bytes form of the keyword"""
+    table = dict(handlers)
+    table.update({keyword.encode(): handler for keyword, handler in handlers.items()})
+    return table
+
+
 class Statement:
     """
     General class for all types of Statements in the LEF file
     """
 
+    __slots__ = ()
+
     def __init__(self):
         pass
 
     def parse_next(self, data):
         """
         Method to add information from a statement from LEF file to the
-        Statement object.
+        Statement object. The keyword in data[0] is looked up in the
+        _handlers table of the statement type.
         :param data: a list of strings that contains pieces of information
-        :return: 1 if parsing is done, -1 if error, otherwise, return the
-        object that will be parsed next.
+        :return: 0 if in progress, 1 if parsing is done, -1 if error,
+        otherwise, return the object that will be parsed next.
         """
         # the program assumes the syntax of LEF file is correct
-        if data[0] == "MACRO":
-            name = data[1]
-            new_state = Macro(name)
-            return new_state
-        elif data[0] == "LAYER" and len(data) == 2: # does not have ;
-            name = data[1]
-            new_state = Layer(name)
-            return new_state
-        elif data[0] == "VIA":
-            name = data[1]
-            new_state = Via(name)
-            return new_state
-        elif data[0] == "END":
-            return 1
-        return 0
+        handler = self._handlers.get(data[0])
+        if handler is None:
+            # return 0 when we parse a undefined statement
+            return 0
+        return handler(self, data) or 0
+
+    def _parse_end(self, data):
+        return 1
+
+    def _parse_end_named(self, data):
+        return 1 if _text(data[1]) == self.name else -1
+
+    def _parse_macro(self, data):
+        return Macro(_name(data[1]))
+
+    def _parse_layer(self, data):
+        if len(data) == 2: # does not have ;
+            return Layer(_name(data[1]))
+
+    def _parse_via(self, data):
+        return Via(_name(data[1]))
+
+    _handlers = _keyword_table({
+        "MACRO": _parse_macro,
+        "LAYER": _parse_layer,
+        "VIA": _parse_via,
+        "END": _parse_end,
+    })
 
     def __str__(self):
         """
@@ -55,10 +90,12 @@ class Macro(Statement):
     Macro class represents a MACRO (cell) in the LEF file.
     """
 
+    __slots__ = ("name", "info", "pin_dict")
+    type = 'MACRO'
+
     def __init__(self, name):
         # initiate the Statement superclass
         Statement.__init__(self)
-        self.type = 'MACRO'
         self.name = name
         # other info is stored in this dictionary
         self.info = {}
@@ -81,48 +118,53 @@ class Macro(Statement):
             s += "            " + str(pin) + '\n'
         return s
 
-    def parse_next(self, data):
-        """
-        Method to add information from a statement from LEF file to a Macro
-        object.
-        :param data: a list of strings that contains pieces of information
-        :return: 0 if in progress, 1 if parsing is done, -1 if error,
-        otherwise, return the object that will be parsed next.
-        """
-        if data[0] == "CLASS":
-            self.info["CLASS"] = data[1]
-        elif data[0] == "ORIGIN":
-            x_cor = float(data[1])
-            y_cor = float(data[2])
-            self.info["ORIGIN"] = (x_cor, y_cor)
-        elif data[0] == "FOREIGN":
-            self.info["FOREIGN"] = data[1:]
-        elif data[0] == "SIZE":
-            width = float(data[1])
-            height = float(data[3])
-            self.info["SIZE"] = (width, height)
-        elif data[0] == "SYMMETRY":
-            self.info["SYMMETRY"] = data[1:]
-        elif data[0] == "SITE":
-            self.info["SITE"] = data[1]
-        elif data[0] == "PIN":
-            new_pin = Pin(data[1])
-            self.pin_dict[data[1]] = new_pin
-            if "PIN" in self.info:
-                self.info["PIN"].append(new_pin)
-            else:
-                self.info["PIN"] = [new_pin]
-            return new_pin
-        elif data[0] == "OBS":
-            new_obs = Obs()
-            self.info["OBS"] = new_obs
-            return new_obs
-        elif data[0] == "END":
-            if data[1] == self.name:
-                return 1
-            else:
-                return -1
-        return 0
+    def _parse_class(self, data):
+        self.info["CLASS"] = _name(data[1])
+
+    def _parse_origin(self, data):
+        x_cor = float(data[1])
+        y_cor = float(data[2])
+        self.info["ORIGIN"] = (x_cor, y_cor)
+
+    def _parse_foreign(self, data):
+        self.info["FOREIGN"] = [_text(token) for token in data[1:]]
+
+    def _parse_size(self, data):
+        width = float(data[1])
+        height = float(data[3])
+        self.info["SIZE"] = (width, height)
+
+    def _parse_symmetry(self, data):
+        self.info["SYMMETRY"] = [_text(token) for token in data[1:]]
+
+    def _parse_site(self, data):
+        self.info["SITE"] = _name(data[1])
+
+    def _parse_pin(self, data):
+        new_pin = Pin(_name(data[1]))
+        self.pin_dict[new_pin.name] = new_pin
+        if "PIN" in self.info:
+            self.info["PIN"].append(new_pin)
+        else:
+            self.info["PIN"] = [new_pin]
+        return new_pin
+
+    def _parse_obs(self, data):
+        new_obs = Obs()
+        self.info["OBS"] = new_obs
+        return new_obs
+
+    _handlers = _keyword_table({
+        "CLASS": _parse_class,
+        "ORIGIN": _parse_origin,
+        "FOREIGN": _parse_foreign,
+        "SIZE": _parse_size,
+        "SYMMETRY": _parse_symmetry,
+        "SITE": _parse_site,
+        "PIN": _parse_pin,
+        "OBS": _parse_obs,
+        "END": Statement._parse_end_named,
+    })
 
     def get_pin(self, pin_name):
         return self.pin_dict[pin_name]
@@ -133,41 +175,58 @@ class Pin(Statement):
     Class Pin represents a PIN statement in the LEF file.
     """
 
+    __slots__ = ("name", "direction", "use", "shape", "port")
+    type = "PIN"
+
     def __init__(self, name):
         Statement.__init__(self)
-        self.type = "PIN"
         self.name = name
-        self.info = {}
+        self.direction = None
+        self.use = None
+        self.shape = None
+        self.port = None
+
+    @property
+    def info(self):
+        """Read-only view of the parsed statements, keyed by LEF keyword"""
+        info = {}
+        for key, value in (("DIRECTION", self.direction), ("USE", self.use),
+                           ("SHAPE", self.shape), ("PORT", self.port)):
+            if value is not None:
+                info[key] = value
+        return info
 
     def __str__(self):
-        s = "DIRECTION: " + self.info["DIRECTION"] + '\n'
-        s += "            Port\n" + str(self.info["PORT"])
+        s = "DIRECTION: " + str(self.direction) + '\n'
+        s += "            Port\n" + str(self.port)
         return s
 
-    def parse_next(self, data):
-        if data[0] == "DIRECTION":
-            self.info["DIRECTION"] = data[1]
-        elif data[0] == "USE":
-            self.info["USE"] = data[1]
-        elif data[0] == "PORT":
-            new_port = Port()
-            self.info["PORT"] = new_port
-            return new_port
-        elif data[0] == "SHAPE":
-            self.info["SHAPE"] = data[1]
-        elif data[0] == "END":
-            if data[1] == self.name:
-                return 1
-            else:
-                return -1
-        # return 0 when we parse a undefined statement
-        return 0
+    def _parse_direction(self, data):
+        self.direction = _name(data[1])
+
+    def _parse_use(self, data):
+        self.use = _name(data[1])
+
+    def _parse_port(self, data):
+        self.port = Port()
+        return self.port
+
+    def _parse_shape(self, data):
+        self.shape = _name(data[1])
+
+    _handlers = _keyword_table({
+        "DIRECTION": _parse_direction,
+        "USE": _parse_use,
+        "PORT": _parse_port,
+        "SHAPE": _parse_shape,
+        "END": Statement._parse_end_named,
+    })
 
     def is_lower_metal(self, split_layer):
-        return self.info["PORT"].is_lower_metal(split_layer)
+        return self.port.is_lower_metal(split_layer)
 
     def get_top_metal(self):
-        return self.info["PORT"].get_top_metal()
+        return self.port.get_top_metal()
 
 
 class Port(Statement):
@@ -176,40 +235,47 @@ class Port(Statement):
     """
 
     # Note: PORT statement does not have name
+    __slots__ = ("layers",)
+    type = "PORT"
+    name = ""
+
     def __init__(self):
         Statement.__init__(self)
-        self.type = "PORT"
-        self.name = ""
-        self.info = {}
+        self.layers = []
+
+    @property
+    def info(self):
+        """Read-only view of the parsed statements, keyed by LEF keyword"""
+        return {"LAYER": self.layers} if self.layers else {}
     
     def __str__(self):
         s = ""
-        for layer in self.info["LAYER"]:
+        for layer in self.layers:
             s += "              " + "LAYER " + layer.name + '\n'
             for shape in layer.shapes:
                 s += str(shape)
         return s    
 
-    def parse_next(self, data):
-        if data[0] == "END":
-            return 1
-        elif data[0] == "LAYER":
-            name = data[1]
-            new_layerdef = LayerDef(data[1])
-            if "LAYER" in self.info:
-                self.info["LAYER"].append(new_layerdef)
-            else:
-                self.info["LAYER"] = [new_layerdef]
-        elif data[0] == "RECT":
-            # error if the self.info["LAYER"] does not exist
-            self.info["LAYER"][-1].add_rect(data)
-        elif data[0] == "POLYGON":
-            self.info["LAYER"][-1].add_polygon(data)
-        return 0
+    def _parse_layerdef(self, data):
+        self.layers.append(LayerDef(_name(data[1])))
+
+    def _parse_rect(self, data):
+        # error if the self.layers is empty
+        self.layers[-1].add_rect(data) # [-1] means the latest layer
+
+    def _parse_polygon(self, data):
+        self.layers[-1].add_polygon(data)
+
+    _handlers = _keyword_table({
+        "END": Statement._parse_end,
+        "LAYER": _parse_layerdef,
+        "RECT": _parse_rect,
+        "POLYGON": _parse_polygon,
+    })
 
     def is_lower_metal(self, split_layer):
         lower = True
-        for layer in self.info["LAYER"]:
+        for layer in self.layers:
             if compare_metal(layer.name, split_layer) >= 0:
                 lower = False
                 break
@@ -217,7 +283,7 @@ class Port(Statement):
 
     def get_top_metal(self):
         highest = "poly"
-        for layer in self.info["LAYER"]:
+        for layer in self.layers:
             if compare_metal(layer.name, highest) > 0:
                 highest = layer.name
         return highest
@@ -231,68 +297,94 @@ class Obs(Statement):
     """
 
     # Note: OBS statement does not have name
+    __slots__ = ("layers",)
+    type = "OBS"
+    name = ""
+
     def __init__(self):
         Statement.__init__(self)
-        self.type = "OBS"
-        self.name = ""
-        self.info = {}
+        self.layers = []
+
+    info = Port.info
 
     def __str__(self):
         s = ""
-        for layer in self.info["LAYER"]:
+        for layer in self.layers:
             s += layer.type + " " + layer.name + "\n"
         return s
 
-    def parse_next(self, data):
-        if data[0] == "END":
-            return 1
-        elif data[0] == "LAYER":
-            name = data[1]
-            new_layerdef = LayerDef(data[1])
-            if "LAYER" in self.info:
-                self.info["LAYER"].append(new_layerdef)
-            else:
-                self.info["LAYER"] = [new_layerdef]
-        elif data[0] == "RECT":
-            # error if the self.info["LAYER"] does not exist
-            self.info["LAYER"][-1].add_rect(data) # [-1] means the latest layer
-        elif data[0] == "POLYGON":
-            self.info["LAYER"][-1].add_polygon(data)
-        return 0
+    # OBS holds the same LAYER/RECT/POLYGON statements as PORT
+    _handlers = Port._handlers
 
 
 class LayerDef:
     """
     Class LayerDef represents the Layer definition inside a PORT or OBS
-    statement.
+    statement. Shapes are kept in flat arrays instead of one object per
+    shape:
+    rects: x0 y0 x1 y1 of every RECT
+    poly_coords: x y of every POLYGON vertex, polygon i owns the vertices
+    poly_offsets[i] to poly_offsets[i+1]
     """
 
     # NOTE: LayerDef has no END statement
     # I think I still need a LayerDef class, but it will not be a subclass of
     #  Statement. It will be a normal object that stores information.
+    __slots__ = ("name", "rects", "poly_coords", "poly_offsets", "_order")
+    type = "LayerDef"
+
     def __init__(self, name):
-        self.type = "LayerDef"
         self.name = name
-        self.shapes = []
+        self.rects = array('d')
+        # polygon storage and the rect/polygon order (0 rect, 1 polygon)
+        # are only created once the layer has a polygon
+        self.poly_coords = None
+        self.poly_offsets = None
+        self._order = None
 
     def add_rect(self, data):
-        x0 = float(data[1])
-        y0 = float(data[2])
-        x1 = float(data[3])
-        y1 = float(data[4])
-        points = [(x0, y0), (x1, y1)]
-        rect = Rect(points)
-        self.shapes.append(rect)
+        self.rects.extend(map(float, data[1:5]))
+        if self._order is not None:
+            self._order.append(0)
 
     def add_polygon(self, data):
-        points = []
-        # add each pair of (x, y) points to a list
-        for idx in range(1, len(data) - 2, 2):
-            x_cor = float(data[idx])
-            y_cor = float(data[idx+1])
-            points.append([x_cor, y_cor])
-        polygon = Polygon(points)
-        self.shapes.append(polygon)
+        if self.poly_coords is None:
+            self.poly_coords = array('d')
+            self.poly_offsets = array('L', [0])
+            self._order = bytearray(len(self.rects) // 4)
+        # add each pair of (x, y) points, the last token is ';'
+        coords = data[1:1 + 2 * ((len(data) - 2) // 2)]
+        self.poly_coords.extend(map(float, coords))
+        self.poly_offsets.append(len(self.poly_coords) // 2)
+        self._order.append(1)
+
+    def rect_count(self):
+        return len(self.rects) // 4
+
+    def polygon_count(self):
+        return 0 if self.poly_offsets is None else len(self.poly_offsets) - 1
+
+    def _rect_view(self, idx):
+        x0, y0, x1, y1 = self.rects[4 * idx:4 * idx + 4]
+        return Rect([(x0, y0), (x1, y1)])
+
+    def _polygon_view(self, idx):
+        start, end = self.poly_offsets[idx], self.poly_offsets[idx + 1]
+        coords = self.poly_coords[2 * start:2 * end]
+        return Polygon([[coords[i], coords[i + 1]] for i in range(0, len(coords), 2)])
+
+    @property
+    def shapes(self):
+        """Read-only Rect/Polygon views of the shapes, in LEF order"""
+        if self._order is None:
+            return [self._rect_view(idx) for idx in range(self.rect_count())]
+        shapes = []
+        counts = [0, 0]
+        views = (self._rect_view, self._polygon_view)
+        for kind in self._order:
+            shapes.append(views[kind](counts[kind]))
+            counts[kind] += 1
+        return shapes
 
 
 class Rect:
@@ -301,8 +393,10 @@ class Rect:
     """
 
     # Question: Do I really need a Rect class?
+    __slots__ = ("points",)
+    type = "RECT"
+
     def __init__(self, points):
-        self.type = "RECT"
         self.points = points
     
     def __str__(self):
@@ -314,8 +408,10 @@ class Polygon:
     """
     Class Polygon represents a Polygon definition in a LayerDef
     """
+    __slots__ = ("points",)
+    type = "POLYGON"
+
     def __init__(self, points):
-        self.type = "POLYGON"
         self.points = points
     
     def __str__(self):
@@ -325,10 +421,14 @@ class Layer(Statement):
     """
     Layer class represents a LAYER section in LEF file.
     """
+    __slots__ = ("name", "layer_type", "spacing_table", "spacing", "width",
+                 "pitch", "direction", "offset", "resistance", "thickness",
+                 "height", "capacitance", "edge_cap", "property")
+    type = "LAYER"
+
     def __init__(self, name):
         # initiate the Statement superclass
         Statement.__init__(self)
-        self.type = "LAYER"
         self.name = name
         self.layer_type = None
         self.spacing_table = None
@@ -344,73 +444,94 @@ class Layer(Statement):
         self.edge_cap = None
         self.property = None
 
-    def parse_next(self, data):
-        """
-        Method to add information from a statement from LEF file to a Layer
-        object.
-        :param data: a list of strings that contains pieces of information
-        :return: 0 if in progress, 1 if parsing is done, -1 if error,
-        otherwise, return the object that will be parsed next.
-        """
-        if data[0] == "TYPE":
-            self.layer_type = data[1]
-        elif data[0] == "SPACINGTABLE":
-            pass
-        elif data[0] == "SPACING":
-            self.spacing = float(data[1])
-        elif data[0] == "WIDTH":
-            self.width = float(data[1])
-        elif data[0] == "PITCH":
-            self.pitch = float(data[1])
-        elif data[0] == "DIRECTION":
-            self.direction = data[1]
-        elif data[0] == "OFFSET":
-            if data[2] == ';':
-                self.offset = (float(data[1]), float(data[1]))
-            else:
-                self.offset = (float(data[1]), float(data[2]))
-        elif data[0] == "RESISTANCE":
-            if self.layer_type == "ROUTING":
-                self.resistance = (data[1], float(data[2]))
-            elif self.layer_type == "CUT":
-                self.resistance = float(data[1])
-        elif data[0] == "THICKNESS":
-            self.thickness = float(data[1])
-        elif data[0] == "HEIGHT":
-            self.height = float(data[1])
-        elif data[0] == "CAPACITANCE":
-            self.capacitance = (data[1], float(data[2]))
-        elif data[0] == "EDGECAPACITANCE":
-            self.edge_cap = float(data[1])
-        elif data[0] == "PROPERTY":
-            self.property = (data[1], float(data[2]))
-        elif data[0] == "END":
-            if data[1] == self.name:
-                return 1
-            else:
-                return -1
-        return 0
+    def _parse_type(self, data):
+        self.layer_type = _name(data[1])
+
+    def _parse_spacing(self, data):
+        self.spacing = float(data[1])
+
+    def _parse_width(self, data):
+        self.width = float(data[1])
+
+    def _parse_pitch(self, data):
+        self.pitch = float(data[1])
+
+    def _parse_direction(self, data):
+        self.direction = _name(data[1])
+
+    def _parse_offset(self, data):
+        if _text(data[2]) == ';':
+            self.offset = (float(data[1]), float(data[1]))
+        else:
+            self.offset = (float(data[1]), float(data[2]))
+
+    def _parse_resistance(self, data):
+        if self.layer_type == "ROUTING":
+            self.resistance = (_text(data[1]), float(data[2]))
+        elif self.layer_type == "CUT":
+            self.resistance = float(data[1])
+
+    def _parse_thickness(self, data):
+        self.thickness = float(data[1])
+
+    def _parse_height(self, data):
+        self.height = float(data[1])
+
+    def _parse_capacitance(self, data):
+        self.capacitance = (_text(data[1]), float(data[2]))
+
+    def _parse_edge_cap(self, data):
+        self.edge_cap = float(data[1])
+
+    def _parse_property(self, data):
+        try:
+            self.property = (_text(data[1]), float(data[2]))
+        except ValueError:
+            # LEF58 properties hold a quoted rule string
+            self.property = (_text(data[1]), _text(data[2]))
+
+    # SPACINGTABLE is not parsed yet, it falls through as an undefined statement
+    _handlers = _keyword_table({
+        "TYPE": _parse_type,
+        "SPACING": _parse_spacing,
+        "WIDTH": _parse_width,
+        "PITCH": _parse_pitch,
+        "DIRECTION": _parse_direction,
+        "OFFSET": _parse_offset,
+        "RESISTANCE": _parse_resistance,
+        "THICKNESS": _parse_thickness,
+        "HEIGHT": _parse_height,
+        "CAPACITANCE": _parse_capacitance,
+        "EDGECAPACITANCE": _parse_edge_cap,
+        "PROPERTY": _parse_property,
+        "END": Statement._parse_end_named,
+    })
 
 class Via(Statement):
     """
     Via class represents a VIA section in LEF file.
     """
+    __slots__ = ("name", "layers")
+    type = "VIA"
+
     def __init__(self, name):
         # initiate the Statement superclass
         Statement.__init__(self)
-        self.type = "VIA"
         self.name = name
         self.layers = []
 
-    def parse_next(self, data):
-        if data[0] == "END":
-            return 1
-        elif data[0] == "LAYER":
-            name = data[1]
-            new_layerdef = LayerDef(data[1])
-            self.layers.append(new_layerdef)
-        elif data[0] == "RECT":
-            self.layers[-1].add_rect(data) # [-1] means the latest layer
-        elif data[0] == "POLYGON":
-            self.layers.add_polygon(data)
-        return 0
+    def _parse_layerdef(self, data):
+        self.layers.append(LayerDef(_name(data[1])))
+
+    def _parse_rect(self, data):
+        self.layers[-1].add_rect(data) # [-1] means the latest layer
+
+    def _parse_polygon(self, data):
+        self.layers[-1].add_polygon(data)
+
+    _handlers = _keyword_table({
+        "END": Statement._parse_end,
+        "LAYER": _parse_layerdef,
+        "RECT": _parse_rect,
+        "POLYGON": _parse_polygon,
+    })
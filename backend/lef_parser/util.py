@@ -7,6 +7,7 @@ Date: August 2016
 
 SCALE = 2000
 import matplotlib.pyplot as plt
+from matplotlib.collections import PolyCollection
 import numpy as np
 import math
 
@@ -145,21 +146,95 @@ def draw_pin(pin, ax):
     draw_port(pin.info["PORT"], color, ax, False)
     
     # Annotate the pin name at the center of the first layer's shape
-    for layer in pin.info["PORT"].info["LAYER"]:
-        for shape in layer.shapes:            
+    annotate_pin(pin, ax)
+        
+def layer_vertices(layer, scale=SCALE):
+    """
+    Scaled vertices of the shapes of a LayerDef, read from its coordinate
+    arrays without creating Rect or Polygon objects.
+    :param layer: a LayerDef object
+    :param scale: factor applied to the coordinates
+    :return: a (n, 4, 2) array of the rects and a list of (k, 2) arrays of the polygons
+    """
+    rects = np.frombuffer(layer.rects, dtype=np.float64).reshape(-1, 4) * scale
+    # corners in the order of rect_to_polygon
+    rect_verts = rects[:, [0, 1, 0, 3, 2, 3, 2, 1]].reshape(-1, 4, 2)
+    if layer.poly_offsets is None:
+        return rect_verts, []
+    coords = np.frombuffer(layer.poly_coords, dtype=np.float64).reshape(-1, 2) * scale
+    offsets = layer.poly_offsets
+    polys = [coords[offsets[idx]:offsets[idx + 1]] for idx in range(len(offsets) - 1)]
+    return rect_verts, polys
+
+
+def add_shape_collections(groups, ax):
+    """
+    Add one PolyCollection per style, the shapes of a layer look the same
+    as the patches of draw_obs and draw_port.
+    :param groups: {(layer_name, color, fill): [LayerDef, ...]}
+    :param ax: a Matplotlib Axes instance
+    :return: the added collections
+    """
+    collections = []
+    for (layer_name, color, fill), layers in groups.items():
+        rect_chunks, polys = [], []
+        for layer in layers:
+            rect_verts, layer_polys = layer_vertices(layer)
+            rect_chunks.append(rect_verts)
+            polys.extend(layer_polys)
+        rect_verts = np.concatenate(rect_chunks)
+        for verts in (rect_verts, polys):
+            if not len(verts):
+                continue
+            collection = PolyCollection(verts, closed=True, facecolors=color if fill else "none",
+                                        edgecolors=color, gid=layer_name)
+            ax.add_collection(collection)
+            collections.append(collection)
+    return collections
+
+
+def annotate_pin(pin, ax):
+    """Write the pin name at the center of the first shape of its PORT"""
+    for layer in pin.info["PORT"].info.get("LAYER", []):
+        for shape in layer.shapes:
             scaled_pts = scalePts(shape.points, SCALE)
             if shape.type == "RECT":
                 scaled_pts = rect_to_polygon(scaled_pts)
-            # else: # shape.type POLYGON
             x_center = (scaled_pts[0][0] + scaled_pts[2][0]) / 2.0
-            y_center = (scaled_pts[0][1] + scaled_pts[2][1]) / 2.0            
+            y_center = (scaled_pts[0][1] + scaled_pts[2][1]) / 2.0
             ax.annotate(pin.name, xy=(x_center, y_center), ha='center', va='center', color='gray', size=15, zorder=10)
-            break
-        break
-        
+            return
+
+
 def draw_macro(macro, ax):
     """
     Function to draw a Macro (cell) object on a specified Axes.
+    The shapes are batched into a few PolyCollection artists, grouped by
+    layer and style, a macro with thousands of shapes draws as fast as a
+    small one.
+    :param macro: a Macro object
+    :param ax: a Matplotlib Axes instance
+    :return: void
+    """
+    groups = {}
+    # draw OBS (if it exists)
+    if "OBS" in macro.info:
+        for layer in macro.info["OBS"].info.get("LAYER", []):
+            groups.setdefault((layer.name, "blue", True), []).append(layer)
+    # draw each PIN
+    for pin in macro.info["PIN"]:
+        if "PORT" not in pin.info:
+            continue
+        color = "blue" if pin.name.lower() in ["vdd", "gnd", "vss"] else "red"
+        for layer in pin.info["PORT"].info.get("LAYER", []):
+            groups.setdefault((layer.name, color, False), []).append(layer)
+        annotate_pin(pin, ax)
+    add_shape_collections(groups, ax)
+
+
+def draw_macro_patches(macro, ax):
+    """
+    draw_macro with one patch per shape, slow on big macros.
     :param macro: a Macro object
     :param ax: a Matplotlib Axes instance
     :return: void
@@ -1,3 +1,8 @@
 from .library_manager import LibraryManager, library_manager
+from .library_loader import LibraryLoader, library_loader
+from .score_cache import ScoreCache
+from .score_service import ScoreService, score_service
+from .batch_score import BatchScoreJob, export_scores
+from .thumbnail_store import ThumbnailStore, ThumbnailPrerender, thumbnail_prerender
 from .llm_client import LLMClient
 from .window import *
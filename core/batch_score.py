@@ -0,0 +1,144 @@
+import csv
+import os
+from functools import partial
+from PyQt5.QtCore import QObject, pyqtSignal
+from .library_manager import library_manager
+from .score_service import score_service
+
+CSV_COLUMNS = ["macro", "library", "macro_score", "pin_count", "min_pin_score", "mean_pin_score", "pin_density"]
+
+# macros per job, the progress and cancellation work per chunk
+DEFAULT_CHUNK = 200
+
+
+def score_rows(macro_scores, pin_scores, pin_density, macro_names):
+    """
+    Combine the metrics of the macros into one row per macro.
+    :return: a list of dicts with the CSV_COLUMNS keys
+    """
+    rows = []
+    for name in macro_names:
+        pins = pin_scores.get(name) or {}
+        lef_file = library_manager().libraries.library_of(name)
+        rows.append({
+            "macro": name,
+            "library": os.path.basename(lef_file) if lef_file else "",
+            "macro_score": macro_scores.get(name),
+            "pin_count": len(pins),
+            "min_pin_score": min(pins.values()) if pins else None,
+            "mean_pin_score": sum(pins.values()) / len(pins) if pins else None,
+            "pin_density": pin_density.get(name),
+        })
+    return rows
+
+
+def export_scores(rows, path):
+    """
+    Write score rows to a .csv file, or to a .parquet file when pandas
+    and a parquet engine are installed.
+    """
+    if path.lower().endswith(".parquet"):
+        if not parquet_available():
+            raise RuntimeError("Parquet export needs pandas and pyarrow")
+        import pandas
+        pandas.DataFrame(rows, columns=CSV_COLUMNS).to_parquet(path, index=False)
+        return
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def parquet_available():
+    try:
+        import pandas
+        import pyarrow
+    except ImportError:
+        return False
+    return True
+
+
+class BatchScoreJob(QObject):
+    """
+    Macro score, pin score and pin density of every loaded macro, run as
+    chunks of macros on the ScoreService workers.
+    """
+    METRICS = ("macro_score", "pin_score", "pin_density")
+
+    progress = pyqtSignal(int, int)  # finished chunk jobs, all chunk jobs
+    finished = pyqtSignal(list)  # score rows
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK, parent=None):
+        super().__init__(parent)
+        self.chunk_size = chunk_size
+        self.macro_names = []
+        self.results = {}
+        # key -> callback of the jobs still running
+        self._pending = {}
+        self._total = 0
+
+    def start(self):
+        self.cancel()
+        lm = library_manager()
+        calcs = {"macro_score": lm.calc_macro_score, "pin_score": lm.calc_pin_score,
+                 "pin_density": lm.calc_pin_density}
+        self.macro_names = list(lm.get_all_macros())
+        self.results = {metric: {} for metric in self.METRICS}
+        chunks = [self.macro_names[i:i + self.chunk_size] for i in range(0, len(self.macro_names), self.chunk_size)]
+        self._total = len(chunks) * len(self.METRICS)
+        service = score_service()
+        self._connect_service(True)
+        for index, chunk in enumerate(chunks):
+            for metric in self.METRICS:
+                key = ('batch', metric, index, len(chunks))
+                callback = partial(self._on_result, key, metric)
+                self._pending[key] = callback
+                service.submit(key, partial(calcs[metric], macro_names=chunk), callback)
+        self.progress.emit(0, self._total)
+        if not self._pending:
+            self._finish()
+
+    def is_running(self):
+        return bool(self._pending)
+
+    def _on_result(self, key, metric, scores):
+        if self._pending.pop(key, None) is None:
+            return
+        self.results[metric].update(scores)
+        self.progress.emit(self._total - len(self._pending), self._total)
+        if not self._pending:
+            self._finish()
+
+    def _connect_service(self, connect):
+        service = score_service()
+        for signal, slot in ((service.failed, self._on_failed), (service.cancelled, self._on_cancelled)):
+            if connect:
+                signal.connect(slot)
+            else:
+                signal.disconnect(slot)
+
+    def _finish(self):
+        self._connect_service(False)
+        self.finished.emit(score_rows(self.results["macro_score"], self.results["pin_score"],
+                                      self.results["pin_density"], self.macro_names))
+
+    def _on_failed(self, key, error):
+        if key in self._pending:
+            self.cancel()
+            self.failed.emit(error)
+
+    def _on_cancelled(self, key):
+        # e.g. the libraries changed
+        if key in self._pending:
+            self.cancel()
+
+    def cancel(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        for key, callback in pending.items():
+            score_service().cancel(key, callback)
+        self._connect_service(False)
+        self.cancelled.emit()
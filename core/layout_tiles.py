@@ -0,0 +1,544 @@
+"""
+Tiled rendering of placed layouts
+A layout is cut into a pyramid of square raster tiles per layer: level 0
+shows the whole die in one tile and every level doubles the resolution.
+Tiles are rendered in worker processes and kept in a memory LRU and on
+disk, like the tiles of a map viewer. While a tile is missing the view
+scales up a coarser one.
+"""
+import hashlib
+import math
+import multiprocessing
+import os
+import re
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from PyQt5.QtCore import QObject, Qt, QRectF, QBuffer, QIODevice, pyqtSignal
+from PyQt5.QtGui import QImage, QPainter, QPen, QBrush, QColor, QPixmap
+from backend.lef_parser.util import layer_vertices
+from .macro_thumbnail import ThumbnailCache, macro_styles
+from .window import setting_manager
+
+TILE_PIXELS = 256
+# instance outlines, drawn under the layers
+INSTANCE_LAYER = "instances"
+# below these cell heights in pixels a tile shades the cells by the shape
+# density of the layer, or the pixels when cells are smaller than them
+MIN_DETAIL_PIXELS = 4
+MIN_BOX_PIXELS = 1
+DENSITY_SHADES = 8
+# the deepest level has about a nanometer per pixel
+MIN_PIXEL_SIZE = 0.001
+MAX_LEVEL = 20
+# levels rendered ahead after a layout is loaded
+PREFETCH_LEVELS = 3
+DEFAULT_MAX_BYTES = 1 << 30
+# threads reading stored tiles, and the reads queued on them at most
+IO_THREADS = 2
+MAX_READS = 8
+INSTANCE_COLOR = "#808080"
+INSTANCE_DENSITY = 0.1
+LAYER_COLORS = ["#1f77b4", "#d62728", "#2ca02c", "#ff7f0e", "#9467bd",
+                "#8c564b", "#e377c2", "#17becf", "#bcbd22", "#7f7f7f"]
+
+# (x, y) -> (x, y) @ M.T for the DEF orientations in ORIENTS order
+ORIENT_MATRICES = np.array([
+    [[1, 0], [0, 1]],  # N
+    [[0, -1], [1, 0]],  # W, 90 degrees counterclockwise
+    [[-1, 0], [0, -1]],  # S
+    [[0, 1], [-1, 0]],  # E, 90 degrees clockwise
+    [[-1, 0], [0, 1]],  # FN, mirrored about the y axis
+    [[0, 1], [1, 0]],  # FW
+    [[1, 0], [0, -1]],  # FS, mirrored about the x axis
+    [[0, -1], [-1, 0]],  # FE
+], dtype=np.float64)
+# orientations whose width and height are swapped
+ROTATED_ORIENTS = [1, 3, 5, 7]
+
+
+def orient_rects(rects, width, height, orient):
+    """
+    Rects of a macro in the frame of an instance placed with orient, the
+    lower left corner of the placed macro is the origin.
+    :param rects: (k, 4) array of x0, y0, x1, y1 in macro coordinates
+    :return: a (k, 4) array
+    """
+    matrix = ORIENT_MATRICES[orient]
+    corners = rects.reshape(-1, 2, 2) @ matrix.T
+    origin = (np.array([[0, 0], [width, height]]) @ matrix.T).min(axis=0)
+    return np.hstack([corners.min(axis=1) - origin, corners.max(axis=1) - origin])
+
+
+def _macro_rects(macro):
+    """
+    Shapes of a macro per layer, polygons by their bounding boxes.
+    :return: {layer name: (k, 4) array of x0, y0, x1, y1}
+    """
+    chunks = {}
+    for color, fill, layers in macro_styles(macro):
+        for layer in layers:
+            rect_verts, polys = layer_vertices(layer, 1)
+            chunks.setdefault(layer.name, []).append(rect_verts.reshape(-1, 8)[:, [0, 1, 4, 5]])
+            if polys:
+                chunks[layer.name].append(np.array([np.concatenate([points.min(axis=0), points.max(axis=0)])
+                                                    for points in polys]))
+    return {name: np.concatenate(parts) for name, parts in chunks.items()}
+
+
+class LayoutGeometry():
+    """
+    Placed instances of a DefDscp with the shapes of their macros per layer,
+    sent once to every tile worker. Instances of macros that are not loaded
+    are left out.
+    """
+    def __init__(self, def_dscp, macros):
+        count = len(def_dscp.macro_names)
+        self.sizes = np.zeros((count, 2))
+        # how far the shapes of a macro reach out of its SIZE box, on any side
+        overhangs = np.zeros(count)
+        # layer -> (k, 4) rects per macro index
+        self.shapes = {}
+        for idx, name in enumerate(def_dscp.macro_names):
+            if name not in macros:
+                continue
+            macro = macros[name]
+            self.sizes[idx] = macro.info.get("SIZE", (0, 0))
+            for layer_name, rects in _macro_rects(macro).items():
+                self.shapes.setdefault(layer_name, [np.zeros((0, 4))] * count)[idx] = rects
+                if len(rects):
+                    outside = np.concatenate([-rects[:, :2], rects[:, 2:] - self.sizes[idx]])
+                    overhangs[idx] = max(overhangs[idx], outside.max())
+        self.layers = [INSTANCE_LAYER] + sorted(self.shapes)
+        # shape area of every macro per layer, for the density of coarse tiles
+        self.areas = {name: np.array([((r[:, 2] - r[:, 0]) * (r[:, 3] - r[:, 1])).sum() for r in rects])
+                      for name, rects in self.shapes.items()}
+
+        known = self.sizes[def_dscp.inst_macro].prod(axis=1) > 0
+        macro = def_dscp.inst_macro[known]
+        orient = def_dscp.inst_orient[known]
+        size = self.sizes[macro]
+        rotated = np.isin(orient, ROTATED_ORIENTS)
+        width = np.where(rotated, size[:, 1], size[:, 0])
+        height = np.where(rotated, size[:, 0], size[:, 1])
+        # sorted by x0, tiles find their instances by binary search
+        order = np.argsort(def_dscp.inst_x[known], kind='stable')
+        self.macro, self.orient = macro[order], orient[order]
+        self.x0, self.y0 = def_dscp.inst_x[known][order], def_dscp.inst_y[known][order]
+        self.x1, self.y1 = self.x0 + width[order], self.y0 + height[order]
+        self.overhang = overhangs[self.macro]
+        self.max_width = float(width.max()) if len(width) else 0.0
+        self.max_overhang = float(self.overhang.max()) if len(self.overhang) else 0.0
+        self.cell_height = float(np.median(size[:, 1])) if len(size) else 1.0
+
+        die = def_dscp.die_area
+        if die is None:
+            die = (self.x0.min(), self.y0.min(), self.x1.max(), self.y1.max()) if len(self.x0) else (0, 0, 1, 1)
+        self.die_area = tuple(float(value) for value in die)
+        self.side = max(die[2] - die[0], die[3] - die[1], 1e-3)
+        self.max_level = min(MAX_LEVEL, max(0, math.ceil(math.log2(self.side / (TILE_PIXELS * MIN_PIXEL_SIZE)))))
+
+    def __len__(self):
+        return len(self.x0)
+
+    def layer_color(self, layer):
+        if layer == INSTANCE_LAYER:
+            return INSTANCE_COLOR
+        return LAYER_COLORS[(self.layers.index(layer) - 1) % len(LAYER_COLORS)]
+
+    def tile_rect(self, level, tx, ty):
+        """
+        World rect of a tile, rows are counted from the top of the die.
+        :return: (x0, y0, x1, y1) in microns
+        """
+        size = self.side / (1 << level)
+        x0 = self.die_area[0] + tx * size
+        y1 = self.die_area[1] + self.side - ty * size
+        return x0, y1 - size, x0 + size, y1
+
+    def select(self, x0, y0, x1, y1):
+        """Indices of the instances whose shapes may overlap a rect"""
+        lo = np.searchsorted(self.x0, x0 - self.max_width - self.max_overhang, 'left')
+        hi = np.searchsorted(self.x0, x1 + self.max_overhang, 'right')
+        pad = self.overhang[lo:hi]
+        mask = (self.x1[lo:hi] + pad > x0) & (self.x0[lo:hi] - pad < x1) & \
+               (self.y1[lo:hi] + pad > y0) & (self.y0[lo:hi] - pad < y1)
+        return np.flatnonzero(mask) + lo
+
+    def instance_rects(self, idx):
+        return np.stack([self.x0[idx], self.y0[idx], self.x1[idx], self.y1[idx]], axis=1)
+
+    def layer_rects(self, layer, idx):
+        """
+        Placed shapes of a layer of some instances.
+        :return: a (n, 4) array of x0, y0, x1, y1
+        """
+        shapes = self.shapes.get(layer)
+        if shapes is None or not len(idx):
+            return np.zeros((0, 4))
+        keys = self.macro[idx].astype(np.int64) * len(ORIENT_MATRICES) + self.orient[idx]
+        order = np.argsort(keys, kind='stable')
+        groups = np.split(idx[order], np.flatnonzero(np.diff(keys[order])) + 1)
+        chunks = []
+        for group in groups:
+            macro, orient = self.macro[group[0]], self.orient[group[0]]
+            if not len(shapes[macro]):
+                continue
+            placed = orient_rects(shapes[macro], *self.sizes[macro], orient)
+            offsets = np.stack([self.x0[group], self.y0[group]] * 2, axis=1)
+            chunks.append((placed[None, :, :] + offsets[:, None, :]).reshape(-1, 4))
+        return np.concatenate(chunks) if chunks else np.zeros((0, 4))
+
+    def layer_weights(self, layer, idx):
+        """Shape area of a layer per instance"""
+        if layer == INSTANCE_LAYER:
+            # a light shade under the layers
+            return INSTANCE_DENSITY * (self.x1[idx] - self.x0[idx]) * (self.y1[idx] - self.y0[idx])
+        areas = self.areas.get(layer)
+        return areas[self.macro[idx]] if areas is not None else np.zeros(len(idx))
+
+
+def _pixel_rects(rects, left, top, scale):
+    """QRectFs of world rects in a tile whose top left corner is at left, top"""
+    # y axis up
+    pixels = (rects - [left, top, left, top]) * [scale, -scale, scale, -scale]
+    return [QRectF(px0, py1, px1 - px0, py0 - py1) for px0, py0, px1, py1 in pixels.tolist()]
+
+
+def render_tile(geometry, layer, level, tx, ty):
+    """
+    Draw one tile of one layer, safe to call outside the GUI thread.
+    :return: a transparent QImage of TILE_PIXELS square
+    """
+    image = QImage(TILE_PIXELS, TILE_PIXELS, QImage.Format_ARGB32_Premultiplied)
+    image.fill(Qt.transparent)
+    x0, y0, x1, y1 = geometry.tile_rect(level, tx, ty)
+    scale = TILE_PIXELS / (x1 - x0)
+    idx = geometry.select(x0, y0, x1, y1)
+    if not len(idx):
+        return image
+    color = QColor(geometry.layer_color(layer))
+
+    if geometry.cell_height * scale < MIN_BOX_PIXELS:
+        # cells are below a pixel, draw how much of each pixel is covered
+        cx = (geometry.x0[idx] + geometry.x1[idx]) / 2
+        cy = (geometry.y0[idx] + geometry.y1[idx]) / 2
+        hist, _, _ = np.histogram2d((y1 - cy) * scale, (cx - x0) * scale, bins=TILE_PIXELS,
+                                    range=[[0, TILE_PIXELS], [0, TILE_PIXELS]],
+                                    weights=geometry.layer_weights(layer, idx))
+        alpha = np.sqrt(np.clip(hist * scale * scale, 0, 1))
+        pixels = np.empty((TILE_PIXELS, TILE_PIXELS, 4), dtype=np.uint8)
+        # premultiplied BGRA
+        for channel, value in enumerate((color.blue(), color.green(), color.red(), 255)):
+            pixels[:, :, channel] = (alpha * value).astype(np.uint8)
+        return QImage(pixels.data, TILE_PIXELS, TILE_PIXELS, TILE_PIXELS * 4,
+                      QImage.Format_ARGB32_Premultiplied).copy()
+
+    painter = QPainter(image)
+    if geometry.cell_height * scale < MIN_DETAIL_PIXELS:
+        # shapes are too small to tell apart, shade the cells by how much
+        # of them the layer covers
+        rects = geometry.instance_rects(idx)
+        coverage = geometry.layer_weights(layer, idx) / np.maximum(
+            (rects[:, 2] - rects[:, 0]) * (rects[:, 3] - rects[:, 1]), 1e-12)
+        shades = np.minimum(np.sqrt(coverage) * DENSITY_SHADES, DENSITY_SHADES).astype(np.int64)
+        painter.setPen(Qt.NoPen)
+        for shade in np.unique(shades[shades > 0]).tolist():
+            fill = QColor(color)
+            fill.setAlphaF(shade / DENSITY_SHADES)
+            painter.setBrush(QBrush(fill))
+            painter.drawRects(_pixel_rects(rects[shades == shade], x0, y1, scale))
+        painter.end()
+        return image
+
+    if layer == INSTANCE_LAYER:
+        rects, brush = geometry.instance_rects(idx), QBrush(Qt.NoBrush)
+    else:
+        fill = QColor(color)
+        fill.setAlpha(110)
+        rects, brush = geometry.layer_rects(layer, idx), QBrush(fill)
+    painter.setPen(QPen(color, 0))
+    painter.setBrush(brush)
+    painter.drawRects(_pixel_rects(rects, x0, y1, scale))
+    painter.end()
+    return image
+
+
+def image_png(image):
+    buffer = QBuffer()
+    buffer.open(QIODevice.WriteOnly)
+    image.save(buffer, "PNG")
+    return bytes(buffer.data())
+
+
+def default_tile_dir():
+    """tiles directory next to settings.json"""
+    return os.path.join(os.path.dirname(setting_manager().config_path), 'tiles')
+
+
+def layout_key(def_file, lef_files):
+    """
+    Identity of a layout: path, size and mtime of its DEF file and of the
+    LEF files its macros come from.
+    :return: a hex string
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for path in [def_file] + sorted(lef_files):
+        stat = os.stat(path)
+        digest.update(b"%s %d %d;" % (os.path.abspath(path).encode(), stat.st_size, stat.st_mtime_ns))
+    return digest.hexdigest()
+
+
+class TileStore():
+    """
+    Size-capped directory of tile PNGs, one folder per layout, layer and
+    level. The least recently written tiles are removed when it grows too
+    big.
+    """
+    def __init__(self, store_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.store_dir = store_dir or default_tile_dir()
+        self.max_bytes = max_bytes
+        self._written = 0
+
+    def path(self, key, layer, level, tx, ty):
+        return os.path.join(self.store_dir, key, re.sub(r'[^\w.-]', '_', layer), str(level), f"{tx}_{ty}.png")
+
+    def has(self, key, layer, level, tx, ty):
+        return os.path.exists(self.path(key, layer, level, tx, ty))
+
+    def load(self, key, layer, level, tx, ty):
+        """
+        :return: the PNG bytes, or None when the tile is not stored
+        """
+        try:
+            with open(self.path(key, layer, level, tx, ty), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def save(self, key, layer, level, tx, ty, data):
+        path = self.path(key, layer, level, tx, ty)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = "%s.%d.%d.tmp" % (path, os.getpid(), threading.get_ident())
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self._written += len(data)
+        if self._written > self.max_bytes // 16:
+            self._written = 0
+            self.evict()
+
+    def evict(self):
+        """Remove the oldest tiles above max_bytes"""
+        files = []
+        for folder, _, names in os.walk(self.store_dir):
+            for name in names:
+                path = os.path.join(folder, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime_ns, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+
+# LayoutGeometry and TileStore of a tile worker process, set by its initializer
+_worker_geometry = None
+_worker_store = None
+
+
+def _init_tile_worker(geometry, store_dir):
+    global _worker_geometry, _worker_store
+    _worker_geometry = geometry
+    _worker_store = TileStore(store_dir)
+
+
+def render_tile_png(layer, level, tx, ty, key):
+    """
+    Render a tile in a worker process and store it.
+    :return: the PNG bytes
+    """
+    data = image_png(render_tile(_worker_geometry, layer, level, tx, ty))
+    _worker_store.save(key, layer, level, tx, ty, data)
+    return data
+
+
+def _rendered(future):
+    """Decode a finished render in the pool thread, (QImage, None) or (None, error)"""
+    try:
+        return QImage.fromData(future.result(), "PNG"), None
+    except Exception as e:
+        return None, e
+
+
+class TileRenderer(QObject):
+    """
+    Serves the tiles of one layout, a tile is looked up in the memory LRU,
+    then read from disk on the I/O threads, and rendered by the worker
+    processes at last. The tiles in view are loaded first, the first
+    levels of the pyramid are loaded ahead when the workers are idle.
+    """
+    tile_ready = pyqtSignal(object)  # (layer, level, tx, ty)
+    progress = pyqtSignal(int)  # tiles loading, rendering or waiting for a worker
+    # emitted by the pool threads, queued to the GUI thread
+    _tile_read = pyqtSignal(int, object, object)  # generation, tile, QImage or None when not stored
+    _tile_done = pyqtSignal(int, object, object, object)  # generation, tile, QImage, error
+
+    def __init__(self, max_items=512, max_workers=None, store=None, parent=None):
+        super().__init__(parent)
+        # the same LRU as the thumbnails, key[0] is the layer here
+        self.cache = ThumbnailCache(max_items)
+        self.store = store or TileStore()
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) // 2)
+        self.geometry = None
+        self.layout_key = None
+        self._pool = None
+        self._io = ThreadPoolExecutor(IO_THREADS, thread_name_prefix='tile-io')
+        # bumped by shutdown, tiles of an older layout are dropped
+        self._generation = 0
+        self._wanted = []
+        self._prefetch = deque()
+        self._in_view = set()
+        self._prefetched = set()
+        # tiles reading, waiting for a worker or rendering
+        self._pending = set()
+        self._to_render = []
+        self._reading = 0
+        self._rendering = 0
+        self._tile_read.connect(self._on_tile_read)
+        self._tile_done.connect(self._on_tile_done)
+
+    def set_layout(self, geometry, key):
+        """
+        :param geometry: a LayoutGeometry, None to drop the layout
+        :param key: layout_key of the layout, names its tiles on disk
+        """
+        self.shutdown()
+        self.cache.invalidate()
+        self.geometry, self.layout_key = geometry, key
+        if geometry is not None:
+            # spawned, forking a process with running Qt threads is not safe
+            self._pool = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context('spawn'),
+                                             initializer=_init_tile_worker,
+                                             initargs=(geometry, self.store.store_dir))
+
+    def cached(self, tile):
+        """
+        A tile from memory only, painting never waits for the disk.
+        :param tile: (layer, level, tx, ty)
+        :return: a QPixmap, or None when it is not loaded yet
+        """
+        return self.cache.get(tile)
+
+    def want(self, tiles):
+        """
+        The missing tiles in view, most wanted first. Replaces the tiles
+        wanted before that are not loading yet.
+        """
+        self._in_view = set(tiles)
+        self._wanted = [tile for tile in tiles if tile not in self._pending]
+        # tiles scrolled out of view are not rendered, the prefetch is kept
+        for tile in [tile for tile in self._to_render if tile not in self._in_view and tile not in self._prefetched]:
+            self._to_render.remove(tile)
+            self._pending.discard(tile)
+        self._schedule()
+
+    def prefetch(self, layers, levels=PREFETCH_LEVELS):
+        """Load the first levels of the pyramid of the layers"""
+        if self.geometry is None:
+            return
+        self._prefetch.clear()
+        for level in range(min(levels, self.geometry.max_level) + 1):
+            count = 1 << level
+            for ty in range(count):
+                for tx in range(count):
+                    self._prefetch.extend((layer, level, tx, ty) for layer in layers)
+        self._prefetched = set(self._prefetch)
+        self._schedule()
+
+    def _next_tile(self):
+        while self._wanted or self._prefetch:
+            tile = self._wanted.pop(0) if self._wanted else self._prefetch.popleft()
+            if tile not in self._pending and self.cache.get(tile) is None:
+                return tile
+        return None
+
+    def _read_tile(self, key, tile):
+        """Decode a stored tile on an I/O thread, None when it is not stored"""
+        data = self.store.load(key, *tile)
+        image = QImage.fromData(data, "PNG") if data is not None else None
+        return image if image is not None and not image.isNull() else None
+
+    def _schedule(self):
+        if self._pool is not None:
+            # every tile is looked up on disk first
+            while self._reading < MAX_READS:
+                tile = self._next_tile()
+                if tile is None:
+                    break
+                self._pending.add(tile)
+                self._reading += 1
+                future = self._io.submit(self._read_tile, self.layout_key, tile)
+                future.add_done_callback(lambda future, tile=tile, generation=self._generation:
+                                         self._tile_read.emit(generation, tile, future.result()))
+            while self._to_render and self._rendering < 2 * self.max_workers:
+                # the tiles in view first
+                tile = next((tile for tile in self._to_render if tile in self._in_view), self._to_render[0])
+                self._to_render.remove(tile)
+                self._rendering += 1
+                future = self._pool.submit(render_tile_png, *tile, self.layout_key)
+                future.add_done_callback(lambda future, tile=tile, generation=self._generation:
+                                         self._tile_done.emit(generation, tile, *_rendered(future)))
+        self.progress.emit(len(self._pending) + len(self._wanted))
+
+    def _on_tile_read(self, generation, tile, image):
+        if generation != self._generation:
+            return
+        self._reading -= 1
+        if image is None:
+            # not stored, render it
+            self._to_render.append(tile)
+        else:
+            self._pending.discard(tile)
+            self.cache.put(tile, QPixmap.fromImage(image))
+            self.tile_ready.emit(tile)
+        self._schedule()
+
+    def _on_tile_done(self, generation, tile, image, error):
+        if generation != self._generation:
+            return
+        self._rendering -= 1
+        self._pending.discard(tile)
+        if isinstance(error, BrokenProcessPool):
+            # a worker died, render with a new pool
+            print(f"Tile rendering failed: {error}")
+            self.set_layout(self.geometry, self.layout_key)
+            return
+        if error is not None:
+            print(f"Tile {tile} failed: {error}")
+        elif not image.isNull():
+            self.cache.put(tile, QPixmap.fromImage(image))
+            self.tile_ready.emit(tile)
+        self._schedule()
+
+    def shutdown(self):
+        self._generation += 1
+        self._wanted = []
+        self._prefetch.clear()
+        self._in_view, self._prefetched = set(), set()
+        self._pending.clear()
+        self._to_render = []
+        self._reading = self._rendering = 0
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
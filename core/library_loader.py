@@ -0,0 +1,84 @@
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from PyQt5.QtCore import QObject, pyqtSignal
+from .library_manager import library_manager
+
+
+class _Load():
+    __slots__ = ("lef_files", "futures", "done")
+
+    def __init__(self, lef_files):
+        self.lef_files = lef_files
+        self.futures = []
+        self.done = 0
+
+
+class LibraryLoader(QObject):
+    """
+    Reads LEF files on worker threads, the libraries are added and the
+    observers notified in the GUI thread once every file of a load is
+    read. Loads are added in the order they were requested.
+    """
+    _instance = None
+
+    started = pyqtSignal(list)  # LEF files
+    loaded = pyqtSignal(list)  # LEF files
+    failed = pyqtSignal(str, str)  # LEF file, error message
+    # emitted by the workers, queued to the GUI thread
+    _file_read = pyqtSignal(object)  # _Load
+
+    def __init__(self, max_workers=None, parent=None):
+        super().__init__(parent)
+        self._pool = ThreadPoolExecutor(max_workers or min(4, os.cpu_count() or 1), thread_name_prefix='lef')
+        self._loads = deque()
+        self._file_read.connect(self._on_file_read)
+
+    def load_lef_files(self, lef_files):
+        """Add LEF files without blocking, the first file has the lowest precedence"""
+        lef_files = [os.path.abspath(lef_file) for lef_file in lef_files]
+        if not lef_files:
+            return
+        load = _Load(lef_files)
+        for lef_file in lef_files:
+            future = self._pool.submit(library_manager().open_lef_file, lef_file)
+            future.add_done_callback(lambda future, load=load: self._file_read.emit(load))
+            load.futures.append(future)
+        self._loads.append(load)
+        self.started.emit(lef_files)
+
+    def is_loading(self):
+        return bool(self._loads)
+
+    def _on_file_read(self, load):
+        load.done += 1
+        # a later load waits for the earlier ones, it takes precedence
+        while self._loads and self._loads[0].done == len(self._loads[0].futures):
+            self._finish(self._loads.popleft())
+
+    def _finish(self, load):
+        lef_files, lef_dscps, errors = [], [], []
+        for lef_file, future in zip(load.lef_files, load.futures):
+            try:
+                lef_dscps.append(future.result())
+                lef_files.append(lef_file)
+            except Exception as e:
+                print(f"Loading {lef_file} failed: {e}")
+                errors.append((lef_file, str(e)))
+        if lef_files:
+            library_manager().add_libraries(lef_files, lef_dscps)
+        self.loaded.emit(lef_files)
+        for lef_file, error in errors:
+            self.failed.emit(lef_file, error)
+
+    @staticmethod
+    def get_instance():
+        """Static method to get the single instance of LibraryLoader"""
+        if LibraryLoader._instance is None:
+            LibraryLoader._instance = LibraryLoader()
+        return LibraryLoader._instance
+
+
+def library_loader() -> LibraryLoader:
+    """Helper funtion to get LibraryLoader inst"""
+    return LibraryLoader.get_instance()
@@ -1,9 +1,19 @@
 import os, json
-import pacpy
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from .observe import Subject
 from .window import setting_manager, SettingManager
-from backend.lef_parser import LefDscp, parse_lef_file
-from .pin_destiny import calc_pin_density
+from backend.lef_parser import LefCache, LefLibrarySet, parse_lef_file
+from backend.def_parser import parse_def_file
+from .pin_destiny import PinDensityCache, calc_pin_density, calc_pin_access
+from .score_cache import ScoreCache
+from .pac_bridge import PacBridge
+
+
+def rule_params(pac_rule):
+    """Parameters of a pac rule the scores depend on, part of the score cache key"""
+    return (pac_rule.get('min_width', 0.6), pac_rule.get('min_space', 0.6), pac_rule.get('expand', True))
+
 
 class LibraryManager(Subject):
     _instance = None
@@ -21,50 +31,235 @@ class LibraryManager(Subject):
             self._initialized = True
             super().__init__()
             
-            self.lef_file = ''
             self.pac_rule = {}            
-            self.lef_dscp: LefDscp = None
+            # loaded LEF files in load order, later files win on name clashes
+            self.libraries = LefLibrarySet()
+            # macros changed by the last reload, None when everything changed
+            self.changed_macros = None
+            # parsed LEF snapshots next to settings.json
+            config_dir = os.path.dirname(setting_manager().config_path)
+            self.lef_cache = LefCache(os.path.join(config_dir, 'lef_cache'))
+            # library scores, browsing cells is answered from here
+            self.score_cache = ScoreCache()
+            # (lef_file, metric, params) -> lock held by the pacpy run scoring them
+            self._score_locks = {}
+            # pin densities by macro geometry, a reload only recomputes the edited cells
+            self.pin_density_cache = PinDensityCache()
+            # placed design of the loaded DEF file, drawn with the loaded macros
+            self.layout = None
+            self.layout_file = ''
+            # observers of the layout, notified when a DEF file is loaded
+            self.layout_subject = Subject()
+
+    @property
+    def lef_dscp(self):
+        """Merged view of the loaded libraries, None when nothing is loaded"""
+        return self.libraries if self.libraries.libraries else None
+
+    @property
+    def lef_file(self):
+        """The LEF file loaded last"""
+        files = self.libraries.files()
+        return files[-1] if files else ''
         
     def change_value(self):
         self.notify()
 
+    def add_layout_observer(self, observer):
+        self.layout_subject.add_observer(observer)
+
+    def remove_layout_observer(self, observer):
+        self.layout_subject.remove_observer(observer)
+
+    def open_lef_file(self, lef_file):
+        """
+        Read a LEF file from its snapshot or parse it, safe to call from a
+        worker thread. The libraries are not changed.
+        :return: a LefDscp
+        """
+        lef_dscp = self.lef_cache.load(lef_file)
+        if lef_dscp is None:
+            lef_dscp = parse_lef_file(lef_file, lazy=True)
+            self.lef_cache.build_in_background(lef_file)
+        return lef_dscp
+
     def load_lef_file(self, lef_file):
-        self.lef_file = lef_file
-        self.lef_dscp = parse_lef_file(lef_file)
+        """Add a LEF file to the loaded libraries"""
+        self.load_lef_files([lef_file])
+
+    def load_lef_files(self, lef_files):
+        """
+        Add several LEF files, they are read concurrently by worker threads
+        and take precedence in the given order. Blocks until they are read,
+        the GUI loads through library_loader instead.
+        """
+        lef_files = [os.path.abspath(lef_file) for lef_file in lef_files]
+        if not lef_files:
+            return
+        with ThreadPoolExecutor(min(len(lef_files), os.cpu_count() or 1)) as pool:
+            lef_dscps = list(pool.map(self.open_lef_file, lef_files))
+        self.add_libraries(lef_files, lef_dscps)
+
+    def add_libraries(self, lef_files, lef_dscps):
+        """
+        Add LEF files read by open_lef_file, in order of precedence.
+        :param lef_files: absolute paths of the LEF files
+        :param lef_dscps: their LefDscps
+        """
+        for lef_file, lef_dscp in zip(lef_files, lef_dscps):
+            self.libraries.add(lef_file, lef_dscp)
+            self.score_cache.invalidate(lef_file)
+        self.score_cache.invalidate(ScoreCache.MERGED)
+        self.changed_macros = None
+        self.change_value()
+
+    def remove_lef_file(self, lef_file):
+        """Drop one library, the others are not parsed again"""
+        lef_dscp = self.libraries.remove(os.path.abspath(lef_file))
+        if lef_dscp is None:
+            return
+        # removed, or now taken from another library
+        self.changed_macros = set(lef_dscp.macros)
+        self.score_cache.invalidate(os.path.abspath(lef_file))
+        # the access metrics of every macro depend on the layers
+        self.score_cache.invalidate(ScoreCache.MERGED, None if lef_dscp.layers else self.changed_macros)
+        self.change_value()
+
+    def reload_lef_file(self, lef_file=None):
+        """
+        Read a loaded LEF file again, or all of them when lef_file is None.
+        Only the changed macros are re-parsed.
+        """
+        lef_files = [os.path.abspath(lef_file)] if lef_file else self.libraries.files()
+        changed = set()
+        layers_changed = False
+        for lef_file in lef_files:
+            lef_dscp = self.libraries.libraries.get(lef_file)
+            if lef_dscp is None:
+                continue
+            names = lef_dscp.reload(lef_file)
+            changed = None if names is None or changed is None else changed | names
+            layers_changed = layers_changed or bool(lef_dscp.layers)
+            self.libraries.add(lef_file, lef_dscp)
+            if names is not None:
+                # the unchanged macros are taken from the previous snapshot
+                self.lef_cache.update_in_background(lef_file, lef_dscp, names)
+            self.score_cache.invalidate(lef_file, names)
+        # the access metrics of every macro depend on the layers
+        self.score_cache.invalidate(ScoreCache.MERGED, None if layers_changed else changed)
+        self.changed_macros = changed
         self.change_value()
     
-    def _get_base_pac_input(self):
+    def clear_score_cache(self):
+        """Forget every cached score, e.g. after the pac rules were edited"""
+        self.score_cache.clear()
+
+    def _rule_params(self):
+        """Parameters of the current pac rule the scores depend on"""
         self.pac_rule = setting_manager().get_pac_rule()
-        
-        lef_file = self.lef_file
-        base_name = os.path.basename(lef_file)
-        path = os.path.dirname(lef_file)
-        
-        min_width = self.pac_rule.get('min_width', 0.6)
-        s = {"lefFiles": base_name, "min_width": min_width, "path": path}
-        return s
+        return rule_params(self.pac_rule)
+
+    @staticmethod
+    def _macro_names(macro_name, macro_names):
+        """Requested macros as a list, None for all of them"""
+        if macro_name:
+            return [macro_name]
+        return None if macro_names is None else list(macro_names)
+
+    def _library_scores(self, lef_file, metric, params, calc, names, generation):
+        """
+        Scores of one LEF file. pacpy scores whole libraries, it runs once
+        per library, metric and rule and the requested macros are taken
+        from its result.
+        """
+        if names is not None:
+            scores = self.score_cache.find(lef_file, metric, params, names)
+            if len(scores) == len(names):
+                return scores
+        # requests of other macros of the library wait for the same run
+        with self._score_locks.setdefault((lef_file, metric, params), threading.Lock()):
+            scores = self.score_cache.get(lef_file, metric, params)
+            if scores is None:
+                scores = json.loads(calc(lef_file))
+                self.score_cache.put(lef_file, metric, params, scores, generation=generation)
+        return scores if names is None else {name: scores[name] for name in names if name in scores}
+
+    def _pac_lef_files(self, names):
+        """
+        LEF files to score: every cell library, or the ones defining names.
+        :return: {lef_file: names taken from it, None for all}
+        """
+        if names is None:
+            # a copy, libraries are added by the GUI thread while workers score
+            libraries = list(self.libraries.libraries.items())
+            return {lef_file: None for lef_file, lef_dscp in libraries if len(lef_dscp.macros)}
+        lef_files = {}
+        for name in names:
+            lef_file = self.libraries.library_of(name)
+            if lef_file:
+                lef_files.setdefault(lef_file, []).append(name)
+        return lef_files
     
-    def calc_macro_score(self, macro_name=None):
-        base_input = self._get_base_pac_input()
-        
-        score = pacpy.calc_macro_score(json.dumps(base_input))
-        macro_scores = json.loads(score)
-        return {macro_name: macro_scores.get(macro_name, None)} if macro_name else macro_scores
+    def _pac_macro_score(self, lef_file):
+        return PacBridge(lef_file).calc_macro_score(self.pac_rule)
+
+    def _pac_pin_score(self, lef_file):
+        return PacBridge(lef_file).calc_pin_score(self.pac_rule)
+
+    def calc_macro_score(self, macro_name=None, macro_names=None):
+        """
+        Macro scores of pacpy, of the requested macros only.
+        :param macro_names: several macros instead of one or all of them
+        """
+        names = self._macro_names(macro_name, macro_names)
+        generation = self.score_cache.generation
+        macro_scores = {}
+        params = self._rule_params()
+        for lef_file, lef_names in self._pac_lef_files(names).items():
+            macro_scores.update(self._library_scores(lef_file, 'macro_score', params, self._pac_macro_score,
+                                                     lef_names, generation))
+        return {name: macro_scores.get(name, None) for name in names} if names is not None else macro_scores
     
-    def calc_pin_score(self, macro_name=None):        
-        base_input = self._get_base_pac_input()    
-            
-        base_input["min_space"] = self.pac_rule.get('min_space', 0.6)
-        base_input["expand"] = self.pac_rule.get('expand', True)
-        score = pacpy.calc_pin_score(json.dumps(base_input))
-        pin_scores = json.loads(score)
-        return {macro_name: pin_scores.get(macro_name, {})} if macro_name else pin_scores
-
-    def calc_pin_density(self, macro_name=None):
-        return calc_pin_density(self.lef_dscp.macros, macro_name) if self.lef_dscp else {}
+    def calc_pin_score(self, macro_name=None, macro_names=None):
+        names = self._macro_names(macro_name, macro_names)
+        generation = self.score_cache.generation
+        pin_scores = {}
+        params = self._rule_params()
+        for lef_file, lef_names in self._pac_lef_files(names).items():
+            pin_scores.update(self._library_scores(lef_file, 'pin_score', params, self._pac_pin_score,
+                                                   lef_names, generation))
+        return {name: pin_scores.get(name, {}) for name in names} if names is not None else pin_scores
+
+    def _merged_scores(self, metric, params, names, calc):
+        """Scores over the merged libraries, single macros are kept as partial results"""
+        generation = self.score_cache.generation
+        if not self.lef_dscp:
+            return {}
+        scores = self.score_cache.get(ScoreCache.MERGED, metric, params, names)
+        if scores is None:
+            scores = calc()
+            self.score_cache.put(ScoreCache.MERGED, metric, params, scores, names is None, generation)
+        return scores
+
+    def calc_pin_density(self, macro_name=None, macro_names=None):
+        names = self._macro_names(macro_name, macro_names)
+        return self._merged_scores('pin_density', (), names,
+                                   lambda: calc_pin_density(self.lef_dscp.macros, macro_names=names,
+                                                            cache=self.pin_density_cache))
+
+    def calc_pin_access(self, macro_name=None, macro_names=None):
+        """2D pin access metrics, on the grid pitch of the current pac rule"""
+        names = self._macro_names(macro_name, macro_names)
+        pitch = setting_manager().get_pac_rule().get('grid_pitch') or None
+        return self._merged_scores('pin_access', (pitch,), names,
+                                   lambda: calc_pin_access(self.lef_dscp.macros, self.lef_dscp.layers,
+                                                           pitch=pitch, macro_names=names))
             
     def load_def_file(self, def_file):
-        pass
+        """Load the placement of a DEF file, the libraries stay as they are"""
+        self.layout_file = os.path.abspath(def_file)
+        self.layout = parse_def_file(self.layout_file)
+        self.layout_subject.notify()
     
     def load_gds_file(self, gds_file):
         pass
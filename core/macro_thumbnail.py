@@ -0,0 +1,218 @@
+import hashlib
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PyQt5.QtCore import QObject, Qt, QRectF, QPointF, pyqtSignal
+from PyQt5.QtGui import QImage, QPainter, QPen, QBrush, QColor, QPolygonF, QPixmap
+from backend.lef_parser.util import layer_vertices
+from .library_manager import library_manager
+
+THUMBNAIL_SIZE = 128
+SUPPLY_PINS = ("vdd", "gnd", "vss")
+
+
+def macro_styles(macro):
+    """
+    Layers of a macro in drawing order, with the colors of draw_macro.
+    :return: a list of (color, fill, [LayerDef, ...])
+    """
+    styles = {}
+    if "OBS" in macro.info:
+        styles[("blue", True)] = list(macro.info["OBS"].info.get("LAYER", []))
+    for pin in macro.info["PIN"]:
+        if "PORT" not in pin.info:
+            continue
+        color = "blue" if pin.name.lower() in SUPPLY_PINS else "red"
+        styles.setdefault((color, False), []).extend(pin.info["PORT"].info.get("LAYER", []))
+    return [(color, fill, layers) for (color, fill), layers in styles.items() if layers]
+
+
+def macro_digest(macros, name):
+    """
+    Content hash of a macro, the hash of its MACRO block when the library
+    knows it, else the hash of its shapes.
+    :param macros: name -> Macro mapping the macro is in
+    :return: a hex string
+    """
+    block_digest = getattr(macros, "digest", None)
+    digest = block_digest(name) if block_digest is not None else None
+    if digest is not None:
+        return digest.hex()
+    macro = macros[name]
+    geometry = hashlib.blake2b(repr(macro.info.get("SIZE")).encode(), digest_size=16)
+    for color, fill, layers in macro_styles(macro):
+        geometry.update(b"%s %d;" % (color.encode(), fill))
+        for layer in layers:
+            polys = layer.poly_offsets is not None
+            geometry.update(b"%d %d;" % (len(layer.rects), len(layer.poly_offsets) if polys else 0))
+            geometry.update(layer.rects)
+            if polys:
+                geometry.update(layer.poly_coords)
+                geometry.update(layer.poly_offsets)
+    return geometry.hexdigest()
+
+
+def render_macro_image(macro, size=THUMBNAIL_SIZE, dark_mode=False):
+    """
+    Draw a macro into a square QImage, safe to call outside the GUI thread.
+    :param macro: a Macro object
+    :param size: width and height in pixels
+    :return: a QImage
+    """
+    image = QImage(size, size, QImage.Format_ARGB32_Premultiplied)
+    image.fill(QColor('#19232D' if dark_mode else '#FAFAFA'))
+    shapes = []
+    low, high = np.full(2, np.inf), np.full(2, -np.inf)
+    for color, fill, layers in macro_styles(macro):
+        rects, polys = [], []
+        for layer in layers:
+            rect_verts, layer_polys = layer_vertices(layer, 1)
+            rects.append(rect_verts)
+            polys.extend(layer_polys)
+        for points in rects + polys:
+            if len(points):
+                points = points.reshape(-1, 2)
+                low, high = np.minimum(low, points.min(axis=0)), np.maximum(high, points.max(axis=0))
+        shapes.append((color, fill, np.concatenate(rects), polys))
+    width, height = macro.info.get("SIZE", (0, 0))
+    if width and height:
+        low, high = np.minimum(low, 0), np.maximum(high, (width, height))
+    if not np.isfinite(low).all():
+        return image
+
+    painter = QPainter(image)
+    painter.setRenderHint(QPainter.Antialiasing)
+    margin = size * 0.05
+    scale = (size - 2 * margin) / max((high - low).max(), 1e-9)
+    # centered, y axis up
+    offset = (size - (high - low) * scale) / 2
+    painter.translate(offset[0] - low[0] * scale, size - offset[1] + low[1] * scale)
+    painter.scale(scale, -scale)
+    for color, fill, rect_verts, polys in shapes:
+        painter.setPen(QPen(QColor(color), 0))
+        painter.setBrush(QBrush(QColor(color)) if fill else QBrush(Qt.NoBrush))
+        painter.drawRects([QRectF(x0, y0, x1 - x0, y1 - y0)
+                           for x0, y0, _, _, x1, y1, _, _ in rect_verts.reshape(-1, 8).tolist()])
+        for points in polys:
+            painter.drawPolygon(QPolygonF([QPointF(x, y) for x, y in points.tolist()]))
+    painter.end()
+    return image
+
+
+class ThumbnailCache():
+    """Least recently used thumbnails, at most max_items of them."""
+    def __init__(self, max_items=600):
+        self.max_items = max_items
+        self._items = OrderedDict()
+
+    def get(self, key):
+        pixmap = self._items.get(key)
+        if pixmap is not None:
+            self._items.move_to_end(key)
+        return pixmap
+
+    def put(self, key, pixmap):
+        self._items[key] = pixmap
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+
+    def invalidate(self, names=None):
+        """Drop the thumbnails of the macros, all of them when names is None"""
+        if names is None:
+            self._items.clear()
+            return
+        for key in [key for key in self._items if key[0] in names]:
+            del self._items[key]
+
+    def __len__(self):
+        return len(self._items)
+
+
+class ThumbnailRenderer(QObject):
+    """
+    Renders macro thumbnails on worker threads into a ThumbnailCache, the
+    pixmaps are made in the GUI thread when the images arrive. With a
+    ThumbnailStore, stored thumbnails are read instead of rendered.
+    """
+    thumbnail_ready = pyqtSignal(str)  # macro name
+    # emitted by the workers, queued to the GUI thread
+    _rendered = pyqtSignal(object, object)  # key, QImage
+
+    def __init__(self, max_items=600, max_workers=None, store=None, parent=None):
+        super().__init__(parent)
+        self.cache = ThumbnailCache(max_items)
+        self.store = store
+        self._pool = ThreadPoolExecutor(max_workers or min(4, os.cpu_count() or 1), thread_name_prefix='thumbnail')
+        # keys requested and not rendered yet
+        self._pending = set()
+        self._rendered.connect(self._on_rendered)
+
+    def request(self, name, size=THUMBNAIL_SIZE, dark_mode=False):
+        """
+        The thumbnail of a macro, rendered in the background on a miss.
+        :return: a QPixmap, or None until thumbnail_ready is emitted for name
+        """
+        key = (name, size, dark_mode)
+        pixmap = self.cache.get(key)
+        if pixmap is None and key not in self._pending:
+            self._pending.add(key)
+            self._pool.submit(self._render, key, library_manager().lef_dscp.macros)
+        return pixmap
+
+    def _render(self, key, macros):
+        if key not in self._pending:
+            # not wanted any more, e.g. scrolled out of view
+            return
+        name, size, dark_mode = key
+        try:
+            if self.store is None:
+                image = render_macro_image(macros[name], size, dark_mode)
+            else:
+                digest = macro_digest(macros, name)
+                image = self.store.load(digest, size, dark_mode)
+                if image is None:
+                    image = render_macro_image(macros[name], size, dark_mode)
+                    self.store.save(digest, size, dark_mode, image)
+        except Exception as e:
+            print(f"Thumbnail of {key[0]} failed: {e}")
+            image = None
+        self._rendered.emit(key, image)
+
+    def _on_rendered(self, key, image):
+        if key not in self._pending:
+            return
+        self._pending.discard(key)
+        if image is not None:
+            self.cache.put(key, QPixmap.fromImage(image))
+            self.thumbnail_ready.emit(key[0])
+
+    def pending_names(self):
+        return {key[0] for key in self._pending}
+
+    def cancel_pending(self, names=None):
+        """Forget the requests not rendered yet, only those of names when given"""
+        if names is None:
+            self._pending.clear()
+            return
+        names = set(names)
+        self._pending = {key for key in self._pending if key[0] not in names}
+
+    def invalidate(self, names=None):
+        self.cancel_pending()
+        self.cache.invalidate(names)
+
+
+def cancel_hidden_requests(renderer, view, index_of):
+    """
+    Forget the thumbnail requests of the rows scrolled out of a view. The
+    rows still in view keep theirs, a small scroll only repaints the rows
+    it uncovers and they would not ask again.
+    :param renderer: ThumbnailRenderer of the view
+    :param view: a QAbstractItemView
+    :param index_of: macro name -> index of its row in the model of view
+    """
+    rect = view.viewport().rect()
+    renderer.cancel_pending([name for name in renderer.pending_names()
+                             if not view.visualRect(index_of(name)).intersects(rect)])
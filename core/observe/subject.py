@@ -14,5 +14,6 @@ class Subject():
         self.observers.remove(observer)
         
     def notify(self):
-        for observer in self.observers:
+        # an observer may remove itself in update
+        for observer in list(self.observers):
             observer.update()
@@ -0,0 +1,32 @@
+import json
+import os
+import pacpy
+
+
+class PacBridge():
+    """
+    pacpy calls for one loaded LEF file. pacpy only takes a path, it reads
+    and parses the LEF file natively on every call, so the ScoreCache keeps
+    the calls to one per library, metric and rule.
+    """
+    def __init__(self, lef_file):
+        self.lef_file = lef_file
+
+    def base_input(self, pac_rule):
+        return {"lefFiles": os.path.basename(self.lef_file),
+                "min_width": pac_rule.get('min_width', 0.6),
+                "path": os.path.dirname(self.lef_file)}
+
+    def pin_input(self, pac_rule):
+        pac_input = self.base_input(pac_rule)
+        pac_input["min_space"] = pac_rule.get('min_space', 0.6)
+        pac_input["expand"] = pac_rule.get('expand', True)
+        return pac_input
+
+    def calc_macro_score(self, pac_rule):
+        """:return: JSON text of {macro_name: score} of the whole library"""
+        return pacpy.calc_macro_score(json.dumps(self.base_input(pac_rule)))
+
+    def calc_pin_score(self, pac_rule):
+        """:return: JSON text of {macro_name: {pin_name: score}} of the whole library"""
+        return pacpy.calc_pin_score(json.dumps(self.pin_input(pac_rule)))
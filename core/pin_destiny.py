@@ -1,5 +1,12 @@
+import hashlib
+import math
+import threading
+import numpy as np
 from backend.lef_parser import Macro, Pin, Port, Polygon, Rect
 
+# pins left out of the density, see extract_pin_positions
+SUPPLY_USES = ("POWER", "GROUND")
+
 
 def calculate_macro_pin_score(macro):
     """
@@ -83,22 +90,355 @@ def calculate_variance(pin_positions):
     return sum((x - mean) ** 2 for x in pin_positions) / len(pin_positions)
 
 
+def signal_pins(macro):
+    """
+    Pins of a Macro with a PORT, without the POWER and GROUND pins.
+    :param macro: A Macro object.
+    :return: A list of Pin objects.
+    """
+    return [pin for pin in macro.pin_dict.values()
+            if (pin.use or "").upper() not in SUPPLY_USES and pin.port is not None]
+
+
+def signal_pin_layers(macro):
+    """
+    LayerDef objects of the ports of the signal pins of a Macro, the same
+    shapes extract_pin_positions uses.
+    :param macro: A Macro object.
+    :return: A list of LayerDef objects.
+    """
+    layers = []
+    for pin in signal_pins(macro):
+        layers.extend(pin.port.layers)
+    return layers
+
+
+def collect_pin_centers(macros):
+    """
+    Gather the x centre of every signal pin shape of many macros into flat
+    arrays. The shapes are read straight from the LayerDef arrays, no Rect
+    or Polygon objects are created.
+    :param macros: A list of Macro objects.
+    :return: (centers, macro_ids) arrays, macro_ids[i] is the index in
+             macros of the macro owning centers[i].
+    """
+    rect_chunks, rect_counts = [], []
+    poly_chunks, offset_chunks, poly_counts = [], [], []
+    for macro in macros:
+        rects = polys = 0
+        for layer in signal_pin_layers(macro):
+            rect_chunks.append(layer.rects)
+            rects += len(layer.rects) // 4
+            if layer.poly_offsets is not None:
+                poly_chunks.append(layer.poly_coords)
+                offset_chunks.append(layer.poly_offsets)
+                polys += len(layer.poly_offsets) - 1
+        rect_counts.append(rects)
+        poly_counts.append(polys)
+    macro_index = np.arange(len(macros))
+
+    rects = np.frombuffer(b"".join(rect_chunks), dtype=np.float64).reshape(-1, 4)
+    rect_centers = (rects[:, 0] + rects[:, 2]) / 2
+    rect_ids = np.repeat(macro_index, rect_counts)
+    if not poly_chunks:
+        return rect_centers, rect_ids
+
+    # mean x of the vertices of every polygon, the offsets of every layer
+    # start at 0 again so the differences across layers are dropped
+    poly_x = np.frombuffer(b"".join(poly_chunks), dtype=np.float64)[0::2]
+    offsets = np.frombuffer(b"".join(offset_chunks), dtype=np.dtype(offset_chunks[0].typecode))
+    layer_ends = np.cumsum([len(chunk) for chunk in offset_chunks])[:-1] - 1
+    vertex_counts = np.delete(np.diff(offsets.astype(np.intp)), layer_ends)
+    starts = np.cumsum(vertex_counts) - vertex_counts
+    poly_centers = np.add.reduceat(poly_x, starts) / vertex_counts
+    poly_ids = np.repeat(macro_index, poly_counts)
+    return np.concatenate((rect_centers, poly_centers)), np.concatenate((rect_ids, poly_ids))
+
+
+def calc_pin_density_batch(macros):
+    """
+    Vectorized calculate_macro_pin_score over many macros: the centres of
+    all pins are gathered once and every variance is computed in one pass.
+    :param macros: A list of Macro objects.
+    :return: A list of pin densities, 0 for macros without signal pins.
+    """
+    centers, macro_ids = collect_pin_centers(macros)
+    counts = np.bincount(macro_ids, minlength=len(macros))
+    has_pins = counts > 0
+    safe_counts = np.where(has_pins, counts, 1)
+    mean = np.bincount(macro_ids, weights=centers, minlength=len(macros)) / safe_counts
+    deviation = centers - mean[macro_ids]
+    variance = np.bincount(macro_ids, weights=deviation * deviation, minlength=len(macros)) / safe_counts
+    return [value if pins else 0 for value, pins in zip(variance.tolist(), has_pins.tolist())]
+
+
 def _calc_macro_pin_density(macro_name, all_macros):
     if macro_name not in all_macros:
         raise ValueError(f"Macro '{macro_name}' not found in the provided macros.")
     return {macro_name: calculate_macro_pin_score(all_macros[macro_name])}
 
 
-def calc_pin_density(all_macros, macro_name=None):
+def _select_macros(all_macros, macro_names):
+    """Names and Macro objects of the given names, or of all macros"""
+    if macro_names is None:
+        return list(all_macros.keys()), list(all_macros.values())
+    names = list(macro_names)
+    for name in names:
+        if name not in all_macros:
+            raise ValueError(f"Macro '{name}' not found in the provided macros.")
+    return names, [all_macros[name] for name in names]
+
+
+def pin_geometry_digest(macro):
+    """
+    Hash of the signal pin shapes of a Macro, the pin density only
+    depends on them.
+    :param macro: A Macro object.
+    :return: 16 bytes
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for layer in signal_pin_layers(macro):
+        polys = layer.poly_offsets is not None
+        digest.update(b"%d %d;" % (len(layer.rects), len(layer.poly_offsets) if polys else 0))
+        digest.update(layer.rects)
+        if polys:
+            digest.update(layer.poly_coords)
+            digest.update(layer.poly_offsets)
+    return digest.digest()
+
+
+class PinDensityCache():
+    """
+    Pin densities of macros with the hash of what they were computed from:
+    the MACRO block hash of a lazily loaded library when it is known, the
+    pin geometry otherwise. Only macros whose hash changed, e.g. after a
+    reload, are computed again.
+    """
+    def __init__(self):
+        # name -> (digest, density)
+        self.entries = {}
+        self._lock = threading.Lock()
+
+    def _digest(self, all_macros, name):
+        block_digest = getattr(all_macros, "digest", None)
+        digest = block_digest(name) if block_digest is not None else None
+        return digest if digest is not None else pin_geometry_digest(all_macros[name])
+
+    def calc(self, all_macros, macro_names=None):
+        """
+        Pin densities of the named macros, or of all macros.
+        :return: A dictionary with macro names as keys and pin densities as values.
+        """
+        names = list(all_macros) if macro_names is None else list(macro_names)
+        for name in names:
+            if name not in all_macros:
+                raise ValueError(f"Macro '{name}' not found in the provided macros.")
+        digests = {name: self._digest(all_macros, name) for name in names}
+        with self._lock:
+            stale = [name for name in names if self.entries.get(name, (None,))[0] != digests[name]]
+        if stale:
+            values = calc_pin_density_batch([all_macros[name] for name in stale])
+            with self._lock:
+                for name, value in zip(stale, values):
+                    self.entries[name] = (digests[name], value)
+        with self._lock:
+            if macro_names is None:
+                # macros not loaded anymore
+                for name in set(self.entries).difference(digests):
+                    del self.entries[name]
+            return {name: self.entries[name][1] for name in names}
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+
+def calc_pin_density(all_macros, macro_name=None, macro_names=None, cache=None):
     """
     Calculate the pin density for one or all macros in the LEF file.
     Pin density is calculated as the variance of pin positions.
     Lower variance means better pin distribution (higher score).
     :param all_macros: A dictionary of all Macro objects.
     :param macro_name: The name of a specific macro to calculate. If None, calculate for all macros.
+    :param macro_names: Names of several macros to calculate instead of all macros.
+    :param cache: A PinDensityCache, only macros that changed since it saw them are calculated.
     :return: A dictionary with macro names as keys and pin density scores as values.
              If macro_name is specified, return a single score.
     """
+    if cache is not None:
+        return cache.calc(all_macros, [macro_name] if macro_name else macro_names)
     if macro_name:
         return _calc_macro_pin_density(macro_name, all_macros)
-    return {name: calculate_macro_pin_score(macro) for name, macro in all_macros.items()}
+    names, macros = _select_macros(all_macros, macro_names)
+    return dict(zip(names, calc_pin_density_batch(macros)))
+
+
+# 2D pin access analysis
+# The signal pin shapes of a macro are rasterized on a grid whose step is
+# the routing pitch, polygons count with their bounding box.
+
+DEFAULT_WINDOW = 3
+
+
+def _layer_boxes(layer):
+    """(n, 4) array of x0 y0 x1 y1 of the rects and polygon bounding boxes"""
+    boxes = np.frombuffer(layer.rects, dtype=np.float64).reshape(-1, 4)
+    if layer.poly_offsets is None:
+        return boxes
+    coords = np.frombuffer(layer.poly_coords, dtype=np.float64).reshape(-1, 2)
+    starts = np.frombuffer(layer.poly_offsets, dtype=np.dtype(layer.poly_offsets.typecode))[:-1].astype(np.intp)
+    poly_boxes = np.column_stack((np.minimum.reduceat(coords[:, 0], starts), np.minimum.reduceat(coords[:, 1], starts),
+                                  np.maximum.reduceat(coords[:, 0], starts), np.maximum.reduceat(coords[:, 1], starts)))
+    return np.concatenate((boxes, poly_boxes))
+
+
+def collect_pin_boxes(macro):
+    """
+    Bounding boxes of the signal pin shapes of a Macro.
+    :param macro: A Macro object.
+    :return: (boxes, pin_ids, layer_counts): an (n, 4) array, the index of
+             the pin of every box and the number of shapes per layer.
+    """
+    chunks, pin_ids, layer_counts = [], [], {}
+    for pin_id, pin in enumerate(signal_pins(macro)):
+        for layer in pin.port.layers:
+            boxes = _layer_boxes(layer)
+            chunks.append(boxes)
+            pin_ids.append(np.full(len(boxes), pin_id))
+            layer_counts[layer.name] = layer_counts.get(layer.name, 0) + len(boxes)
+    if not chunks:
+        return np.empty((0, 4)), np.empty(0, dtype=np.intp), layer_counts
+    return np.concatenate(chunks), np.concatenate(pin_ids), layer_counts
+
+
+def routing_layer(layer_counts, layers):
+    """
+    The layer with the smallest PITCH among the layers the pins are drawn on.
+    :param layer_counts: layer names, as returned by collect_pin_boxes.
+    :param layers: A dictionary of Layer objects.
+    :return: A Layer object, or None when none of the layers has a pitch.
+    """
+    routing = [layers[name] for name in layer_counts if name in layers and layers[name].pitch]
+    return min(routing, key=lambda layer: layer.pitch) if routing else None
+
+
+def rasterize_boxes(boxes, nx, ny, pitch):
+    """
+    Number of boxes covering every cell of an ny x nx grid of square cells.
+    :return: an (ny, nx) integer array.
+    """
+    ix0 = np.clip(np.floor(boxes[:, 0] / pitch), 0, nx - 1).astype(np.intp)
+    iy0 = np.clip(np.floor(boxes[:, 1] / pitch), 0, ny - 1).astype(np.intp)
+    ix1 = np.maximum(np.clip(np.ceil(boxes[:, 2] / pitch) - 1, 0, nx - 1).astype(np.intp), ix0)
+    iy1 = np.maximum(np.clip(np.ceil(boxes[:, 3] / pitch) - 1, 0, ny - 1).astype(np.intp), iy0)
+    # 2D difference array, the prefix sums spread every box over its cells
+    diff = np.zeros((ny + 1, nx + 1), dtype=np.int64)
+    np.add.at(diff, (iy0, ix0), 1)
+    np.add.at(diff, (iy0, ix1 + 1), -1)
+    np.add.at(diff, (iy1 + 1, ix0), -1)
+    np.add.at(diff, (iy1 + 1, ix1 + 1), 1)
+    return diff.cumsum(axis=0).cumsum(axis=1)[:ny, :nx]
+
+
+def max_window_density(occupied, window):
+    """Largest share of occupied cells in any window x window block"""
+    ny, nx = occupied.shape
+    wy, wx = min(window, ny), min(window, nx)
+    integral = np.zeros((ny + 1, nx + 1), dtype=np.int64)
+    integral[1:, 1:] = occupied.cumsum(axis=0).cumsum(axis=1)
+    sums = integral[wy:, wx:] - integral[:-wy, wx:] - integral[wy:, :-wx] + integral[:-wy, :-wx]
+    return float(sums.max()) / (wy * wx)
+
+
+def _access_points(boxes, pin_ids, pin_count, pitch, offset):
+    """Routing track crossings inside the shapes of every pin"""
+    def tracks(low, high, start):
+        # tracks on a shape edge count, up to rounding of the coordinates
+        first = np.ceil((low - start) / pitch - 1e-6)
+        last = np.floor((high - start) / pitch + 1e-6)
+        return np.maximum(last - first + 1, 0)
+    points = tracks(boxes[:, 0], boxes[:, 2], offset[0]) * tracks(boxes[:, 1], boxes[:, 3], offset[1])
+    return np.bincount(pin_ids, weights=points, minlength=pin_count)
+
+
+def _pin_spacing(boxes, pin_ids, pin_count):
+    """Distance from every pin centroid to the nearest other pin centroid"""
+    if pin_count < 2:
+        return None
+    area = np.maximum((boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1]), 1e-12)
+    weight = np.bincount(pin_ids, weights=area, minlength=pin_count)
+    cx = np.bincount(pin_ids, weights=area * (boxes[:, 0] + boxes[:, 2]) / 2, minlength=pin_count) / weight
+    cy = np.bincount(pin_ids, weights=area * (boxes[:, 1] + boxes[:, 3]) / 2, minlength=pin_count) / weight
+    dist = np.hypot(cx[:, None] - cx[None, :], cy[:, None] - cy[None, :])
+    np.fill_diagonal(dist, np.inf)
+    return dist.min(axis=1)
+
+
+def calculate_macro_pin_access(macro, layers, pitch=None, window=DEFAULT_WINDOW):
+    """
+    2D pin access metrics of a Macro.
+    :param macro: A Macro object.
+    :param layers: A dictionary of Layer objects, for the routing pitch.
+    :param pitch: grid step, default the routing pitch of the pin layers.
+    :param window: side in cells of the block used for the local density.
+    :return: A dictionary of metrics, None values when they do not apply.
+             Access points are the crossings of the tracks, at the OFFSET
+             of the routing layer, that fall on a pin.
+    """
+    boxes, pin_ids, layer_counts = collect_pin_boxes(macro)
+    pin_count = len(signal_pins(macro))
+    metrics = {
+        "pins": pin_count,
+        "layer_counts": layer_counts,
+        "pitch": None,
+        "grid": None,
+        "occupancy_histogram": [],
+        "occupied_ratio": 0.0,
+        "max_local_density": 0.0,
+        "min_access_points": None,
+        "min_pin_spacing": None,
+        "mean_pin_spacing": None,
+    }
+    if not len(boxes):
+        return metrics
+
+    size = macro.info.get("SIZE")
+    width, height = size if size else (boxes[:, 2].max(), boxes[:, 3].max())
+    layer = routing_layer(layer_counts, layers)
+    pitch = pitch or (layer.pitch if layer else min(width, height) / 10)
+    offset = layer.offset if layer is not None and layer.offset else (pitch / 2, pitch / 2)
+    nx, ny = max(1, math.ceil(width / pitch - 1e-9)), max(1, math.ceil(height / pitch - 1e-9))
+    grid = rasterize_boxes(boxes, nx, ny, pitch)
+    occupied = grid > 0
+
+    access = _access_points(boxes, pin_ids, pin_count, pitch, offset)
+    spacing = _pin_spacing(boxes, pin_ids, pin_count)
+    metrics.update({
+        "pitch": pitch,
+        "grid": (nx, ny),
+        # cells covered by 0, 1, 2, ... shapes
+        "occupancy_histogram": np.bincount(grid.ravel()).tolist(),
+        "occupied_ratio": float(occupied.mean()),
+        "max_local_density": max_window_density(occupied, window),
+        "min_access_points": int(access.min()),
+        "min_pin_spacing": None if spacing is None else float(spacing.min()),
+        "mean_pin_spacing": None if spacing is None else float(spacing.mean()),
+    })
+    return metrics
+
+
+def calc_pin_access(all_macros, layers, macro_name=None, pitch=None, window=DEFAULT_WINDOW, macro_names=None):
+    """
+    2D pin access metrics for one or all macros in the LEF file.
+    :param all_macros: A dictionary of all Macro objects.
+    :param layers: A dictionary of Layer objects, for the routing pitch.
+    :param macro_name: The name of a specific macro. If None, calculate for all macros.
+    :param pitch: grid step, default the routing pitch of the pin layers.
+    :param window: side in cells of the block used for the local density.
+    :param macro_names: Names of several macros to calculate instead of all macros.
+    :return: A dictionary with macro names as keys and metric dictionaries as values.
+    """
+    if macro_name:
+        macro_names = [macro_name]
+    names, macros = _select_macros(all_macros, macro_names)
+    return {name: calculate_macro_pin_access(macro, layers, pitch, window) for name, macro in zip(names, macros)}
@@ -0,0 +1,152 @@
+import itertools
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from PyQt5.QtCore import QObject, pyqtSignal
+from .library_manager import library_manager, rule_params
+from .pac_bridge import PacBridge
+
+SUMMARY_COLUMNS = ["rule", "min_width", "min_space", "expand", "mean_macro_score", "min_macro_score",
+                   "mean_pin_score", "min_pin_score", "worst_macro"]
+
+
+def rule_grid(min_widths, min_spaces, expand=True):
+    """
+    Rule sets of every min_width / min_space pair.
+    :return: {rule_name: pac_rule}
+    """
+    return {f"w{width:g}_s{space:g}": {"min_width": width, "min_space": space, "expand": expand}
+            for width, space in itertools.product(min_widths, min_spaces)}
+
+
+def score_lef_file(lef_file, pac_rule):
+    """
+    Macro and pin scores of one LEF file under one rule, run in a worker process.
+    :return: (macro_scores, pin_scores)
+    """
+    bridge = PacBridge(lef_file)
+    return json.loads(bridge.calc_macro_score(pac_rule)), json.loads(bridge.calc_pin_score(pac_rule))
+
+
+def summarize(rule_name, pac_rule, macro_scores, pin_scores):
+    """One comparison row with the SUMMARY_COLUMNS keys"""
+    scored = {name: score for name, score in macro_scores.items() if score is not None}
+    macro_values = list(scored.values())
+    pin_values = [score for pins in pin_scores.values() for score in pins.values()]
+    return {
+        "rule": rule_name,
+        "min_width": pac_rule.get("min_width", 0.6),
+        "min_space": pac_rule.get("min_space", 0.6),
+        "expand": pac_rule.get("expand", True),
+        "mean_macro_score": sum(macro_values) / len(macro_values) if macro_values else None,
+        "min_macro_score": min(macro_values, default=None),
+        "mean_pin_score": sum(pin_values) / len(pin_values) if pin_values else None,
+        "min_pin_score": min(pin_values, default=None),
+        "worst_macro": min(scored, key=scored.get, default=None),
+    }
+
+
+class RuleSweep(QObject):
+    """
+    Scores the loaded cell libraries under several pac rules, every
+    (LEF file, rule) pair runs in its own worker process. A change of the
+    libraries while it runs cancels the sweep.
+    """
+    progress = pyqtSignal(int, int)  # finished runs, all runs
+    finished = pyqtSignal(list)  # summary rows, in rule order
+    failed = pyqtSignal(str)
+    # emitted by the pool threads, queued to the GUI thread
+    _run_done = pyqtSignal(object, object)  # (rule_name, lef_file), future
+
+    def __init__(self, max_workers=None, parent=None):
+        super().__init__(parent)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._pool = None
+        self._futures = {}
+        self._total = 0
+        self.rules = {}
+        self.lef_files = []
+        # (rule_name, lef_file) -> (macro_scores, pin_scores) of the finished runs
+        self._run_results = {}
+        self.results = {}
+        self._run_done.connect(self._on_run_done)
+
+    def update(self):
+        if self._futures:
+            # the runs score the files as they were at start
+            self.cancel()
+            self.failed.emit("The libraries changed, the sweep was cancelled")
+
+    def start(self, rules):
+        """
+        :param rules: {rule_name: pac_rule}
+        """
+        self.cancel()
+        self.rules = dict(rules)
+        self.results = {}
+        self._run_results = {}
+        libraries = library_manager().libraries
+        # in order of precedence, later files win on name clashes
+        self.lef_files = [lef_file for lef_file in libraries.files() if len(libraries.libraries[lef_file].macros)]
+        runs = [(name, lef_file) for name in self.rules for lef_file in self.lef_files]
+        if not runs:
+            self.finished.emit([])
+            return
+        self._total = len(runs)
+        library_manager().add_observer(self)
+        # spawned, forking a process with running Qt threads is not safe
+        self._pool = ProcessPoolExecutor(min(self.max_workers, len(runs)),
+                                         mp_context=multiprocessing.get_context('spawn'))
+        for run in runs:
+            future = self._pool.submit(score_lef_file, run[1], self.rules[run[0]])
+            self._futures[run] = future
+            future.add_done_callback(lambda future, run=run: self._run_done.emit(run, future))
+        self.progress.emit(0, len(runs))
+
+    def is_running(self):
+        return bool(self._futures)
+
+    def _on_run_done(self, run, future):
+        if self._futures.get(run) is not future:
+            return
+        try:
+            macro_scores, pin_scores = future.result()
+        except Exception as e:
+            self.cancel()
+            self.failed.emit(str(e) or type(e).__name__)
+            return
+        self._run_results[run] = (macro_scores, pin_scores)
+        del self._futures[run]
+        self.progress.emit(self._total - len(self._futures), self._total)
+        if not self._futures:
+            self._shutdown()
+            self._merge()
+            self.finished.emit([summarize(name, rule, *self.results[name]) for name, rule in self.rules.items()])
+
+    def _merge(self):
+        """Library scores per rule, merged like the libraries are"""
+        for rule_name, pac_rule in self.rules.items():
+            macro_scores, pin_scores = {}, {}
+            # switching to a swept rule later needs no pacpy run
+            params = rule_params(pac_rule)
+            for lef_file in self.lef_files:
+                file_macro_scores, file_pin_scores = self._run_results[(rule_name, lef_file)]
+                macro_scores.update(file_macro_scores)
+                pin_scores.update(file_pin_scores)
+                library_manager().score_cache.put(lef_file, 'macro_score', params, file_macro_scores)
+                library_manager().score_cache.put(lef_file, 'pin_score', params, file_pin_scores)
+            self.results[rule_name] = (macro_scores, pin_scores)
+        self._run_results = {}
+
+    def _shutdown(self):
+        if self in library_manager().observers:
+            library_manager().remove_observer(self)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def cancel(self):
+        """Drop the runs not started, the running ones finish unseen"""
+        self._futures = {}
+        self._shutdown()
@@ -0,0 +1,81 @@
+import threading
+
+
+class ScoreCache():
+    """
+    Scores of whole libraries kept in memory, keyed by scope (a LEF file,
+    or '' for the merged library set), metric and rule parameters. An entry
+    may be partial: single macro results are added to it, and macros that
+    changed are pruned from it, a full request is only answered from a
+    complete entry. Scores are computed by worker threads as well, every
+    access holds a lock. A job started before an invalidate can not put its
+    scores back, it passes the generation it started with.
+    """
+    MERGED = ''
+
+    def __init__(self):
+        # (scope, metric, params) -> [scores, complete]
+        self._entries = {}
+        self._lock = threading.Lock()
+        # bumped by invalidate and clear
+        self.generation = 0
+
+    def get(self, scope, metric, params, names=None):
+        """
+        Look up cached scores.
+        :param names: macros wanted, None for all of them
+        :return: {name: score} of the names or all scores, None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get((scope, metric, params))
+            if entry is None:
+                return None
+            scores, complete = entry
+            if names is not None:
+                if not all(name in scores for name in names):
+                    return None
+                return {name: scores[name] for name in names}
+            return dict(scores) if complete else None
+
+    def find(self, scope, metric, params, names):
+        """:return: {name: score} of the names that are cached"""
+        with self._lock:
+            entry = self._entries.get((scope, metric, params))
+            scores = entry[0] if entry else {}
+            return {name: scores[name] for name in names if name in scores}
+
+    def put(self, scope, metric, params, scores, complete=True, generation=None):
+        """
+        Store scores, a partial result is merged into the entry.
+        :param generation: self.generation when the scores were started,
+        stale scores are dropped
+        """
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            entry = self._entries.setdefault((scope, metric, params), [{}, False])
+            entry[0].update(scores)
+            entry[1] = entry[1] or complete
+
+    def invalidate(self, scope, names=None):
+        """
+        Forget the scores of a scope.
+        :param names: only forget these macros, None forgets the whole scope
+        """
+        with self._lock:
+            self.generation += 1
+            for key in [key for key in self._entries if key[0] == scope]:
+                if names is None:
+                    del self._entries[key]
+                    continue
+                entry = self._entries[key]
+                for name in names:
+                    entry[0].pop(name, None)
+                if names:
+                    # added macros are not in the entry either
+                    entry[1] = False
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
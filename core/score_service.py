@@ -0,0 +1,145 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from PyQt5.QtCore import QObject, pyqtSignal
+from .library_manager import library_manager
+
+
+class _Job():
+    __slots__ = ("key", "future", "callbacks")
+
+    def __init__(self, key):
+        self.key = key
+        self.future = None
+        self.callbacks = []
+
+
+class ScoreService(QObject):
+    """
+    Runs pacpy and pin density jobs on worker threads so that the GUI never
+    waits for them, results are delivered by signals in the GUI thread.
+    A request equal to a job still in flight joins that job instead of
+    starting another one.
+    """
+    _instance = None
+
+    result_ready = pyqtSignal(object, object)  # key, result
+    failed = pyqtSignal(object, str)  # key, error message
+    cancelled = pyqtSignal(object)  # key
+    progress = pyqtSignal(int, int)  # finished jobs, submitted jobs
+    # emitted by the workers, queued to the GUI thread
+    _job_done = pyqtSignal(object, object, object)  # job, result, error
+
+    def __init__(self, max_workers=None, parent=None):
+        super().__init__(parent)
+        self._pool = ThreadPoolExecutor(max_workers or min(4, os.cpu_count() or 1), thread_name_prefix='score')
+        # key -> _Job in flight
+        self._jobs = {}
+        self._submitted = 0
+        self._finished = 0
+        self._job_done.connect(self._on_job_done)
+        # results of the libraries before a change are of no use
+        library_manager().add_observer(self)
+
+    def update(self):
+        self.cancel_all()
+
+    def submit(self, key, func, callback=None):
+        """
+        Run func on a worker thread.
+        :param key: identity of the request, equal keys share one job
+        :param func: callable without arguments returning the result
+        :param callback: called with the result in the GUI thread
+        :return: the key, for cancel
+        """
+        job = self._jobs.get(key)
+        if job is None:
+            job = self._jobs[key] = _Job(key)
+            job.future = self._pool.submit(self._run, job, func)
+            self._submitted += 1
+            self._emit_progress()
+        if callback is not None:
+            job.callbacks.append(callback)
+        return key
+
+    def _run(self, job, func):
+        try:
+            result, error = func(), None
+        except Exception as e:
+            result, error = None, str(e) or type(e).__name__
+        self._job_done.emit(job, result, error)
+
+    def _on_job_done(self, job, result, error):
+        if self._jobs.get(job.key) is not job:
+            # cancelled meanwhile
+            return
+        del self._jobs[job.key]
+        self._finished += 1
+        self._emit_progress()
+        if error is not None:
+            print(f"Score job {job.key} failed: {error}")
+            self.failed.emit(job.key, error)
+            return
+        for callback in job.callbacks:
+            callback(result)
+        self.result_ready.emit(job.key, result)
+
+    def _emit_progress(self):
+        self.progress.emit(self._finished, self._submitted)
+        if self._finished == self._submitted:
+            self._submitted = self._finished = 0
+
+    def is_running(self, key):
+        return key in self._jobs
+
+    def cancel(self, key, callback=None):
+        """
+        Cancel a job, its result is dropped when it is running already.
+        :param callback: only drop this callback, the job is cancelled when
+                         no other callback waits for it
+        """
+        job = self._jobs.get(key)
+        if job is None:
+            return
+        if callback is not None:
+            if callback in job.callbacks:
+                job.callbacks.remove(callback)
+            if job.callbacks:
+                return
+        del self._jobs[key]
+        job.future.cancel()
+        self._finished += 1
+        self._emit_progress()
+        self.cancelled.emit(key)
+
+    def cancel_all(self):
+        for key in list(self._jobs):
+            self.cancel(key)
+
+    def calc_macro_score(self, macro_name=None, callback=None):
+        return self.submit(('macro_score', macro_name),
+                           partial(library_manager().calc_macro_score, macro_name), callback)
+
+    def calc_pin_score(self, macro_name=None, callback=None):
+        return self.submit(('pin_score', macro_name),
+                           partial(library_manager().calc_pin_score, macro_name), callback)
+
+    def calc_pin_density(self, macro_name=None, callback=None):
+        return self.submit(('pin_density', macro_name),
+                           partial(library_manager().calc_pin_density, macro_name), callback)
+
+    def calc_pin_access(self, macro_name=None, callback=None):
+        return self.submit(('pin_access', macro_name),
+                           partial(library_manager().calc_pin_access, macro_name), callback)
+
+    @staticmethod
+    def get_instance():
+        """Static method to get the single instance of ScoreService"""
+        if ScoreService._instance is None:
+            ScoreService._instance = ScoreService()
+        return ScoreService._instance
+
+
+def score_service() -> ScoreService:
+    """Helper funtion to get ScoreService inst"""
+    return ScoreService.get_instance()
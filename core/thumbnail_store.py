@@ -0,0 +1,251 @@
+"""
+On-disk cache of macro thumbnails
+The PNG files are addressed by the content hash of the macro, its size in
+pixels and the theme, so a cell is rendered once whatever file it is in
+and a reload only renders the cells whose text changed.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from PyQt5.QtCore import QObject, pyqtSignal
+from PyQt5.QtGui import QImage
+from backend.lef_parser import parse_lef_file
+from backend.lef_parser.lef_cache import LefCache
+from .library_manager import library_manager
+from .macro_thumbnail import macro_digest, render_macro_image
+from .window import setting_manager
+
+# list icons, gallery thumbnails and the preview of the macro view
+PREVIEW_SIZES = (32, 128, 512)
+DEFAULT_MAX_BYTES = 256 << 20
+# macros per pre-render job
+PRERENDER_CHUNK = 200
+
+
+def default_store_dir():
+    """thumbnails directory next to settings.json"""
+    return os.path.join(os.path.dirname(setting_manager().config_path), 'thumbnails')
+
+
+class ThumbnailStore():
+    """
+    Size-capped directory of thumbnail PNGs, the least recently written
+    files are removed when it grows too big.
+    """
+    def __init__(self, store_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.store_dir = store_dir or default_store_dir()
+        self.max_bytes = max_bytes
+        self._written = 0
+
+    def path(self, digest, size, dark_mode):
+        theme = 'dark' if dark_mode else 'light'
+        return os.path.join(self.store_dir, digest[:2], f"{digest}_{size}_{theme}.png")
+
+    def has(self, digest, size, dark_mode):
+        return os.path.exists(self.path(digest, size, dark_mode))
+
+    def load(self, digest, size, dark_mode):
+        """
+        :return: a QImage, or None when it is not stored
+        """
+        image = QImage(self.path(digest, size, dark_mode))
+        return None if image.isNull() else image
+
+    def save(self, digest, size, dark_mode, image):
+        path = self.path(digest, size, dark_mode)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = "%s.%d.%d.tmp.png" % (path, os.getpid(), threading.get_ident())
+        if not image.save(tmp_path, "PNG"):
+            return
+        os.replace(tmp_path, path)
+        self._written += os.path.getsize(path)
+        if self._written > self.max_bytes // 16:
+            self._written = 0
+            self.evict()
+
+    def evict(self):
+        """Remove the oldest thumbnails above max_bytes"""
+        files = []
+        if not os.path.isdir(self.store_dir):
+            return
+        for folder in os.scandir(self.store_dir):
+            if not folder.is_dir():
+                continue
+            # the pre-render workers write and rename files meanwhile
+            try:
+                for entry in os.scandir(folder.path):
+                    if entry.name.endswith(".tmp.png"):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    files.append((stat.st_mtime_ns, stat.st_size, entry.path))
+            except OSError:
+                continue
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+
+# lef_file -> ((size, mtime_ns), LefDscp) of a pre-render worker process,
+# a library is read once per worker and not once per job
+_worker_libraries = {}
+
+
+def _worker_library(lef_file, lef_cache_dir):
+    """The LefDscp of a LEF file in a worker, read again when the file changed"""
+    stat = os.stat(lef_file)
+    version = (stat.st_size, stat.st_mtime_ns)
+    loaded = _worker_libraries.get(lef_file)
+    if loaded is None or loaded[0] != version:
+        lef_dscp = LefCache(lef_cache_dir).load(lef_file)
+        if lef_dscp is None:
+            lef_dscp = parse_lef_file(lef_file, lazy=True)
+        loaded = _worker_libraries[lef_file] = (version, lef_dscp)
+    return loaded[1]
+
+
+def prerender_macros(lef_file, names, sizes, dark_mode, store_dir, lef_cache_dir):
+    """
+    Store the missing thumbnails of some macros of a LEF file, run in a
+    worker process.
+    :param lef_cache_dir: snapshots of the parsed LEF files, read if valid
+    :return: the number of thumbnails rendered
+    """
+    lef_dscp = _worker_library(lef_file, lef_cache_dir)
+    store = ThumbnailStore(store_dir)
+    rendered = 0
+    for name in names:
+        if name not in lef_dscp.macros:
+            continue
+        digest = macro_digest(lef_dscp.macros, name)
+        for size in sizes:
+            if not store.has(digest, size, dark_mode):
+                store.save(digest, size, dark_mode, render_macro_image(lef_dscp.macros[name], size, dark_mode))
+                rendered += 1
+    return rendered
+
+
+class ThumbnailPrerender(QObject):
+    """
+    Fills the ThumbnailStore in worker processes after libraries are
+    loaded, the views then read their thumbnails from disk.
+    """
+    _instance = None
+
+    progress = pyqtSignal(int, int)  # finished jobs, all jobs
+    prerendered = pyqtSignal(list)  # names of the macros of a finished job
+    # emitted by the pool threads, queued to the GUI thread
+    _job_done = pyqtSignal(object, object)  # names, future
+
+    def __init__(self, max_workers=None, parent=None):
+        super().__init__(parent)
+        self.store = ThumbnailStore()
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) // 2)
+        self.dark_mode = False
+        self._pool = None
+        self._futures = {}
+        self._total = 0
+        self._job_done.connect(self._on_job_done)
+        library_manager().add_observer(self)
+
+    def update(self):
+        changed = library_manager().changed_macros
+        if changed is None or self._futures:
+            # running jobs may be of a removed library, start over
+            self.start()
+        else:
+            self.start(changed)
+
+    def set_theme(self, dark_mode):
+        if dark_mode != self.dark_mode:
+            self.dark_mode = dark_mode
+            self.start()
+
+    def start(self, names=None):
+        """
+        Pre-render the loaded macros.
+        :param names: only these macros, all of them when None
+        """
+        self.cancel()
+        jobs = []
+        for lef_file, lef_dscp in library_manager().libraries.libraries.items():
+            file_names = [name for name in lef_dscp.macros if names is None or name in names]
+            jobs += [(lef_file, file_names[i:i + PRERENDER_CHUNK])
+                     for i in range(0, len(file_names), PRERENDER_CHUNK)]
+        if not jobs:
+            return
+        if self._pool is None:
+            # spawned, forking a process with running Qt threads is not safe
+            self._pool = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context('spawn'))
+        self._total = len(jobs)
+        for lef_file, chunk in jobs:
+            future = self._pool.submit(prerender_macros, lef_file, chunk, PREVIEW_SIZES, self.dark_mode,
+                                       self.store.store_dir, library_manager().lef_cache.cache_dir)
+            self._futures[future] = chunk
+            future.add_done_callback(lambda future, chunk=chunk: self._job_done.emit(chunk, future))
+        self.progress.emit(0, self._total)
+
+    def _on_job_done(self, names, future):
+        if self._futures.pop(future, None) is None:
+            return
+        self.progress.emit(self._total - len(self._futures), self._total)
+        if future.cancelled():
+            return
+        try:
+            future.result()
+        except BrokenProcessPool as e:
+            # a worker died, the next start makes a new pool
+            print(f"Thumbnail pre-render failed: {e}")
+            self.cancel()
+            self._pool = None
+            return
+        except Exception as e:
+            print(f"Thumbnail pre-render failed: {e}")
+            return
+        self.prerendered.emit(names)
+
+    def is_running(self):
+        return bool(self._futures)
+
+    def cancel(self):
+        """Drop the jobs not started, the running ones finish unseen"""
+        futures, self._futures = self._futures, {}
+        for future in futures:
+            future.cancel()
+
+    def shutdown(self):
+        self.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    @staticmethod
+    def get_instance():
+        """Static method to get the single instance of ThumbnailPrerender"""
+        if ThumbnailPrerender._instance is None:
+            ThumbnailPrerender._instance = ThumbnailPrerender()
+        return ThumbnailPrerender._instance
+
+
+def thumbnail_prerender() -> ThumbnailPrerender:
+    """Helper funtion to get ThumbnailPrerender inst"""
+    return ThumbnailPrerender.get_instance()
+
+
+def stored_preview(macros, name, dark_mode=False):
+    """
+    The largest stored thumbnail of a macro, shown by the macro views while
+    they draw it.
+    :return: a QImage, or None when it is not rendered yet
+    """
+    return thumbnail_prerender().store.load(macro_digest(macros, name), PREVIEW_SIZES[-1], dark_mode)
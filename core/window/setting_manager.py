@@ -75,7 +75,7 @@ class SettingManager():
     
     def get_pac_rule(self):
         """Get current pac setting"""
-        return self._all_settings.get(self._all_settings['pac'], {})
+        return self._all_settings.get('pac_rules', {}).get(self._all_settings.get('pac'), {})
     
     def get_drc_rule(self):
         """Get current drc setting"""
@@ -2,5 +2,7 @@
 W_LIB_BROWSER_ID = 'window.lib.browser'
 W_LEF_MACRO_ID = 'window.lef.macro'
 W_PIN_ASSESS_ID = 'window.pin.assess'
+W_MACRO_GALLERY_ID = 'window.macro.gallery'
+W_CHIP_LAYOUT_ID = 'window.chip.layout'
 
 W_COPILOT_CHAT_ID = 'window.copilot.chat'
@@ -0,0 +1,257 @@
+"""
+LEF parser benchmarks
+Times parse_lef_file, calc_pin_density, Macro.__str__ and draw_macro on the
+LEF files in example/lef and on synthetic copies of a cell library scaled
+10x and 100x. Every (file, benchmark) pair runs in its own process, so the
+peak RSS reported is the one of that benchmark alone.
+
+Usage:
+    python example/performace/lef_benchmark.py -o before.json
+    python example/performace/lef_benchmark.py -o after.json
+    python example/performace/lef_benchmark.py --compare before.json after.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+LEF_DIR = os.path.join(ROOT, "example", "lef")
+SCALED_SOURCE = "asap7sc7p5t_28_R_1x_220121a.lef"
+SCALES = (10, 100)
+
+
+def peak_rss_kb():
+    """Peak resident set size of this process in KiB, None if unknown"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, KiB elsewhere
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def make_scaled_lef(source, scale, work_dir):
+    """
+    Write a copy of a cell library whose MACRO blocks are repeated scale
+    times under new names.
+    :return: path of the scaled LEF file
+    """
+    from backend.lef_parser.lef_index import scan_macros
+
+    with open(source, "rb") as f:
+        data = f.read()
+    entries = scan_macros(data)
+    name = os.path.splitext(os.path.basename(source))[0]
+    path = os.path.join(work_dir, "%s_x%d.lef" % (name, scale))
+    with open(path, "wb") as f:
+        f.write(data[:entries[0].offset])
+        for copy in range(scale):
+            for entry in entries:
+                block = data[entry.offset:entry.end]
+                if copy:
+                    macro = entry.name.encode()
+                    block = block.replace(macro, b"%s_S%d" % (macro, copy))
+                f.write(block)
+        f.write(data[entries[-1].end:])
+    return path
+
+
+# every benchmark is a pair of functions: setup(lef_file) -> state is not
+# timed, run(state) -> result is
+
+def _setup_file(lef_file):
+    return lef_file
+
+
+def _parse(lef_file):
+    from backend.lef_parser import parse_lef_file
+    return parse_lef_file(lef_file)
+
+
+def _parse_mmap(lef_file):
+    from backend.lef_parser import parse_lef_file
+    return parse_lef_file(lef_file, use_mmap=True)
+
+
+def _parse_lazy(lef_file):
+    from backend.lef_parser import parse_lef_file
+    return parse_lef_file(lef_file, lazy=True)
+
+
+def _pin_density(lef_dscp):
+    from core.pin_destiny import calc_pin_density
+    return calc_pin_density(lef_dscp.macros)
+
+
+def _macro_str(lef_dscp):
+    return [str(macro) for macro in lef_dscp.macros.values()]
+
+
+def _setup_draw(lef_file):
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    return figure, _parse(lef_file)
+
+
+def _draw_macro(state, limit=20):
+    from backend.lef_parser import draw_macro
+    figure, lef_dscp = state
+    for idx, macro in enumerate(lef_dscp.macros.values()):
+        if idx == limit:
+            break
+        figure.clear()
+        ax = figure.add_subplot(1, 1, 1)
+        draw_macro(macro, ax=ax)
+        ax.autoscale_view()
+        figure.canvas.draw()
+
+
+BENCHMARKS = {
+    "parse_lef_file": (_setup_file, _parse),
+    "parse_lef_file_mmap": (_setup_file, _parse_mmap),
+    "parse_lef_file_lazy": (_setup_file, _parse_lazy),
+    "calc_pin_density": (_parse, _pin_density),
+    "Macro.__str__": (_parse, _macro_str),
+    "draw_macro": (_setup_draw, _draw_macro),
+}
+
+
+def run_one(lef_file, bench, repeat):
+    """
+    Run one benchmark in this process.
+    :return: dict of the measured values
+    """
+    setup, run = BENCHMARKS[bench]
+    state = setup(lef_file)
+    # warm up imports and caches, they are not part of the result
+    run(state)
+    gc.collect()
+    objects_before = len(gc.get_objects())
+    result = run(state)
+    objects = len(gc.get_objects()) - objects_before
+    del result
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = run(state)
+        times.append(time.perf_counter() - start)
+        del result
+    return {
+        "min_s": min(times),
+        "median_s": statistics.median(times),
+        "repeat": repeat,
+        "peak_rss_kb": peak_rss_kb(),
+        # gc-tracked objects kept alive by the result of one run
+        "gc_objects": objects,
+    }
+
+
+def run_isolated(lef_file, bench, repeat):
+    """Run one benchmark in a fresh interpreter"""
+    cmd = [sys.executable, os.path.abspath(__file__), "--worker", lef_file, bench, "--repeat", str(repeat)]
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if proc.returncode:
+        return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "failed"}
+    return json.loads(proc.stdout)
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def collect_lef_files(args, work_dir):
+    lef_files = sorted(os.path.join(LEF_DIR, name) for name in os.listdir(LEF_DIR) if name.endswith(".lef"))
+    for scale in args.scales:
+        lef_files.append(make_scaled_lef(os.path.join(LEF_DIR, SCALED_SOURCE), scale, work_dir))
+    return lef_files
+
+
+def run_suite(args):
+    benches = args.bench or list(BENCHMARKS)
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": {},
+    }
+    with tempfile.TemporaryDirectory() as work_dir:
+        for lef_file in collect_lef_files(args, work_dir):
+            name = os.path.basename(lef_file)
+            report["results"][name] = {"bytes": os.path.getsize(lef_file)}
+            # the big files only get a few rounds
+            repeat = max(1, args.repeat // 10) if "_x100" in name else args.repeat
+            for bench in benches:
+                result = run_isolated(lef_file, bench, repeat)
+                report["results"][name][bench] = result
+                print("%-45s %-22s %s" % (name, bench, _format(result)), file=sys.stderr)
+    return report
+
+
+def _format(result):
+    if "error" in result:
+        return "error: " + result["error"]
+    rss = result["peak_rss_kb"]
+    return "%9.2f ms  rss %s  objects %d" % (result["min_s"] * 1000, "%d KiB" % rss if rss else "?", result["gc_objects"])
+
+
+def compare(old_path, new_path):
+    """Print the min time ratio new/old of every benchmark in both reports"""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print("%s -> %s" % (old.get("revision"), new.get("revision")))
+    for name, benches in new["results"].items():
+        for bench, result in benches.items():
+            before = old["results"].get(name, {}).get(bench)
+            if not isinstance(result, dict) or not isinstance(before, dict) or "min_s" not in result or "min_s" not in before:
+                continue
+            print("%-45s %-22s %9.2f ms -> %9.2f ms  x%.2f" % (
+                name, bench, before["min_s"] * 1000, result["min_s"] * 1000, before["min_s"] / result["min_s"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LEF parser benchmarks")
+    parser.add_argument("-o", "--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--bench", action="append", choices=list(BENCHMARKS), help="only run these benchmarks")
+    parser.add_argument("--repeat", type=int, default=10, help="timed runs per benchmark")
+    parser.add_argument("--scales", type=int, nargs="*", default=list(SCALES), help="synthetic library scales")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two JSON reports")
+    parser.add_argument("--worker", nargs=2, metavar=("LEF", "BENCH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_one(args.worker[0], args.worker[1], args.repeat)))
+    elif args.compare:
+        compare(*args.compare)
+    else:
+        report = json.dumps(run_suite(args), indent=2)
+        if args.output:
+            with open(args.output, "w") as f:
+                f.write(report)
+        else:
+            print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
+import multiprocessing
+
 from app import main_entry
 from pysmt import *
 
@@ -10,4 +12,6 @@ def main():
         
 
 if __name__ == "__main__":
+    # worker processes of the parallel LEF parser in the frozen app
+    multiprocessing.freeze_support()
     main()
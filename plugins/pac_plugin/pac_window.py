@@ -1,8 +1,8 @@
-
+import os
 from .ui import *
 from .ui.dialogs import *
 from core.window import *
-from core import library_manager, LibraryManager
+from core import library_manager, library_loader, LibraryManager, score_service, thumbnail_prerender
 from ui.icons import *
 
 
@@ -13,9 +13,18 @@ class PacWindow():
         self._register_windows(main_window)        
         self._setup_ui(main_window)
         main_window.theme_changed.connect(self.change_theme)
+        score_service().progress.connect(self.show_score_progress)
+        score_service().failed.connect(self.show_score_error)
+        library_loader().started.connect(self.show_load_progress)
+        library_loader().loaded.connect(self.show_load_progress)
+        library_loader().failed.connect(self.show_load_error)
     
     def change_theme(self, is_dark):
         self.macro_win.set_theme(is_dark)
+        self.gallery_win.set_theme(is_dark)
+        self.layout_win.set_theme(is_dark)
+        self.lib_browser_win.set_theme(is_dark)
+        thumbnail_prerender().set_theme(is_dark)
         
     def show_lib_browser(self):
         self._show_widgets(self.lib_browser_win.widget())
@@ -23,31 +32,77 @@ class PacWindow():
     def show_macro_view(self):
         self._show_widgets(self.macro_win.widget())
     
+    def show_macro_gallery(self):
+        self._show_widgets(self.gallery_win.widget())
+
+    def show_chip_layout(self):
+        self._show_widgets(self.layout_win.widget())
+
     def show_pin_assess_win(self):
         self._show_widgets(self.pin_assess_win.widget())
 
     def assess_pin(self):
-        data = library_manager().calc_pin_score(None)
-        dialog = PinScoreDialog(data, self.main_window)
-        dialog.exec_()
+        dialog = PinScoreDialog({}, self.main_window)
+        exec_score_dialog(dialog, [(score_service().calc_pin_score, dialog.update_tree)])
 
     def assess_macro(self):
-        data = library_manager().calc_macro_score(None)
-        dialog = MacroScoreDialog(data, self.main_window)
-        dialog.exec_()
+        dialog = MacroScoreDialog({}, self.main_window)
+        exec_score_dialog(dialog, [(score_service().calc_macro_score, dialog.update_table)])
 
     def assess_pin_density(self):
-        data = library_manager().calc_pin_density(None)
-        dialog = PinDestinyDialog(data, self.main_window)
+        dialog = PinDestinyDialog({}, self.main_window)
+        exec_score_dialog(dialog, [(score_service().calc_pin_density, dialog.update_table),
+                                   (score_service().calc_pin_access, dialog.update_access)])
+
+    def assess_library(self):
+        dialog = BatchScoreDialog(self.main_window)
+        dialog.exec_()
+
+    def sweep_rules(self):
+        dialog = RuleSweepDialog(self.pin_rule_tab.widget().pac_rules, self.main_window)
         dialog.exec_()
 
+    def show_score_progress(self, finished, submitted):
+        if finished < submitted:
+            self.main_window.statusBar().showMessage(f"Scoring... {finished}/{submitted}")
+        else:
+            self.main_window.statusBar().clearMessage()
+
+    def show_score_error(self, key, error):
+        self.main_window.statusBar().showMessage(f"Scoring failed: {error}", 5000)
+
+    def show_load_progress(self, lef_files):
+        if library_loader().is_loading():
+            self.main_window.statusBar().showMessage("Loading libraries...")
+        else:
+            self.main_window.statusBar().clearMessage()
+
+    def show_load_error(self, lef_file, error):
+        self.main_window.statusBar().showMessage(f"Loading {os.path.basename(lef_file)} failed: {error}", 5000)
+
+    def reload_library(self):
+        library_manager().reload_lef_file()
+
+    def _create_file_menu(self, main_window):
+        file_menu = menu_manager().get_menu(M_FILE_ID)
+        reload_action = main_window.create_action('Reload Library', M_FILE_RELOAD_ICON, self.reload_library)
+        actions = file_menu.actions()
+        # right after Open, at the end when the menu has no Open
+        index = actions.index(main_window.open_action) + 1 if main_window.open_action in actions else len(actions)
+        if index < len(actions):
+            file_menu.insertAction(actions[index], reload_action)
+        else:
+            file_menu.addAction(reload_action)
+
     def _create_view_menu(self, main_window):
         view_menu = menu_manager().get_menu(M_VIEW_ID)
         show_lib_action = main_window.create_checked_action('Library', M_VIEW_LIBRARY_ICON, self.show_lib_browser)
         show_macro_action = main_window.create_checked_action('Macro View', M_VIEW_MACRO_VIEW_ICON, self.show_macro_view)
+        show_gallery_action = main_window.create_checked_action('Macro Gallery', M_VIEW_MACRO_GALLERY_ICON, self.show_macro_gallery)
+        show_layout_action = main_window.create_checked_action('Chip Layout', M_VIEW_LAYOUT_ICON, self.show_chip_layout, False)
         show_pin_score_action = main_window.create_checked_action('Pin Assess', M_VIEW_PIN_ASSESS_ICON, self.show_pin_assess_win)        
         
-        view_actions = [show_lib_action, show_macro_action, show_pin_score_action]
+        view_actions = [show_lib_action, show_macro_action, show_gallery_action, show_layout_action, show_pin_score_action]
         view_menu.addActions(view_actions)
         view_menu.addSeparator()
         toolbar_manager().add_actions(TOOLBAR_VIEW, view_actions)
@@ -56,27 +111,40 @@ class PacWindow():
         tools_menu = menu_manager().get_menu(M_TOOLS_ID)        
         pin_rule_action = main_window.create_action('Pin Assess Rule', M_TOOLS_PIN_RULE_ICON, lambda: main_window.show_settings(1))
         drc_rule_action = main_window.create_action('Drc Rule', M_TOOLS_DRC_RULE_ICON, lambda: main_window.show_settings(2))
-        tools_menu.addActions([pin_rule_action, drc_rule_action])
+        rule_sweep_action = main_window.create_action('Pin Assess Rule Sweep', M_TOOLS_PIN_RULE_ICON, self.sweep_rules)
+        tools_menu.addActions([pin_rule_action, drc_rule_action, rule_sweep_action])
         tools_menu.addSeparator()
         
         pin_assess_action = main_window.create_action('PinAssess', M_TOOLS_PIN_ASSESS_ICON, self.assess_pin)
         macro_assess_action = main_window.create_action('MacroAssess', M_TOOLS_MACRO_COST_ICON, self.assess_macro)
         pin_density_action = main_window.create_action('PinDensity', M_TOOLS_PIN_DENSITY_ICON, self.assess_pin_density)
+        library_assess_action = main_window.create_action('Assess Library', M_TOOLS_LIBRARY_SCORE_ICON, self.assess_library)
         
         tool_actions = [pin_assess_action, macro_assess_action, pin_density_action]
         tools_menu.addActions(tool_actions)
+        tools_menu.addAction(library_assess_action)
         tool_actions.append(pin_rule_action)
         toolbar_manager().add_actions(TOOLBAR_TOOLS, tool_actions)
         
     def _setup_ui(self, main_window):
+        self._create_file_menu(main_window)
         self._create_view_menu(main_window)
         self._create_tools_menu(main_window)
 
     def _register_windows(self, main_window):
-        self.macro_win = LefMacroWindow(main_window)
+        # thumbnails are pre-rendered from the first library loaded on
+        thumbnail_prerender()
+        # both register as W_LEF_MACRO_ID, chosen in the general settings
+        macro_view = setting_manager().all_settings.get("general", {}).get("macro_view", "Matplotlib")
+        self.macro_win = (LefSceneWindow if macro_view == "Scene" else LefMacroWindow)(main_window)
         self.pin_assess_win = PinAssessWindow(main_window)    
         self.lib_browser_win = LibBrowserWindow(self.macro_win, self.pin_assess_win, main_window)
+        self.gallery_win = MacroGalleryWindow(self.macro_win, main_window)
+        self.layout_win = LayoutWindow(main_window)
         self.pin_rule_tab = PinAssessRulePage(setting_manager().all_settings)
+        # scores computed with the old rule parameters are of no use
+        self.pin_rule_tab.widget().rule_saved.connect(library_manager().clear_score_cache)
+        self.pin_rule_tab.widget().rule_saved.connect(score_service().cancel_all)
         self.drc_rule_tab = DrcRulePage(setting_manager().all_settings)
 
     def _show_widgets(self, widget):
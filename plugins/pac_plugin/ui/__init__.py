@@ -1,5 +1,8 @@
 from .lib_browser_window import LibBrowserWindow
 from .lef_macro_window import LefMacroWindow
+from .lef_scene_window import LefSceneWindow
+from .macro_gallery_window import MacroGalleryWindow
+from .layout_window import LayoutWindow
 from .pin_assess_window import PinAssessWindow
 from .pin_assess_rule_page import PinAssessRulePage
 from .drc_rule_page import DrcRulePage
@@ -1,4 +1,18 @@
+from core import score_service
 from .macro_score_dialog import MacroScoreDialog
 from .pin_score_dialog import PinScoreDialog
 from .macro_info_dialog import MacroInfoDialog
 from .pin_destiny_dialog import PinDestinyDialog
+from .batch_score_dialog import BatchScoreDialog
+from .rule_sweep_dialog import RuleSweepDialog
+
+
+def exec_score_dialog(dialog, requests, macro_name=None):
+    """
+    Show a score dialog right away, it is filled by background score jobs.
+    :param requests: (submit, callback) pairs, submit is a ScoreService method
+    """
+    keys = [(submit(macro_name, callback), callback) for submit, callback in requests]
+    dialog.exec_()
+    for key, callback in keys:
+        score_service().cancel(key, callback)
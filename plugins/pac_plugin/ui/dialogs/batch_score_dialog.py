@@ -0,0 +1,124 @@
+from ui.icons import *
+from core.batch_score import BatchScoreJob, CSV_COLUMNS, export_scores, parquet_available
+from PyQt5.QtWidgets import (
+    QDialog,
+    QVBoxLayout,
+    QHBoxLayout,
+    QLabel,
+    QProgressBar,
+    QPushButton,
+    QTableWidget,
+    QTableWidgetItem,
+    QHeaderView,
+    QFileDialog,
+    QMessageBox,
+)
+from PyQt5.QtGui import QFont
+from PyQt5.QtCore import Qt
+import qtawesome as qta
+
+
+class BatchScoreDialog(QDialog):
+    """Scores the whole library in the background, the rows can be exported."""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+        self.job = BatchScoreJob(parent=self)
+        self.job.progress.connect(self.update_progress)
+        self.job.finished.connect(self.show_rows)
+        self.job.failed.connect(self.show_error)
+        self.job.cancelled.connect(self.show_cancelled)
+        self._setup_ui()
+        self.finished.connect(self.job.cancel)
+
+    def _setup_ui(self):
+        self.setWindowTitle("Library Assessment")
+        self.setWindowIcon(qta.icon(M_TOOLS_MACRO_COST_ICON))
+        self.setMinimumSize(700, 400)
+        self.setFont(QFont("Roboto", 10))
+
+        main_layout = QVBoxLayout(self)
+        main_layout.setSpacing(15)
+        main_layout.setContentsMargins(5, 5, 5, 5)
+
+        self.status_label = QLabel("Scoring...", self)
+        main_layout.addWidget(self.status_label)
+        self.progress_bar = QProgressBar(self)
+        main_layout.addWidget(self.progress_bar)
+
+        self.table = QTableWidget(self)
+        self.table.setColumnCount(len(CSV_COLUMNS))
+        self.table.setHorizontalHeaderLabels(CSV_COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        main_layout.addWidget(self.table)
+
+        button_layout = QHBoxLayout()
+        button_layout.addStretch()
+        self.start_button = QPushButton("Restart", self)
+        self.start_button.clicked.connect(self.start)
+        self.cancel_button = QPushButton("Cancel", self)
+        self.cancel_button.clicked.connect(self.job.cancel)
+        self.export_button = QPushButton(qta.icon(M_FILE_SAVE_ICON), "Export", self)
+        self.export_button.clicked.connect(self.export)
+        for button in (self.start_button, self.cancel_button, self.export_button):
+            button_layout.addWidget(button)
+        main_layout.addLayout(button_layout)
+
+    def start(self):
+        self.rows = []
+        self.table.setRowCount(0)
+        self._set_running(True)
+        self.status_label.setText("Scoring...")
+        self.job.start()
+
+    def _set_running(self, running):
+        self.start_button.setEnabled(not running)
+        self.cancel_button.setEnabled(running)
+        self.export_button.setEnabled(not running and bool(self.rows))
+
+    def update_progress(self, finished, total):
+        self.progress_bar.setMaximum(max(total, 1))
+        self.progress_bar.setValue(finished)
+
+    def show_rows(self, rows):
+        self.rows = rows
+        self.status_label.setText(f"{len(rows)} macros scored")
+        self.table.setSortingEnabled(False)
+        self.table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, key in enumerate(CSV_COLUMNS):
+                value = values[key]
+                text = "-" if value is None else f"{value:.4f}" if isinstance(value, float) else str(value)
+                item = QTableWidgetItem(text)
+                item.setTextAlignment(Qt.AlignCenter)
+                self.table.setItem(row, column, item)
+        self.table.setSortingEnabled(True)
+        self._set_running(False)
+
+    def show_error(self, error):
+        self.status_label.setText(f"Scoring failed: {error}")
+        self._set_running(False)
+
+    def show_cancelled(self):
+        self.status_label.setText("Cancelled")
+        self._set_running(False)
+
+    def export(self):
+        filters = "CSV Files (*.csv)"
+        if parquet_available():
+            filters += ";;Parquet Files (*.parquet)"
+        path, selected = QFileDialog.getSaveFileName(self, "Export Scores", "library_scores.csv", filters)
+        if not path:
+            return
+        if "parquet" in selected and not path.lower().endswith(".parquet"):
+            path += ".parquet"
+        try:
+            export_scores(self.rows, path)
+        except (OSError, RuntimeError) as e:
+            QMessageBox.warning(self, "Export Failed", str(e))
+
+    def exec_(self):
+        self.start()
+        return super().exec_()
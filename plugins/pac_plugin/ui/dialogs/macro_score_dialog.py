@@ -50,9 +50,12 @@ class MacroScoreDialog(QDialog):
         return table
 
     def update_table(self, data):
+        # rows move while sorting is on, the table is filled after a job
+        self.table.setSortingEnabled(False)
         self.table.setRowCount(len(data))
         for row, (macro_name, score) in enumerate(data.items()):
             self._add_table_row(row, macro_name, score)
+        self.table.setSortingEnabled(True)
         self.table.sortItems(1, Qt.AscendingOrder)
 
     def _add_table_row(self, row, macro_name, score):
@@ -13,8 +13,12 @@ import qtawesome as qta
 
 
 class PinDestinyDialog(QDialog):
-    def __init__(self, data, parent=None):
+    ACCESS_COLUMNS = ["Occupied", "Max Local", "Min Access", "Min Spacing", "Layers"]
+
+    def __init__(self, data, parent=None, access_data=None):
         super().__init__(parent)
+        self.access_data = access_data or {}
+        self.data = {}
         self._setup_ui()
         self.update_table(data)
 
@@ -40,19 +44,36 @@ class PinDestinyDialog(QDialog):
     def _create_table(self):
         """Create and configure the QTableWidget."""
         table = QTableWidget(self)
-        table.setColumnCount(2)
-        table.setHorizontalHeaderLabels(["Macro Name", "Density"])
+        self._set_headers(table)
         table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         table.verticalHeader().setVisible(False)
         table.setEditTriggers(QTableWidget.NoEditTriggers)
         table.setSortingEnabled(True)  # Enable sorting
         return table
 
+    def _set_headers(self, table):
+        headers = ["Macro Name", "Density"]
+        if self.access_data:
+            headers += self.ACCESS_COLUMNS
+        table.setColumnCount(len(headers))
+        table.setHorizontalHeaderLabels(headers)
+
+    def update_access(self, access_data):
+        """Add the access metrics, they may arrive after the densities."""
+        self.access_data = access_data or {}
+        self._set_headers(self.table)
+        self.update_table(self.data)
+
     def update_table(self, data):
         """Update the table with new data."""
+        self.data = data
+        self.table.setSortingEnabled(False)
         self.table.setRowCount(len(data))
         for row, (macro_name, score) in enumerate(data.items()):
             self._add_table_row(row, macro_name, score)
+            if macro_name in self.access_data:
+                self._add_access_items(row, self.access_data[macro_name])
+        self.table.setSortingEnabled(True)
         self.table.sortItems(1, Qt.AscendingOrder)
 
     def _add_table_row(self, row, macro_name, score):
@@ -64,4 +85,19 @@ class PinDestinyDialog(QDialog):
         score_item = QTableWidgetItem(f"{score:.5f}")
         score_item.setTextAlignment(Qt.AlignCenter)
         self.table.setItem(row, 1, score_item)
-        
\ No newline at end of file
+        
+    def _add_access_items(self, row, metrics):
+        """Add the 2D pin access metrics of a macro to its row."""
+        spacing = metrics["min_pin_spacing"]
+        access = metrics["min_access_points"]
+        texts = [
+            f"{metrics['occupied_ratio']:.3f}",
+            f"{metrics['max_local_density']:.3f}",
+            "-" if access is None else str(access),
+            "-" if spacing is None else f"{spacing:.4f}",
+            ", ".join(f"{layer}: {count}" for layer, count in metrics["layer_counts"].items()),
+        ]
+        for column, text in enumerate(texts, start=2):
+            item = QTableWidgetItem(text)
+            item.setTextAlignment(Qt.AlignCenter)
+            self.table.setItem(row, column, item)
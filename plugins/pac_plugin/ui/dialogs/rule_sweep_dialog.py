@@ -0,0 +1,147 @@
+from ui.icons import *
+from core.rule_sweep import RuleSweep, SUMMARY_COLUMNS, rule_grid
+from PyQt5.QtWidgets import (
+    QDialog,
+    QVBoxLayout,
+    QHBoxLayout,
+    QFormLayout,
+    QLabel,
+    QLineEdit,
+    QListWidget,
+    QListWidgetItem,
+    QProgressBar,
+    QPushButton,
+    QTableWidget,
+    QTableWidgetItem,
+    QHeaderView,
+)
+from PyQt5.QtGui import QFont
+from PyQt5.QtCore import Qt
+import qtawesome as qta
+
+
+class RuleSweepDialog(QDialog):
+    """Compare the library scores under several pac rules."""
+    def __init__(self, pac_rules, parent=None):
+        super().__init__(parent)
+        self.pac_rules = pac_rules
+        self.sweep = RuleSweep(parent=self)
+        self.sweep.progress.connect(self.update_progress)
+        self.sweep.finished.connect(self.show_rows)
+        self.sweep.failed.connect(self.show_error)
+        self._setup_ui()
+        self.finished.connect(self.sweep.cancel)
+
+    def _setup_ui(self):
+        self.setWindowTitle("PAC Rule Sweep")
+        self.setWindowIcon(qta.icon(M_TOOLS_PIN_RULE_ICON))
+        self.setMinimumSize(800, 450)
+        self.setFont(QFont("Roboto", 10))
+
+        main_layout = QVBoxLayout(self)
+        main_layout.setSpacing(15)
+        main_layout.setContentsMargins(5, 5, 5, 5)
+
+        input_layout = QHBoxLayout()
+        self.rule_list = QListWidget(self)
+        for name in self.pac_rules:
+            item = QListWidgetItem(name, self.rule_list)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Checked)
+        input_layout.addWidget(self.rule_list)
+
+        form_layout = QFormLayout()
+        self.width_edit = QLineEdit(self)
+        self.width_edit.setPlaceholderText("e.g. 0.018, 0.020, 0.022")
+        form_layout.addRow("Grid Minimum Widths (µm):", self.width_edit)
+        self.space_edit = QLineEdit(self)
+        self.space_edit.setPlaceholderText("e.g. 0.018, 0.020")
+        form_layout.addRow("Grid Minimum Spacings (µm):", self.space_edit)
+        input_layout.addLayout(form_layout)
+        main_layout.addLayout(input_layout)
+
+        run_layout = QHBoxLayout()
+        self.progress_bar = QProgressBar(self)
+        run_layout.addWidget(self.progress_bar)
+        self.run_button = QPushButton(qta.icon('fa.play'), "Run", self)
+        self.run_button.clicked.connect(self.run)
+        run_layout.addWidget(self.run_button)
+        self.cancel_button = QPushButton("Cancel", self)
+        self.cancel_button.clicked.connect(self.cancel)
+        self.cancel_button.setEnabled(False)
+        run_layout.addWidget(self.cancel_button)
+        main_layout.addLayout(run_layout)
+
+        self.status_label = QLabel("", self)
+        main_layout.addWidget(self.status_label)
+
+        self.table = QTableWidget(self)
+        self.table.setColumnCount(len(SUMMARY_COLUMNS))
+        self.table.setHorizontalHeaderLabels(SUMMARY_COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        main_layout.addWidget(self.table)
+
+    @staticmethod
+    def _parse_values(text):
+        return [float(value) for value in text.replace(";", ",").split(",") if value.strip()]
+
+    def selected_rules(self):
+        """Checked rule sets plus the min_width x min_space grid"""
+        rules = {}
+        for row in range(self.rule_list.count()):
+            item = self.rule_list.item(row)
+            if item.checkState() == Qt.Checked:
+                rules[item.text()] = self.pac_rules[item.text()]
+        widths = self._parse_values(self.width_edit.text())
+        spaces = self._parse_values(self.space_edit.text())
+        if widths or spaces:
+            # a missing axis takes the values of the other one
+            rules.update(rule_grid(widths or spaces, spaces or widths))
+        return rules
+
+    def run(self):
+        try:
+            rules = self.selected_rules()
+        except ValueError:
+            self.status_label.setText("The grid values must be numbers separated by commas")
+            return
+        if not rules:
+            self.status_label.setText("No rule selected")
+            return
+        self.table.setRowCount(0)
+        self.status_label.setText(f"Scoring {len(rules)} rules...")
+        self._set_running(True)
+        self.sweep.start(rules)
+
+    def cancel(self):
+        self.sweep.cancel()
+        self.status_label.setText("Cancelled")
+        self._set_running(False)
+
+    def _set_running(self, running):
+        self.run_button.setEnabled(not running)
+        self.cancel_button.setEnabled(running)
+
+    def update_progress(self, finished, total):
+        self.progress_bar.setMaximum(max(total, 1))
+        self.progress_bar.setValue(finished)
+
+    def show_rows(self, rows):
+        self.status_label.setText(f"{len(rows)} rules compared")
+        self.table.setSortingEnabled(False)
+        self.table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, key in enumerate(SUMMARY_COLUMNS):
+                value = values[key]
+                text = "-" if value is None else f"{value:.4f}" if isinstance(value, float) else str(value)
+                item = QTableWidgetItem(text)
+                item.setTextAlignment(Qt.AlignCenter)
+                self.table.setItem(row, column, item)
+        self.table.setSortingEnabled(True)
+        self._set_running(False)
+
+    def show_error(self, error):
+        self.status_label.setText(f"Sweep failed: {error}")
+        self._set_running(False)
@@ -0,0 +1,303 @@
+import math
+import os
+from core import library_manager
+from core.layout_tiles import (LayoutGeometry, TileRenderer, layout_key, TILE_PIXELS, PREFETCH_LEVELS,
+                               INSTANCE_LAYER)
+from core.window import AbstractWindow, W_CHIP_LAYOUT_ID
+
+from PyQt5.QtWidgets import (
+    QVBoxLayout,
+    QDockWidget,
+    QWidget,
+    QSplitter,
+    QListWidget,
+    QListWidgetItem,
+    QLabel,
+    QToolBar,
+    QAction,
+)
+from PyQt5.QtGui import QPainter, QPen, QColor, QPixmap, QIcon
+from PyQt5.QtCore import Qt, QSize, QRectF
+import qtawesome as qta
+
+ZOOM_STEP = 1.25
+
+
+class LayoutTileView(QWidget):
+    """
+    Draws the tiles of the visible layers at the level of the zoom. A tile
+    not in memory yet is stood in for by the part of a coarser tile, the
+    missing tiles nearest the center are loaded first.
+    """
+    def __init__(self, renderer: TileRenderer, parent=None):
+        super().__init__(parent)
+        self.renderer = renderer
+        self.layers = []
+        # world point at the center of the widget, and pixels per micron
+        self.center = (0.0, 0.0)
+        self.zoom = 1.0
+        self.background = QColor('#FAFAFA')
+        self._drag_pos = None
+        self.setMinimumSize(200, 200)
+        self.setCursor(Qt.OpenHandCursor)
+        renderer.tile_ready.connect(self.on_tile_ready)
+
+    def fit(self):
+        geometry = self.renderer.geometry
+        if geometry is None:
+            return
+        x0, y0, x1, y1 = geometry.die_area
+        self.center = ((x0 + x1) / 2, (y0 + y1) / 2)
+        self.zoom = 0.95 * min(self.width() / max(x1 - x0, 1e-9), self.height() / max(y1 - y0, 1e-9))
+        self.update()
+
+    def zoom_by(self, factor, pos=None):
+        """Zoom keeping the world point under pos, the widget center by default, in place"""
+        geometry = self.renderer.geometry
+        if geometry is None:
+            return
+        if pos is None:
+            pos = (self.width() / 2, self.height() / 2)
+        world = self.to_world(*pos)
+        fit_zoom = min(self.width(), self.height()) / geometry.side
+        max_zoom = 4 * TILE_PIXELS * (1 << geometry.max_level) / geometry.side
+        self.zoom = min(max(self.zoom * factor, fit_zoom / 4), max_zoom)
+        self.center = (world[0] - (pos[0] - self.width() / 2) / self.zoom,
+                       world[1] + (pos[1] - self.height() / 2) / self.zoom)
+        self.update()
+
+    def to_world(self, x, y):
+        return (self.center[0] + (x - self.width() / 2) / self.zoom,
+                self.center[1] - (y - self.height() / 2) / self.zoom)
+
+    def to_screen(self, x, y):
+        return ((x - self.center[0]) * self.zoom + self.width() / 2,
+                (self.center[1] - y) * self.zoom + self.height() / 2)
+
+    def level(self):
+        """Pyramid level whose pixels are nearest the screen pixels"""
+        geometry = self.renderer.geometry
+        level = math.ceil(math.log2(max(self.zoom * geometry.side / TILE_PIXELS, 1e-9)) - 0.25)
+        return min(max(level, 0), geometry.max_level)
+
+    def visible_tiles(self, level):
+        geometry = self.renderer.geometry
+        count = 1 << level
+        size = geometry.side / count
+        left, top = self.to_world(0, 0)
+        right, bottom = self.to_world(self.width(), self.height())
+        die_x, die_top = geometry.die_area[0], geometry.die_area[1] + geometry.side
+        tx0, tx1 = max(0, math.floor((left - die_x) / size)), min(count - 1, math.floor((right - die_x) / size))
+        ty0, ty1 = max(0, math.floor((die_top - top) / size)), min(count - 1, math.floor((die_top - bottom) / size))
+        return [(tx, ty) for ty in range(ty0, ty1 + 1) for tx in range(tx0, tx1 + 1)]
+
+    def tile_target(self, level, tx, ty):
+        x0, y0, x1, y1 = self.renderer.geometry.tile_rect(level, tx, ty)
+        left, top = self.to_screen(x0, y1)
+        right, bottom = self.to_screen(x1, y0)
+        return QRectF(left, top, right - left, bottom - top)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), self.background)
+        geometry = self.renderer.geometry
+        if geometry is None:
+            return
+        painter.setRenderHint(QPainter.SmoothPixmapTransform)
+        level = self.level()
+        tiles = self.visible_tiles(level)
+        missing = []
+        for layer in self.layers:
+            for tx, ty in tiles:
+                tile = (layer, level, tx, ty)
+                target = self.tile_target(level, tx, ty)
+                pixmap = self.renderer.cached(tile)
+                if pixmap is None:
+                    missing.append(tile)
+                    self._draw_coarser(painter, tile, target)
+                else:
+                    painter.drawPixmap(target, pixmap, QRectF(pixmap.rect()))
+
+        x0, y0, x1, y1 = geometry.die_area
+        left, top = self.to_screen(x0, y1)
+        right, bottom = self.to_screen(x1, y0)
+        painter.setPen(QPen(QColor("gray"), 0, Qt.DashLine))
+        painter.drawRect(QRectF(left, top, right - left, bottom - top))
+        painter.end()
+
+        # center out
+        cx, cy = self.width() / 2, self.height() / 2
+        missing.sort(key=lambda tile: (self.tile_target(*tile[1:]).center().x() - cx) ** 2 +
+                                      (self.tile_target(*tile[1:]).center().y() - cy) ** 2)
+        self.renderer.want(missing)
+
+    def _draw_coarser(self, painter, tile, target):
+        """Stand in for a missing tile with the nearest ancestor in memory"""
+        layer, level, tx, ty = tile
+        for up in range(1, level + 1):
+            pixmap = self.renderer.cached((layer, level - up, tx >> up, ty >> up))
+            if pixmap is None:
+                continue
+            part = pixmap.width() / (1 << up)
+            source = QRectF((tx - (tx >> up << up)) * part, (ty - (ty >> up << up)) * part, part, part)
+            painter.drawPixmap(target, pixmap, source)
+            return
+
+    def on_tile_ready(self, tile):
+        layer, level = tile[:2]
+        if layer in self.layers and level == self.level():
+            self.update(self.tile_target(*tile[1:]).toAlignedRect())
+
+    def wheelEvent(self, event):
+        steps = event.angleDelta().y() / 120
+        self.zoom_by(ZOOM_STEP ** steps, (event.pos().x(), event.pos().y()))
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self._drag_pos = event.pos()
+            self.setCursor(Qt.ClosedHandCursor)
+
+    def mouseMoveEvent(self, event):
+        if self._drag_pos is None:
+            return
+        delta = event.pos() - self._drag_pos
+        self._drag_pos = event.pos()
+        self.center = (self.center[0] - delta.x() / self.zoom, self.center[1] + delta.y() / self.zoom)
+        self.update()
+
+    def mouseReleaseEvent(self, event):
+        self._drag_pos = None
+        self.setCursor(Qt.OpenHandCursor)
+
+    def resizeEvent(self, event):
+        if event.oldSize().isEmpty() or event.oldSize().width() <= 0:
+            self.fit()
+        super().resizeEvent(event)
+
+
+class LayoutWidget(QDockWidget):
+    """
+    Full chip view of the loaded DEF placement with the shapes of the
+    loaded macros, rendered as a zoom pyramid of tiles.
+    """
+    def __init__(self, parent=None):
+        super().__init__("Chip Layout", parent=parent)
+        self.layout_dscp = None
+        self.renderer = TileRenderer(parent=self)
+        self.init_ui()
+        self.renderer.progress.connect(self.show_progress)
+
+    def init_ui(self):
+        self.widget = QWidget(self)
+        self.setWidget(self.widget)
+        layout = QVBoxLayout(self.widget)
+        layout.addWidget(self.create_toolbar())
+
+        self.layer_list = QListWidget(self)
+        self.layer_list.itemChanged.connect(self.on_layer_changed)
+        self.view = LayoutTileView(self.renderer, self)
+        splitter = QSplitter(Qt.Horizontal, self)
+        splitter.addWidget(self.layer_list)
+        splitter.addWidget(self.view)
+        splitter.setStretchFactor(1, 1)
+        splitter.setSizes([120, 600])
+        layout.addWidget(splitter)
+
+        self.status_label = QLabel(self)
+        layout.addWidget(self.status_label)
+        self.setMinimumWidth(350)
+
+    def create_toolbar(self):
+        toolbar = QToolBar(self)
+        toolbar.setIconSize(QSize(18, 18))
+        for icon, slot in (("fa.search-plus", lambda: self.view.zoom_by(ZOOM_STEP)),
+                           ("fa.search-minus", lambda: self.view.zoom_by(1 / ZOOM_STEP)),
+                           ("fa.expand", self.view_fit)):
+            action = QAction(qta.icon(icon), "", self)
+            action.triggered.connect(slot)
+            toolbar.addAction(action)
+        return toolbar
+
+    def view_fit(self):
+        self.view.fit()
+
+    def set_theme(self, dark_mode=False):
+        self.view.background = QColor('#19232D' if dark_mode else '#FAFAFA')
+        self.view.update()
+
+    def checked_layers(self):
+        return [self.layer_list.item(row).text() for row in range(self.layer_list.count())
+                if self.layer_list.item(row).checkState() == Qt.Checked]
+
+    def on_layer_changed(self, item):
+        self.view.layers = self.checked_layers()
+        self.renderer.prefetch(self.view.layers, PREFETCH_LEVELS)
+        self.view.update()
+
+    def show_progress(self, count):
+        geometry = self.renderer.geometry
+        name = os.path.basename(library_manager().layout_file)
+        text = f"{name}: {len(geometry)} instances" if geometry is not None else ""
+        self.status_label.setText(f"{text}, rendering {count} tiles" if count else text)
+
+    def set_layout(self, layout_dscp):
+        """Show a DefDscp with the loaded macros, None clears the view"""
+        self.layout_dscp = layout_dscp
+        lef_dscp = library_manager().lef_dscp
+        if layout_dscp is None:
+            self.renderer.set_layout(None, None)
+            geometry = None
+        else:
+            geometry = LayoutGeometry(layout_dscp, lef_dscp.macros if lef_dscp is not None else {})
+            lef_files = lef_dscp.files() if lef_dscp is not None else []
+            self.renderer.set_layout(geometry, layout_key(library_manager().layout_file, lef_files))
+
+        self.layer_list.blockSignals(True)
+        self.layer_list.clear()
+        for layer in geometry.layers if geometry is not None else []:
+            pixmap = QPixmap(12, 12)
+            pixmap.fill(QColor(geometry.layer_color(layer)))
+            item = QListWidgetItem(QIcon(pixmap), layer)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Checked)
+            self.layer_list.addItem(item)
+        self.layer_list.blockSignals(False)
+
+        self.view.layers = self.checked_layers()
+        self.view.fit()
+        self.renderer.prefetch(self.view.layers, PREFETCH_LEVELS)
+        self.show_progress(0)
+        if layout_dscp is not None and self.isHidden():
+            self.show()
+
+    def update(self):
+        layout_dscp = library_manager().layout
+        if layout_dscp is self.layout_dscp:
+            # the libraries changed, redraw when the macros of the layout did
+            changed = library_manager().changed_macros
+            if layout_dscp is None or (changed is not None and not changed.intersection(layout_dscp.macro_names)):
+                return
+        self.set_layout(layout_dscp)
+
+
+class LayoutWindow(AbstractWindow):
+    def __init__(self, parent=None):
+        super().__init__(W_CHIP_LAYOUT_ID)
+        self._widget = LayoutWidget(parent)
+        # shown once a DEF file is loaded
+        self._widget.hide()
+        # the layout is redrawn when the DEF file or its macros change
+        library_manager().add_observer(self._widget)
+        library_manager().add_layout_observer(self._widget)
+
+    def widget(self):
+        return self._widget
+
+    def area(self):
+        return Qt.RightDockWidgetArea
+
+    def is_center(self):
+        return False
+
+    def set_theme(self, dark_mode=False):
+        self._widget.set_theme(dark_mode)
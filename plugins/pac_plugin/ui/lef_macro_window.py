@@ -1,19 +1,25 @@
 from backend.lef_parser import LefDscp, draw_macro
 from core import library_manager
+from core.thumbnail_store import PREVIEW_SIZES, stored_preview
 from core.window import AbstractWindow, W_LEF_MACRO_ID
 
 from matplotlib.figure import Figure
 from matplotlib.colors import to_rgba
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from PyQt5.QtWidgets import QVBoxLayout, QDockWidget, QWidget
-from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QVBoxLayout, QDockWidget, QWidget, QStackedWidget, QLabel
+from PyQt5.QtGui import QPixmap
+from PyQt5.QtCore import Qt, QTimer
 
 
 class LefMacroWidget(QDockWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.lef_dscp: LefDscp = None
+        self.drawn_cells = []
         self.text_color = '#000000'  # Default text color (black for light mode)
+        self.dark_mode = False
+        # bumped by every draw_cells, a deferred draw of older cells is dropped
+        self._draw_id = 0
         self.init_ui()
         self.set_theme(False)  # Assuming light mode is the default
         self.setMinimumWidth(350)
@@ -26,12 +32,21 @@ class LefMacroWidget(QDockWidget):
         self.widget = QWidget(self)
         self.setWidget(self.widget)
         
+        # the stored preview is shown while the figure is drawn
+        self.preview = QLabel(self.widget)
+        self.preview.setAlignment(Qt.AlignCenter)
+        self.stack = QStackedWidget(self.widget)
+        self.stack.addWidget(self.canvas)
+        self.stack.addWidget(self.preview)
+
         layout = QVBoxLayout(self.widget)
-        layout.addWidget(self.canvas)
+        layout.addWidget(self.stack)
 
     def set_theme(self, dark_mode=False):
         """Set the theme for the figure and canvas."""
         bg_color = '#19232D' if dark_mode else '#FAFAFA'
+        self.dark_mode = dark_mode
+        self.preview.setStyleSheet(f"background-color: {bg_color};")
         self.text_color = '#ffffff' if dark_mode else '#000000'
 
         self.figure.patch.set_facecolor(bg_color)
@@ -51,8 +66,33 @@ class LefMacroWidget(QDockWidget):
                 spine.set_edgecolor(to_rgba(text_color, alpha=0.5))
 
     def draw_cells(self, to_draw):
-        """Draw cells based on LEF information."""
+        """
+        Draw cells based on LEF information. A single cell with a stored
+        preview shows the preview at once and is drawn in the next event
+        loop turn.
+        """
+        self._draw_id += 1
+        preview = self._stored_preview(to_draw)
+        if preview is None:
+            self._draw_cells(to_draw)
+            return
+        self.preview.setPixmap(preview)
+        self.stack.setCurrentWidget(self.preview)
+        draw_id = self._draw_id
+        QTimer.singleShot(0, lambda: draw_id == self._draw_id and self._draw_cells(to_draw))
+
+    def _stored_preview(self, to_draw):
+        if len(to_draw) != 1 or to_draw[0] not in self.lef_dscp.macros:
+            return None
+        image = stored_preview(self.lef_dscp.macros, to_draw[0], self.dark_mode)
+        if image is None:
+            return None
+        side = min(self.stack.width(), self.stack.height(), PREVIEW_SIZES[-1])
+        return QPixmap.fromImage(image).scaled(side, side, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+
+    def _draw_cells(self, to_draw):
         self.figure.clear()  # Clear the previous plots
+        self.drawn_cells = list(to_draw)
 
         num_plots = len(to_draw)
         for idx, macro_name in enumerate(to_draw, start=1):
@@ -65,6 +105,7 @@ class LefMacroWidget(QDockWidget):
 
         self.update_text_colors(self.text_color)
         self.canvas.draw()
+        self.stack.setCurrentWidget(self.canvas)
 
     def draw_macro_subplot(self, macro, idx, num_plots):
         """Draw a single macro in a subplot."""
@@ -79,9 +120,18 @@ class LefMacroWidget(QDockWidget):
 
     def update(self):
         """Clear the figure and update the LEF description."""
+        self.update_lef(library_manager().lef_dscp)
+        changed = library_manager().changed_macros
+        if changed is not None and self.lef_dscp is not None:
+            # reloaded, redraw only when a drawn cell changed
+            if changed.intersection(self.drawn_cells):
+                self.draw_cells([name for name in self.drawn_cells if name in self.lef_dscp.macros])
+            return
+        self._draw_id += 1
+        self.drawn_cells = []
         self.figure.clear()
         self.canvas.draw()
-        self.update_lef(library_manager().lef_dscp)
+        self.stack.setCurrentWidget(self.canvas)
 
 
 class LefMacroWindow(AbstractWindow):
@@ -0,0 +1,396 @@
+import math
+import numpy as np
+from backend.lef_parser import LefDscp
+from backend.lef_parser.util import layer_vertices
+from core import library_manager
+from core.thumbnail_store import PREVIEW_SIZES, stored_preview
+from core.window import AbstractWindow, W_LEF_MACRO_ID
+
+from PyQt5.QtWidgets import (
+    QVBoxLayout,
+    QDockWidget,
+    QWidget,
+    QGraphicsScene,
+    QGraphicsView,
+    QGraphicsItem,
+    QGraphicsItemGroup,
+    QGraphicsRectItem,
+    QGraphicsSimpleTextItem,
+    QToolBar,
+    QAction,
+    QStackedWidget,
+    QLabel,
+)
+from PyQt5.QtGui import QPainter, QPen, QBrush, QColor, QPolygonF, QFont, QTransform, QPixmap
+from PyQt5.QtCore import Qt, QSize, QRectF, QPointF, QTimer
+import qtawesome as qta
+
+# shapes of one style above this count are split into tiles, so that the
+# BSP index of the scene skips the tiles out of view
+TILE_SHAPES = 512
+# level of detail, in pixels on screen
+MIN_SHAPE_PIXELS = 1.0
+MIN_LABEL_PIXELS = 8.0
+SUPPLY_PINS = ("vdd", "gnd", "vss")
+OBS_COLOR = "blue"
+Z_OBS, Z_PIN, Z_LABEL = 0, 1, 2
+
+
+class ShapeTileItem(QGraphicsItem):
+    """
+    The shapes of one layer and style inside a tile, painted in one go.
+    Shapes smaller than MIN_SHAPE_PIXELS on screen are left out.
+    """
+    def __init__(self, rects, polygons, color, fill, parent=None):
+        super().__init__(parent)
+        # largest first, the visible shapes are a prefix of the lists
+        rect_sizes = np.maximum(rects[:, 2] - rects[:, 0], rects[:, 3] - rects[:, 1])
+        order = np.argsort(-rect_sizes, kind='stable')
+        self.rect_sizes = rect_sizes[order]
+        self.rects = [QRectF(x0, y0, x1 - x0, y1 - y0) for x0, y0, x1, y1 in rects[order].tolist()]
+        poly_sizes = np.array([np.ptp(points, axis=0).max() for points in polygons], dtype=np.float64)
+        order = np.argsort(-poly_sizes, kind='stable')
+        self.poly_sizes = poly_sizes[order]
+        self.polygons = [QPolygonF([QPointF(x, y) for x, y in polygons[idx].tolist()]) for idx in order]
+
+        bounds = QRectF()
+        for rect in self.rects:
+            bounds = bounds.united(rect)
+        for polygon in self.polygons:
+            bounds = bounds.united(polygon.boundingRect())
+        # room for the cosmetic pen
+        margin = max(bounds.width(), bounds.height()) * 0.01
+        self._bounds = bounds.adjusted(-margin, -margin, margin, margin)
+
+        self.pen = QPen(QColor(color), 0)
+        self.brush = QBrush(QColor(color)) if fill else QBrush(Qt.NoBrush)
+        self.setCacheMode(QGraphicsItem.DeviceCoordinateCache)
+
+    def boundingRect(self):
+        return self._bounds
+
+    @staticmethod
+    def _visible(sizes, min_size):
+        """Number of the sizes, sorted descending, not below min_size"""
+        return int(np.searchsorted(-sizes, -min_size, side='right'))
+
+    def paint(self, painter, option, widget=None):
+        lod = option.levelOfDetailFromTransform(painter.worldTransform())
+        min_size = MIN_SHAPE_PIXELS / lod if lod > 0 else math.inf
+        painter.setPen(self.pen)
+        painter.setBrush(self.brush)
+        count = self._visible(self.rect_sizes, min_size)
+        if count:
+            painter.drawRects(self.rects[:count])
+        for polygon in self.polygons[:self._visible(self.poly_sizes, min_size)]:
+            painter.drawPolygon(polygon)
+
+
+class PinLabelItem(QGraphicsSimpleTextItem):
+    """Pin name of a fixed font size, shown once its pin is big enough on screen."""
+    def __init__(self, text, extent, parent=None):
+        super().__init__(text, parent)
+        self.extent = extent
+        self.setFlag(QGraphicsItem.ItemIgnoresTransformations)
+        self.setBrush(QBrush(QColor("gray")))
+        # centered on its position
+        rect = self.boundingRect()
+        self.setTransform(QTransform.fromTranslate(-rect.width() / 2, -rect.height() / 2))
+
+    def update_lod(self, scale):
+        self.setVisible(self.extent * scale >= MIN_LABEL_PIXELS)
+
+
+def _tiles(centers):
+    """
+    Split shapes into square tiles of about TILE_SHAPES shapes.
+    :param centers: (n, 2) array of the shape centers
+    :return: a list of index arrays
+    """
+    count = len(centers)
+    if count <= TILE_SHAPES:
+        return [np.arange(count)]
+    side = math.ceil(math.sqrt(count / TILE_SHAPES))
+    low = centers.min(axis=0)
+    span = np.maximum(centers.max(axis=0) - low, 1e-9)
+    cells = np.minimum(((centers - low) / span * side).astype(int), side - 1)
+    keys = cells[:, 0] * side + cells[:, 1]
+    order = np.argsort(keys, kind='stable')
+    return np.split(order, np.flatnonzero(np.diff(keys[order])) + 1)
+
+
+def _shapes(layers, dx):
+    """
+    Rects and polygons of LayerDefs, moved by dx and flipped upside down
+    since the y axis of a scene points down.
+    :return: a (n, 4) array of x0, y0, x1, y1 and a list of (k, 2) arrays
+    """
+    rect_chunks, polygons = [], []
+    for layer in layers:
+        rect_verts, layer_polys = layer_vertices(layer, 1)
+        rect_chunks.append(rect_verts.reshape(-1, 8)[:, [0, 3, 4, 1]])
+        polygons.extend(layer_polys)
+    rects = np.concatenate(rect_chunks) * [1, -1, 1, -1] + [dx, 0, dx, 0]
+    polygons = [points * [1, -1] + [dx, 0] for points in polygons]
+    return rects, polygons
+
+
+class MacroGraphicsView(QGraphicsView):
+    """Wheel zoom around the cursor, drag to pan"""
+    def __init__(self, scene, on_zoom, parent=None):
+        super().__init__(scene, parent)
+        self.on_zoom = on_zoom
+        self.setRenderHint(QPainter.Antialiasing)
+        self.setDragMode(QGraphicsView.ScrollHandDrag)
+        self.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
+        self.setOptimizationFlag(QGraphicsView.DontAdjustForAntialiasing)
+        self.setViewportUpdateMode(QGraphicsView.SmartViewportUpdate)
+
+    def zoom(self, factor):
+        self.scale(factor, factor)
+        self.on_zoom()
+
+    def wheelEvent(self, event):
+        self.zoom(1.2 if event.angleDelta().y() > 0 else 1 / 1.2)
+
+
+class LefSceneWidget(QDockWidget):
+    """
+    Macro view on a QGraphicsScene, the shapes are grouped per layer and
+    split into tiles, panning repaints the cached tiles only.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.lef_dscp: LefDscp = None
+        self.drawn_cells = []
+        self.text_color = '#000000'
+        self.dark_mode = False
+        # bumped by every draw_cells, a deferred draw of older cells is dropped
+        self._draw_id = 0
+        # (kind, layer name) -> QGraphicsItemGroup
+        self.layer_groups = {}
+        self.labels = []
+        self.titles = []
+        self._bounds = QRectF()
+        self.init_ui()
+        self.set_theme(False)
+        self.setMinimumWidth(350)
+
+    def init_ui(self):
+        """Initialize the UI components."""
+        self.scene = QGraphicsScene(self)
+        self.scene.setItemIndexMethod(QGraphicsScene.BspTreeIndex)
+        self.view = MacroGraphicsView(self.scene, self.update_lod)
+
+        self.widget = QWidget(self)
+        self.setWidget(self.widget)
+
+        # the stored preview is shown while the scene is built
+        self.preview = QLabel(self.widget)
+        self.preview.setAlignment(Qt.AlignCenter)
+        self.stack = QStackedWidget(self.widget)
+        self.stack.addWidget(self.view)
+        self.stack.addWidget(self.preview)
+
+        layout = QVBoxLayout(self.widget)
+        layout.addWidget(self.create_toolbar())
+        layout.addWidget(self.stack)
+
+    def create_toolbar(self):
+        toolbar = QToolBar(self)
+        toolbar.setIconSize(QSize(18, 18))
+        for icon, slot in (("fa.search-plus", lambda: self.view.zoom(1.2)),
+                           ("fa.search-minus", lambda: self.view.zoom(0.8)),
+                           ("fa.expand", self.fit_view)):
+            action = QAction(qta.icon(icon), "", self)
+            action.triggered.connect(slot)
+            toolbar.addAction(action)
+        return toolbar
+
+    def set_theme(self, dark_mode=False):
+        """Set the theme of the scene."""
+        bg_color = '#19232D' if dark_mode else '#FAFAFA'
+        self.dark_mode = dark_mode
+        self.preview.setStyleSheet(f"background-color: {bg_color};")
+        self.text_color = '#ffffff' if dark_mode else '#000000'
+        self.view.setBackgroundBrush(QBrush(QColor(bg_color)))
+        for title in self.titles:
+            title.setBrush(QBrush(QColor(self.text_color)))
+
+    def fit_view(self):
+        if not self._bounds.isEmpty():
+            self.view.fitInView(self._bounds, Qt.KeepAspectRatio)
+            self.update_lod()
+
+    def update_lod(self):
+        scale = abs(self.view.transform().m11())
+        for label in self.labels:
+            label.update_lod(scale)
+
+    def clear(self):
+        self.scene.clear()
+        self.layer_groups = {}
+        self.labels = []
+        self.titles = []
+        self._bounds = QRectF()
+
+    def draw_cells(self, to_draw):
+        """
+        Draw cells based on LEF information, side by side. A single cell
+        with a stored preview shows the preview at once and is drawn in the
+        next event loop turn.
+        """
+        self._draw_id += 1
+        preview = self._stored_preview(to_draw)
+        if preview is None:
+            self._draw_cells(to_draw)
+            return
+        self.preview.setPixmap(preview)
+        self.stack.setCurrentWidget(self.preview)
+        draw_id = self._draw_id
+        QTimer.singleShot(0, lambda: draw_id == self._draw_id and self._draw_cells(to_draw))
+
+    def _stored_preview(self, to_draw):
+        if len(to_draw) != 1 or to_draw[0] not in self.lef_dscp.macros:
+            return None
+        image = stored_preview(self.lef_dscp.macros, to_draw[0], self.dark_mode)
+        if image is None:
+            return None
+        side = min(self.stack.width(), self.stack.height(), PREVIEW_SIZES[-1])
+        return QPixmap.fromImage(image).scaled(side, side, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+
+    def _draw_cells(self, to_draw):
+        self.clear()
+        self.drawn_cells = list(to_draw)
+
+        dx = 0.0
+        for macro_name in to_draw:
+            if macro_name not in self.lef_dscp.macros:
+                print(f"Error: Macro '{macro_name}' does not exist in the parsed library.")
+                continue
+            dx = self.draw_macro(self.lef_dscp.macros[macro_name], dx)
+
+        self.scene.setSceneRect(self._bounds)
+        self.stack.setCurrentWidget(self.view)
+        self.fit_view()
+
+    def _layer_group(self, kind, layer_name):
+        group = self.layer_groups.get((kind, layer_name))
+        if group is None:
+            group = self.layer_groups[(kind, layer_name)] = QGraphicsItemGroup()
+            group.setZValue(Z_OBS if kind == "OBS" else Z_PIN)
+            self.scene.addItem(group)
+        return group
+
+    def draw_macro(self, macro, dx):
+        """
+        Draw a single macro with its left edge at dx.
+        :return: the x of the next macro
+        """
+        groups = {}
+        if "OBS" in macro.info:
+            for layer in macro.info["OBS"].info.get("LAYER", []):
+                groups.setdefault(("OBS", layer.name, OBS_COLOR, True), []).append(layer)
+        for pin in macro.info["PIN"]:
+            if "PORT" not in pin.info:
+                continue
+            color = "blue" if pin.name.lower() in SUPPLY_PINS else "red"
+            for layer in pin.info["PORT"].info.get("LAYER", []):
+                groups.setdefault(("PIN", layer.name, color, False), []).append(layer)
+
+        bounds = QRectF()
+        for (kind, layer_name, color, fill), layers in groups.items():
+            rects, polygons = _shapes(layers, dx)
+            centers = np.concatenate([(rects[:, :2] + rects[:, 2:]) / 2,
+                                      np.array([points.mean(axis=0) for points in polygons]).reshape(-1, 2)])
+            group = self._layer_group(kind, layer_name)
+            for tile in _tiles(centers):
+                item = ShapeTileItem(rects[tile[tile < len(rects)]],
+                                     [polygons[idx - len(rects)] for idx in tile[tile >= len(rects)]],
+                                     color, fill)
+                group.addToGroup(item)
+                bounds = bounds.united(item.boundingRect())
+
+        width, height = macro.info.get("SIZE", (0, 0))
+        if width and height:
+            outline = QGraphicsRectItem(QRectF(dx, -height, width, height))
+            outline.setPen(QPen(QColor("gray"), 0, Qt.DashLine))
+            self.scene.addItem(outline)
+            bounds = bounds.united(outline.rect())
+        self._add_pin_labels(macro, dx)
+
+        # gap to the next macro, and room for the title when fitting
+        margin = max(bounds.width(), bounds.height()) * 0.1
+        title_room = bounds.height() * 0.1
+        title = QGraphicsSimpleTextItem(macro.name)
+        title.setFlag(QGraphicsItem.ItemIgnoresTransformations)
+        title.setFont(QFont("Roboto", 11))
+        title.setBrush(QBrush(QColor(self.text_color)))
+        title.setPos(bounds.left(), bounds.top() - title_room)
+        title.setZValue(Z_LABEL)
+        self.scene.addItem(title)
+        self.titles.append(title)
+
+        self._bounds = self._bounds.united(bounds.adjusted(0, -title_room, 0, 0))
+        return bounds.right() + margin
+
+    def _add_pin_labels(self, macro, dx):
+        """Pin names at the center of the first shape of their PORT"""
+        for pin in macro.info["PIN"]:
+            if "PORT" not in pin.info:
+                continue
+            for layer in pin.info["PORT"].info.get("LAYER", []):
+                rect_verts, polygons = layer_vertices(layer, 1)
+                points = rect_verts[0] if len(rect_verts) else polygons[0] if polygons else None
+                if points is None:
+                    continue
+                low, high = points.min(axis=0), points.max(axis=0)
+                label = PinLabelItem(pin.name, float((high - low).max()))
+                label.setPos(dx + (low[0] + high[0]) / 2, -(low[1] + high[1]) / 2)
+                label.setZValue(Z_LABEL)
+                self.scene.addItem(label)
+                self.labels.append(label)
+                break
+
+    def update_lef(self, lef_dscp: LefDscp):
+        """Update the LEF description."""
+        self.lef_dscp = lef_dscp
+
+    def update(self):
+        """Clear the scene and update the LEF description."""
+        self.update_lef(library_manager().lef_dscp)
+        changed = library_manager().changed_macros
+        if changed is not None and self.lef_dscp is not None:
+            # reloaded, redraw only when a drawn cell changed
+            if changed.intersection(self.drawn_cells):
+                self.draw_cells([name for name in self.drawn_cells if name in self.lef_dscp.macros])
+            return
+        self._draw_id += 1
+        self.drawn_cells = []
+        self.clear()
+        self.stack.setCurrentWidget(self.view)
+
+
+class LefSceneWindow(AbstractWindow):
+    def __init__(self, parent=None):
+        super().__init__(W_LEF_MACRO_ID)
+        self._widget = LefSceneWidget(parent)
+        library_manager().add_observer(self._widget)
+
+    def widget(self):
+        return self._widget
+
+    def area(self):
+        return Qt.LeftDockWidgetArea
+
+    def is_center(self):
+        return True
+
+    def set_theme(self, dark_mode=False):
+        self._widget.set_theme(dark_mode)
+
+    def update_lef(self, lef_dscp: LefDscp):
+        self._widget.update_lef(lef_dscp)
+
+    def draw_cells(self, cells):
+        self._widget.draw_cells(cells)
@@ -1,13 +1,52 @@
 import qtawesome as qta
 from .lef_macro_window import LefMacroWindow
 from .pin_assess_window import PinAssessWindow
-from core import library_manager
+from core import library_manager, score_service, thumbnail_prerender
+from core.macro_thumbnail import ThumbnailRenderer, cancel_hidden_requests
 from core.window import AbstractWindow, W_LIB_BROWSER_ID
-from .dialogs import MacroScoreDialog, PinScoreDialog, MacroInfoDialog, PinDestinyDialog
+from .dialogs import MacroScoreDialog, PinScoreDialog, MacroInfoDialog, PinDestinyDialog, exec_score_dialog
 
 from PyQt5.QtWidgets import QApplication, QDockWidget, QListView, QVBoxLayout, QWidget, QMenu, QAction
 from PyQt5.QtGui import QStandardItemModel, QStandardItem
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QSize, QModelIndex
+
+ICON_SIZE = 32
+
+
+class MacroListModel(QStandardItemModel):
+    """Macro names, the icon of a row is loaded when the row is shown"""
+    def __init__(self, renderer: ThumbnailRenderer, parent=None):
+        super().__init__(parent)
+        self.renderer = renderer
+        self.dark_mode = False
+        self.rows = {}
+        renderer.thumbnail_ready.connect(self.refresh)
+
+    def set_names(self, names):
+        self.clear()
+        self.rows = {}
+        for row, name in enumerate(names):
+            item = QStandardItem(name)
+            item.setEditable(False)
+            self.appendRow(item)
+            self.rows[name] = row
+
+    def set_theme(self, dark_mode):
+        self.dark_mode = dark_mode
+        self.renderer.cancel_pending()
+        if self.rowCount():
+            self.dataChanged.emit(self.index(0, 0), self.index(self.rowCount() - 1, 0), [Qt.DecorationRole])
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DecorationRole and index.isValid():
+            return self.renderer.request(super().data(index), ICON_SIZE, self.dark_mode)
+        return super().data(index, role)
+
+    def refresh(self, name):
+        row = self.rows.get(name)
+        if row is not None:
+            index = self.index(row, 0)
+            self.dataChanged.emit(index, index, [Qt.DecorationRole])
 
 
 class LibBrowserWidget(QDockWidget):
@@ -15,6 +54,9 @@ class LibBrowserWidget(QDockWidget):
         super().__init__("Macro Browser", parent=parent)
         self.macro_win = macro_win
         self.pin_assess_win = pin_assess_win
+        self.current_macro = None
+        # (key, callback) of the score jobs filling the pin assess window
+        self.assess_requests = []
 
         self.action_handlers = {
             "Copy Name": self.copy_name,
@@ -22,6 +64,7 @@ class LibBrowserWidget(QDockWidget):
             "Calc Pin Score": self.calc_pin_score,
             "Calc Pin Destiny": self.calc_pin_destiny,
             "Show Details": self.show_macro_infos,
+            "Unload Library": self.unload_library,
         }
 
         self.init_ui()
@@ -32,8 +75,15 @@ class LibBrowserWidget(QDockWidget):
 
         layout = QVBoxLayout(self.widget)
         self.list_view = QListView(self)
-        self.model = QStandardItemModel(self.list_view)
+        # icons come from the pre-rendered thumbnails on disk
+        self.renderer = ThumbnailRenderer(store=thumbnail_prerender().store, parent=self)
+        self.model = MacroListModel(self.renderer, self.list_view)
         self.list_view.setModel(self.model)
+        self.list_view.setIconSize(QSize(ICON_SIZE, ICON_SIZE))
+        # the rows are not measured one by one, only the rows in view load icons
+        self.list_view.setUniformItemSizes(True)
+        # requests of the rows scrolled out of view are dropped
+        self.list_view.verticalScrollBar().valueChanged.connect(self.cancel_hidden_requests)
 
         self.list_view.setEditTriggers(QListView.NoEditTriggers)
         self.list_view.doubleClicked.connect(self.on_item_double_clicked)
@@ -45,11 +95,17 @@ class LibBrowserWidget(QDockWidget):
 
     def setup_models(self, cell_names):
         """Setup the model with the given cell names."""
-        self.model.clear()
-        for name in cell_names:
-            item = QStandardItem(name)
-            item.setEditable(False)
-            self.model.appendRow(item)
+        self.model.set_names(cell_names)
+
+    def set_theme(self, dark_mode=False):
+        self.model.set_theme(dark_mode)
+
+    def cancel_hidden_requests(self):
+        cancel_hidden_requests(self.renderer, self.list_view, self.index_of)
+
+    def index_of(self, name):
+        row = self.model.rows.get(name)
+        return self.model.index(row, 0) if row is not None else QModelIndex()
 
     def on_item_double_clicked(self, index):
         if not index.isValid():
@@ -57,10 +113,25 @@ class LibBrowserWidget(QDockWidget):
         item = self.model.itemFromIndex(index)
         if item:
             macro_name = item.text()
+            self.current_macro = macro_name
             self.macro_win.draw_cells([macro_name])
-            self.pin_assess_win.load(library_manager().calc_pin_density(macro_name), 
-                                      library_manager().calc_macro_score(macro_name),
-                                      library_manager().calc_pin_score(macro_name))
+            self.request_assess(macro_name)
+
+    def request_assess(self, macro_name):
+        """Fill the pin assess window as the scores of the macro arrive"""
+        self.cancel_assess()
+        self.pin_assess_win.clear()
+        service = score_service()
+        for submit, load in ((service.calc_pin_score, self.pin_assess_win.load_pin_score),
+                             (service.calc_macro_score, self.pin_assess_win.load_macro_score),
+                             (service.calc_pin_density, self.pin_assess_win.load_pin_destiny)):
+            key = submit(macro_name, load)
+            self.assess_requests.append((key, load))
+
+    def cancel_assess(self):
+        for key, callback in self.assess_requests:
+            score_service().cancel(key, callback)
+        self.assess_requests = []
 
     def show_context_menu(self, position):
         """Show a context menu at the given position."""
@@ -79,10 +150,13 @@ class LibBrowserWidget(QDockWidget):
         pin_score_action = QAction(qta.icon('msc.pin'), "Calc Pin Score", self)
         pin_destiny_action = QAction(qta.icon('msc.pinned'), "Calc Pin Destiny", self)
         show_infos_action = QAction(qta.icon('msc.info'), 'Show Details', self)
+        unload_action = QAction(qta.icon('msc.close'), 'Unload Library', self)
 
         menu.addActions([macro_score_action, pin_score_action, pin_destiny_action])
         menu.addSeparator()
         menu.addActions([copy_name_action, show_infos_action])
+        menu.addSeparator()
+        menu.addAction(unload_action)
         return menu
 
     def handle_context_menu_action(self, action, index):
@@ -108,28 +182,45 @@ class LibBrowserWidget(QDockWidget):
         clipboard.setText(macro_name)
 
     def calc_macro_score(self, macro_name):
-        data = library_manager().calc_macro_score(macro_name)
-        dialog = MacroScoreDialog(data, self)
-        dialog.exec_()
+        dialog = MacroScoreDialog({}, self)
+        exec_score_dialog(dialog, [(score_service().calc_macro_score, dialog.update_table)], macro_name)
 
     def calc_pin_score(self, macro_name):
-        data = library_manager().calc_pin_score(macro_name)
-        dialog = PinScoreDialog(data, self)
-        dialog.exec_()
+        dialog = PinScoreDialog({}, self)
+        exec_score_dialog(dialog, [(score_service().calc_pin_score, dialog.update_tree)], macro_name)
 
     def calc_pin_destiny(self, macro_name):
-        data = library_manager().calc_pin_density(macro_name)
-        dialog = PinDestinyDialog(data, self)
-        dialog.exec_()
+        dialog = PinDestinyDialog({}, self)
+        exec_score_dialog(dialog, [(score_service().calc_pin_density, dialog.update_table),
+                                   (score_service().calc_pin_access, dialog.update_access)], macro_name)
 
     def show_macro_infos(self, macro_name):
         macro = library_manager().get_macro_info(macro_name)
         dialog = MacroInfoDialog(macro, self)
         dialog.exec_()
 
+    def unload_library(self, macro_name):
+        """Remove the LEF file the macro comes from"""
+        lef_file = library_manager().libraries.library_of(macro_name)
+        if lef_file:
+            library_manager().remove_lef_file(lef_file)
+
+    def model_names(self):
+        return [self.model.item(row).text() for row in range(self.model.rowCount())]
+
     def update(self):
-        self.setup_models(library_manager().get_all_macros())
-        self.pin_assess_win.clear()
+        changed = library_manager().changed_macros
+        self.renderer.invalidate(changed)
+        names = list(library_manager().get_all_macros())
+        if changed is None or names != self.model_names():
+            self.setup_models(names)
+        else:
+            for name in changed:
+                self.model.refresh(name)
+        if changed is None or self.current_macro in changed:
+            self.current_macro = None
+            self.assess_requests = []
+            self.pin_assess_win.clear()
 
 
 class LibBrowserWindow(AbstractWindow):
@@ -150,6 +241,9 @@ class LibBrowserWindow(AbstractWindow):
     def calc_macro_score(self, macro_name):
         self._widget.calc_macro_score(macro_name)
 
+    def set_theme(self, dark_mode=False):
+        self._widget.set_theme(dark_mode)
+
     def calc_pin_score(self, macro_name):
         self._widget.calc_pin_score(macro_name)
 
@@ -0,0 +1,175 @@
+from core import library_manager, thumbnail_prerender
+from core.macro_thumbnail import ThumbnailRenderer, THUMBNAIL_SIZE, cancel_hidden_requests
+from core.window import AbstractWindow, W_MACRO_GALLERY_ID
+
+from PyQt5.QtWidgets import QDockWidget, QListView, QVBoxLayout, QWidget, QLineEdit, QLabel
+from PyQt5.QtGui import QPixmap, QColor
+from PyQt5.QtCore import Qt, QSize, QAbstractListModel, QModelIndex, QSortFilterProxyModel
+
+
+class MacroGalleryModel(QAbstractListModel):
+    """
+    Macro names with their thumbnails, a thumbnail is only requested when
+    the view asks for the decoration of a visible row.
+    """
+    def __init__(self, renderer: ThumbnailRenderer, parent=None):
+        super().__init__(parent)
+        self.renderer = renderer
+        self.names = []
+        self.rows = {}
+        self.thumbnail_size = THUMBNAIL_SIZE
+        self.dark_mode = False
+        self.placeholder = self._placeholder()
+        renderer.thumbnail_ready.connect(self.on_thumbnail_ready)
+
+    def _placeholder(self):
+        pixmap = QPixmap(self.thumbnail_size, self.thumbnail_size)
+        pixmap.fill(QColor('#2B3A48' if self.dark_mode else '#E8E8E8'))
+        return pixmap
+
+    def set_names(self, names):
+        self.beginResetModel()
+        self.names = list(names)
+        self.rows = {name: row for row, name in enumerate(self.names)}
+        self.endResetModel()
+
+    def set_theme(self, dark_mode):
+        self.beginResetModel()
+        self.dark_mode = dark_mode
+        self.placeholder = self._placeholder()
+        self.renderer.cancel_pending()
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.names)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        name = self.names[index.row()]
+        if role in (Qt.DisplayRole, Qt.ToolTipRole):
+            return name
+        if role == Qt.DecorationRole:
+            pixmap = self.renderer.request(name, self.thumbnail_size, self.dark_mode)
+            return self.placeholder if pixmap is None else pixmap
+        return None
+
+    def on_thumbnail_ready(self, name):
+        self.refresh(name)
+
+    def refresh(self, name):
+        row = self.rows.get(name)
+        if row is not None:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+
+class MacroGalleryWidget(QDockWidget):
+    """
+    Scrolling grid of the thumbnails of the loaded macros. Only the rows in
+    view are laid out and rendered, thumbnails are kept in an LRU cache.
+    """
+    def __init__(self, macro_win, parent=None):
+        super().__init__("Macro Gallery", parent=parent)
+        self.macro_win = macro_win
+        self.renderer = ThumbnailRenderer(store=thumbnail_prerender().store, parent=self)
+        self.init_ui()
+
+    def init_ui(self):
+        self.widget = QWidget(self)
+        self.setWidget(self.widget)
+        layout = QVBoxLayout(self.widget)
+
+        self.filter_edit = QLineEdit(self)
+        self.filter_edit.setPlaceholderText("Filter macros")
+        self.filter_edit.setClearButtonEnabled(True)
+        layout.addWidget(self.filter_edit)
+
+        self.model = MacroGalleryModel(self.renderer, self)
+        self.proxy = QSortFilterProxyModel(self)
+        self.proxy.setSourceModel(self.model)
+        self.proxy.setFilterCaseSensitivity(Qt.CaseInsensitive)
+        self.filter_edit.textChanged.connect(self.proxy.setFilterFixedString)
+
+        self.list_view = QListView(self)
+        self.list_view.setModel(self.proxy)
+        self.list_view.setViewMode(QListView.IconMode)
+        self.list_view.setResizeMode(QListView.Adjust)
+        self.list_view.setMovement(QListView.Static)
+        self.list_view.setUniformItemSizes(True)
+        self.list_view.setLayoutMode(QListView.Batched)
+        self.list_view.setBatchSize(200)
+        self.list_view.setIconSize(QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        self.list_view.setGridSize(QSize(THUMBNAIL_SIZE + 24, THUMBNAIL_SIZE + 32))
+        self.list_view.setEditTriggers(QListView.NoEditTriggers)
+        self.list_view.setSelectionMode(QListView.ExtendedSelection)
+        self.list_view.doubleClicked.connect(self.on_item_double_clicked)
+        # requests of the rows scrolled out of view are dropped
+        self.list_view.verticalScrollBar().valueChanged.connect(self.cancel_hidden_requests)
+        self.filter_edit.textChanged.connect(self.renderer.cancel_pending)
+        layout.addWidget(self.list_view)
+
+        self.count_label = QLabel(self)
+        layout.addWidget(self.count_label)
+        self.setMinimumWidth(200)
+
+    def set_theme(self, dark_mode=False):
+        self.model.set_theme(dark_mode)
+
+    def cancel_hidden_requests(self):
+        cancel_hidden_requests(self.renderer, self.list_view, self.index_of)
+
+    def index_of(self, name):
+        """Index of the row of a macro in the view, invalid when it is filtered out"""
+        row = self.model.rows.get(name)
+        return self.proxy.mapFromSource(self.model.index(row)) if row is not None else QModelIndex()
+
+    def show_cells(self, names):
+        """Show these macros only, all of them when names is None"""
+        names = list(library_manager().get_all_macros()) if names is None else list(names)
+        self.model.set_names(names)
+        self.count_label.setText(f"{len(names)} macros")
+
+    def selected_cells(self):
+        return [self.proxy.data(index) for index in self.list_view.selectionModel().selectedIndexes()]
+
+    def on_item_double_clicked(self, index):
+        if not index.isValid():
+            return
+        # the selected macros side by side, the clicked one alone otherwise
+        cells = self.selected_cells()
+        name = self.proxy.data(index)
+        self.macro_win.draw_cells(cells if name in cells and len(cells) > 1 else [name])
+
+    def update(self):
+        changed = library_manager().changed_macros
+        self.renderer.invalidate(changed)
+        names = list(library_manager().get_all_macros())
+        if changed is None or names != self.model.names:
+            self.show_cells(names)
+            return
+        # reloaded, the thumbnails of the changed macros are rendered again
+        for name in changed:
+            self.model.refresh(name)
+
+
+class MacroGalleryWindow(AbstractWindow):
+    def __init__(self, macro_win, parent=None):
+        super().__init__(W_MACRO_GALLERY_ID)
+        self._widget = MacroGalleryWidget(macro_win, parent)
+        library_manager().add_observer(self._widget)
+
+    def widget(self):
+        return self._widget
+
+    def area(self):
+        return Qt.RightDockWidgetArea
+
+    def is_center(self):
+        return False
+
+    def set_theme(self, dark_mode=False):
+        self._widget.set_theme(dark_mode)
+
+    def show_cells(self, names):
+        self._widget.show_cells(names)
@@ -21,6 +21,7 @@ import qtawesome as qta
 
 class PinAssessRuleWidget(QWidget):
     rule_changed = pyqtSignal(bool)
+    rule_saved = pyqtSignal()
     
     DEAFALUET_RULES = {
             "smic14": {"min_width": 0.020, "min_space": 0.020, "expand": True},
@@ -101,6 +102,11 @@ class PinAssessRuleWidget(QWidget):
         self.expand_checkbox = QCheckBox("Enable Pin Expand")
         form_layout.addRow(self.expand_checkbox)
 
+        # 0 means the pitch of the routing layer of the pins
+        self.grid_pitch_spinbox = self.create_spinbox(0.0, 10.0, 3, 0.001)
+        self.grid_pitch_spinbox.setSpecialValueText("Routing Pitch")
+        form_layout.addRow("Access Grid Pitch (µm):", self.grid_pitch_spinbox)
+
     def create_spinbox(self, min_val, max_val, decimals, step):
         spinbox = QDoubleSpinBox()
         spinbox.setRange(min_val, max_val)
@@ -121,6 +127,7 @@ class PinAssessRuleWidget(QWidget):
         self.min_space_spinbox.valueChanged.connect(self.mark_as_modified)
         self.min_space_spinbox.textChanged.connect(self.mark_as_modified)
         self.expand_checkbox.stateChanged.connect(self.mark_as_modified)
+        self.grid_pitch_spinbox.valueChanged.connect(self.mark_as_modified)
 
     def disconnect_signals(self):
         self.rule_combo.currentTextChanged.disconnect(self.update_rule_parameters)
@@ -129,6 +136,7 @@ class PinAssessRuleWidget(QWidget):
         self.min_space_spinbox.valueChanged.disconnect(self.mark_as_modified)
         self.min_space_spinbox.textChanged.disconnect(self.mark_as_modified)
         self.expand_checkbox.stateChanged.disconnect(self.mark_as_modified)        
+        self.grid_pitch_spinbox.valueChanged.disconnect(self.mark_as_modified)
 
     def has_modified(self)-> bool:
         return self.is_modified
@@ -146,6 +154,7 @@ class PinAssessRuleWidget(QWidget):
             self.min_width_spinbox.setValue(params["min_width"])
             self.min_space_spinbox.setValue(params["min_space"])
             self.expand_checkbox.setChecked(params["expand"])
+            self.grid_pitch_spinbox.setValue(params.get("grid_pitch", 0.0))
         self.current_rule_label.setText(f"Current Rule:  {self.rule_combo.currentText()}")
         self.connect_signals()
         
@@ -156,10 +165,12 @@ class PinAssessRuleWidget(QWidget):
             params["min_width"] = self.min_width_spinbox.value()
             params["min_space"] = self.min_space_spinbox.value()
             params["expand"] = self.expand_checkbox.isChecked()
+            params["grid_pitch"] = self.grid_pitch_spinbox.value()
             
     def save(self):
         self.is_modified = False
         self._save_parameters()
+        self.rule_saved.emit()
 
     def add_rule(self):
         new_rule_name, ok = QInputDialog.getText(self, "Add Rule", "Enter new rule name:")
@@ -32,20 +32,26 @@ class PinAssessWidget(QDockWidget):
         self.pin_score_dialog = None
         self.pin_destiny_dialog = None
 
+    def _insert_dialog(self, dialog):
+        """Add a dialog, keeping the pin score, macro score, pin destiny order."""
+        order = [self.pin_score_dialog, self.macro_score_dialog, self.pin_destiny_dialog]
+        index = sum(1 for other in order[:order.index(dialog)] if other is not None)
+        self.main_layout.insertWidget(index, dialog)
+
     def _load_macro_score(self, data):
         """Load MacroScoreDialog content."""
         self.macro_score_dialog = MacroScoreDialog(data, self)
-        self.main_layout.addWidget(self.macro_score_dialog)
+        self._insert_dialog(self.macro_score_dialog)
 
     def _load_pin_score(self, data):
         """Load PinScoreDialog content."""
         self.pin_score_dialog = PinScoreDialog(data, self)
-        self.main_layout.addWidget(self.pin_score_dialog)
+        self._insert_dialog(self.pin_score_dialog)
 
     def _load_pin_destiny(self, data):
         """Load PinDestinyDialog content."""
         self.pin_destiny_dialog = PinDestinyDialog(data, self)
-        self.main_layout.addWidget(self.pin_destiny_dialog)
+        self._insert_dialog(self.pin_destiny_dialog)
 
     def _clear_macro_score(self):
         """Clear MacroScoreDialog content."""
@@ -81,6 +87,19 @@ class PinAssessWidget(QDockWidget):
         self._load_macro_score(macro_score_data)
         self._load_pin_destiny(pin_destiny_data)
 
+    def load_macro_score(self, data):
+        """Show one result as soon as it arrives"""
+        self._clear_macro_score()
+        self._load_macro_score(data)
+
+    def load_pin_score(self, data):
+        self._clear_pin_score()
+        self._load_pin_score(data)
+
+    def load_pin_destiny(self, data):
+        self._clear_pin_destiny()
+        self._load_pin_destiny(data)
+
 
 class PinAssessWindow(AbstractWindow):
     def __init__(self, parent=None):
@@ -101,4 +120,12 @@ class PinAssessWindow(AbstractWindow):
     
     def clear(self):
         self._widget.clear()
-        
\ No newline at end of file
+
+    def load_macro_score(self, data):
+        self._widget.load_macro_score(data)
+
+    def load_pin_score(self, data):
+        self._widget.load_pin_score(data)
+
+    def load_pin_destiny(self, data):
+        self._widget.load_pin_destiny(data)
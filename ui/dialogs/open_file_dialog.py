@@ -1,6 +1,6 @@
 import os
 from PyQt5.QtWidgets import QFileDialog
-from core import library_manager, LibraryManager
+from core import library_manager, library_loader, LibraryManager
 
 
 class OpenFileDialog:
@@ -9,21 +9,23 @@ class OpenFileDialog:
 
     def open_file(self):
         """Open file dialog to select files and load them into the library manager."""
-        file = self._get_file_path()
-        if not file:
-            return
-
-        file_extension = self._get_file_extension(file)
-        if not file_extension:
-            return
-
-        self._load_file(file, file_extension)
-
-    def _get_file_path(self):
-        """Open a file dialog and return the selected file path."""
-        file, _ = QFileDialog.getOpenFileName(self.mainwindow, "Open File", "", 
-                                              "LEF Files (*.lef);;DEF Files (*.def);;Spice Files (*.sp);;GDS Files (*.gds;*.gdsII);;All Files (*)")
-        return file
+        lef_files = []
+        for file in self._get_file_paths():
+            file_extension = self._get_file_extension(file)
+            if file_extension == 'lef':
+                # LEF files are loaded together
+                lef_files.append(file)
+            elif file_extension:
+                self._load_file(file, file_extension)
+        if lef_files:
+            # read in the background, the window stays responsive
+            library_loader().load_lef_files(lef_files)
+
+    def _get_file_paths(self):
+        """Open a file dialog and return the selected file paths."""
+        files, _ = QFileDialog.getOpenFileNames(self.mainwindow, "Open File", "", 
+                                                "LEF Files (*.lef);;DEF Files (*.def);;Spice Files (*.sp);;GDS Files (*.gds;*.gdsII);;All Files (*)")
+        return files
 
     def _get_file_extension(self, file):
         """Extract and validate the file extension."""
@@ -36,7 +38,7 @@ class OpenFileDialog:
     def _load_file(self, file, file_extension):
         """Load the file into the library manager based on its extension."""
         loader_map = {
-            'lef': library_manager().load_lef_file,
+            'lef': lambda lef_file: library_loader().load_lef_files([lef_file]),
             'def': library_manager().load_def_file,
             'sp': library_manager().load_spice_file,
             'gds': library_manager().load_gds_file,
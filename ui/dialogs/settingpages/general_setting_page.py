@@ -11,13 +11,14 @@ from PyQt5.QtCore import pyqtSignal, QObject
 
 class GeneralSettingsWidget(QWidget):
     change_theme = pyqtSignal(bool)
-    DEFAULT_SEETINGS = {"theme": "Light"}
+    DEFAULT_SEETINGS = {"theme": "Light", "macro_view": "Matplotlib"}
     
     def __init__(self, settings, parent=None):
         super().__init__(parent)
         self._general = settings.get('general', self.DEFAULT_SEETINGS)
         self._setup_ui()
         self.theme_combo.setCurrentText(self._general.get('theme', 'Light'))
+        self.macro_view_combo.setCurrentText(self._general.get('macro_view', 'Matplotlib'))
     
     def _setup_ui(self):
         layout = QFormLayout(self)
@@ -26,6 +27,12 @@ class GeneralSettingsWidget(QWidget):
         self.theme_combo.setEditable(False)
         self.theme_combo.currentTextChanged.connect(self._change_theme)
         layout.addRow("Theme:", self.theme_combo)
+        # the macro window is made at start up
+        self.macro_view_combo = QComboBox()
+        self.macro_view_combo.addItems(["Matplotlib", "Scene"])
+        self.macro_view_combo.setEditable(False)
+        self.macro_view_combo.setToolTip("Scene draws large macros faster, takes effect after a restart")
+        layout.addRow("Macro View:", self.macro_view_combo)
     
     def _is_dark(self)-> bool:
         return self.theme_combo.currentText() == "Dark"
@@ -34,7 +41,8 @@ class GeneralSettingsWidget(QWidget):
         self.change_theme.emit(self._is_dark())
         
     def get_setting(self):
-        return {"general": {"theme": self.theme_combo.currentText()}}
+        return {"general": {"theme": self.theme_combo.currentText(),
+                            "macro_view": self.macro_view_combo.currentText()}}
             
 class GeneralSettingsPage(SettingPageRegistor, QObject):
     theme_changed = pyqtSignal(bool)
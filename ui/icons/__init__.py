@@ -6,10 +6,12 @@ M_FILE_OPEN_ICON = 'fa.folder-open-o'
 M_FILE_SAVE_ICON = 'fa.save'
 M_FILE_SAVE_AS_ICON = 'fa.save'
 M_FILE_CLOSE_ICON = 'fa.close'
+M_FILE_RELOAD_ICON = 'fa.refresh'
 M_FILE_EXIT_ICON = 'fa.power-off'
 
 M_VIEW_LIBRARY_ICON = 'msc.library'
 M_VIEW_MACRO_VIEW_ICON = 'msc.dashboard'
+M_VIEW_MACRO_GALLERY_ICON = 'msc.preview'
 M_VIEW_PIN_ASSESS_ICON = 'ph.pinterest-logo-light'
 M_VIEW_CIRCUIT_ICON = 'msc.circuit-board'
 M_VIEW_LAYOUT_ICON = 'msc.layout'
@@ -19,6 +21,7 @@ M_TOOLS_TOOLBAR_ICON = 'msc.tools'
 M_TOOLS_MACRO_COST_ICON = 'msc.type-hierarchy'
 M_TOOLS_PIN_ASSESS_ICON = 'msc.pin'
 M_TOOLS_PIN_DENSITY_ICON = 'msc.pinned'
+M_TOOLS_LIBRARY_SCORE_ICON = 'msc.library'
 M_TOOLS_SETTINGS_ICON = 'fa5s.cog'
 M_TOOLS_PIN_RULE_ICON = 'ph.ruler'
 M_TOOLS_DRC_RULE_ICON = 'ph.ruler-fill'
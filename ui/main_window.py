@@ -109,7 +109,7 @@ class MainWindow(QMainWindow):
     def create_file_menu(self):
         file_menu = QMenu('File', self)
         new_action = self.create_action('New', M_FILE_NEW_ICON, self.new_project)
-        open_action = self.create_action('Open', M_FILE_OPEN_ICON, self.open_file)
+        self.open_action = open_action = self.create_action('Open', M_FILE_OPEN_ICON, self.open_file)
         save_action = self.create_action('Save', M_FILE_SAVE_ICON, self.save_file)
         save_as_action = self.create_action('Save As', M_FILE_SAVE_AS_ICON, self.save_as_file)
         close_action = self.create_action('Close', M_FILE_CLOSE_ICON, self.close_file)